@@ -551,6 +551,23 @@ class MetadefNamespaceRepoProxy(glance.domain.proxy.MetadefNamespaceRepo):
         namespace_obj = self.namespace_repo.get(namespace)
         return proxy_namespace(self.context, namespace_obj)
 
+    def get_details(self, namespace):
+        namespace_obj, details = self.namespace_repo.get_details(namespace)
+        details = {
+            'objects': [proxy_object(self.context, meta_object)
+                        for meta_object in details['objects']],
+            'resource_type_associations': [
+                proxy_meta_resource_type(self.context, meta_resource_type)
+                for meta_resource_type in
+                details['resource_type_associations']],
+            'properties': [
+                proxy_namespace_property(self.context, namespace_property)
+                for namespace_property in details['properties']],
+            'tags': [proxy_tag(self.context, tag)
+                     for tag in details['tags']],
+        }
+        return proxy_namespace(self.context, namespace_obj), details
+
     def list(self, *args, **kwargs):
         namespaces = self.namespace_repo.list(*args, **kwargs)
         return [proxy_namespace(self.context, namespace) for
@@ -18,12 +18,13 @@ import re
 from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_utils import excutils
 from oslo_utils import units
 
 from glance.common import exception
+from glance.common import utils
 from glance.common import wsgi
 from glance import i18n
+import glance.notifier
 
 LOG = logging.getLogger(__name__)
 _ = i18n._
@@ -37,10 +38,10 @@ _CACHED_THREAD_POOL = {}
 def size_checked_iter(response, image_meta, expected_size, image_iter,
                       notifier):
     image_id = image_meta['id']
-    bytes_written = 0
+    image_iter = utils.streaming_iter(image_iter)
 
     def notify_image_sent_hook(env):
-        image_send_notification(bytes_written, expected_size,
+        image_send_notification(image_iter.bytes_sent, expected_size,
                                 image_meta, response.request, notifier)
 
     # Add hook to process after response is fully sent
@@ -48,26 +49,28 @@ def size_checked_iter(response, image_meta, expected_size, image_iter,
         response.request.environ['eventlet.posthooks'].append(
             (notify_image_sent_hook, (), {}))
 
-    try:
-        for chunk in image_iter:
-            yield chunk
-            bytes_written += len(chunk)
-    except Exception as err:
-        with excutils.save_and_reraise_exception():
+    def log_error(exc_info):
+        # NOTE: A size mismatch has already been logged by check_size
+        if (issubclass(exc_info[0], Exception) and
+                not isinstance(exc_info[1], exception.GlanceException)):
             msg = (_LE("An error occurred reading from backend storage for "
                        "image %(image_id)s: %(err)s") % {'image_id': image_id,
-                                                         'err': err})
+                                                         'err': exc_info[1]})
             LOG.error(msg)
 
-    if expected_size != bytes_written:
-        msg = (_LE("Backend storage for image %(image_id)s "
-                   "disconnected after writing only %(bytes_written)d "
-                   "bytes") % {'image_id': image_id,
-                               'bytes_written': bytes_written})
-        LOG.error(msg)
-        raise exception.GlanceException(_("Corrupt image download for "
-                                          "image %(image_id)s") %
-                                        {'image_id': image_id})
+    def check_size(bytes_written):
+        if expected_size != bytes_written:
+            msg = (_LE("Backend storage for image %(image_id)s "
+                       "disconnected after writing only %(bytes_written)d "
+                       "bytes") % {'image_id': image_id,
+                                   'bytes_written': bytes_written})
+            LOG.error(msg)
+            raise exception.GlanceException(_("Corrupt image download for "
+                                              "image %(image_id)s") %
+                                            {'image_id': image_id})
+
+    image_iter.add_hooks(end=check_size, error=log_error)
+    return image_iter
 
 
 def image_send_notification(bytes_written, expected_size, image_meta, request,
@@ -83,12 +86,8 @@ def image_send_notification(bytes_written, expected_size, image_meta, request,
             'receiver_user_id': context.user,
             'destination_ip': request.remote_addr,
         }
-        if bytes_written != expected_size:
-            notify = notifier.error
-        else:
-            notify = notifier.info
-
-        notify('image.send', payload)
+        glance.notifier.notify_image_send(
+            notifier, payload, complete=bytes_written == expected_size)
 
     except Exception as err:
         msg = (_LE("An error occurred during image.send"
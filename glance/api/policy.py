@@ -435,6 +435,14 @@ class MetadefNamespaceRepoProxy(glance.domain.proxy.MetadefNamespaceRepo):
         self.policy.enforce(self.context, 'get_metadef_namespace', {})
         return super(MetadefNamespaceRepoProxy, self).get(namespace)
 
+    def get_details(self, namespace):
+        self.policy.enforce(self.context, 'get_metadef_namespace', {})
+        self.policy.enforce(self.context, 'get_metadef_objects', {})
+        self.policy.enforce(self.context, 'list_metadef_resource_types', {})
+        self.policy.enforce(self.context, 'get_metadef_properties', {})
+        self.policy.enforce(self.context, 'get_metadef_tags', {})
+        return super(MetadefNamespaceRepoProxy, self).get_details(namespace)
+
     def list(self, *args, **kwargs):
         self.policy.enforce(self.context, 'get_metadef_namespaces', {})
         return super(MetadefNamespaceRepoProxy, self).list(*args, **kwargs)
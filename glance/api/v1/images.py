@@ -541,7 +541,8 @@ class Controller(controller.BaseController):
         else:
             image_iterator, size = self._get_from_store(req.context,
                                                         image_meta['location'])
-            image_iterator = utils.cooperative_iter(image_iterator)
+            image_iterator = utils.StreamingIterator(image_iterator,
+                                                     cooperative=True)
             image_meta['size'] = size or image_meta['size']
         image_meta = redact_loc(image_meta)
         return {
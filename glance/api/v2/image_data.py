@@ -254,8 +254,10 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
             # NOTE(markwash): filesystem store (and maybe others?) cause a
             # problem with the caching middleware if they are not wrapped in
             # an iterator very strange
-            response.app_iter = iter(image.get_data(offset=offset,
-                                                    chunk_size=chunk_size))
+            # NOTE: The caching middleware adds its hooks to the iterator
+            # rather than wrapping it.
+            response.app_iter = utils.streaming_iter(
+                image.get_data(offset=offset, chunk_size=chunk_size))
         except glance_store.NotFound as e:
             raise webob.exc.HTTPNoContent(explanation=e.msg)
         except glance_store.RemoteServiceUnavailable as e:
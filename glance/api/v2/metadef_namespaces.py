@@ -30,6 +30,7 @@ from glance.api.v2.model.metadef_property_type import PropertyType
 from glance.api.v2.model.metadef_resource_type import ResourceTypeAssociation
 from glance.api.v2.model.metadef_tag import MetadefTag
 from glance.common import exception
+from glance.common import metadef_cache
 from glance.common import utils
 from glance.common import wsgi
 from glance.common import wsme_utils
@@ -60,34 +61,21 @@ class NamespaceController(object):
 
     def index(self, req, marker=None, limit=None, sort_key='created_at',
               sort_dir='desc', filters=None):
+        cache_key = metadef_cache.make_key(
+            'namespaces', req.context, marker=marker, limit=limit,
+            sort_key=sort_key, sort_dir=sort_dir, filters=filters)
         try:
-            ns_repo = self.gateway.get_metadef_namespace_repo(req.context)
+            namespace_list = metadef_cache.get(cache_key)
+            if namespace_list is not None:
+                # NOTE: Cached listings are only served to the caller they
+                # were loaded for, the policy may have changed since then.
+                self.policy.enforce(req.context, 'get_metadef_namespaces', {})
+            else:
+                version = metadef_cache.get_version()
+                namespace_list = self._list_namespaces(
+                    req, marker, limit, sort_key, sort_dir, filters)
+                metadef_cache.store(cache_key, namespace_list, version)
 
-            # Get namespace id
-            if marker:
-                namespace_obj = ns_repo.get(marker)
-                marker = namespace_obj.namespace_id
-
-            database_ns_list = ns_repo.list(
-                marker=marker, limit=limit, sort_key=sort_key,
-                sort_dir=sort_dir, filters=filters)
-            for db_namespace in database_ns_list:
-                # Get resource type associations
-                filters = dict()
-                filters['namespace'] = db_namespace.namespace
-                rs_repo = (
-                    self.gateway.get_metadef_resource_type_repo(req.context))
-                repo_rs_type_list = rs_repo.list(filters=filters)
-                resource_type_list = [ResourceTypeAssociation.to_wsme_model(
-                    resource_type) for resource_type in repo_rs_type_list]
-                if resource_type_list:
-                    db_namespace.resource_type_associations = (
-                        resource_type_list)
-
-            namespace_list = [Namespace.to_wsme_model(
-                db_namespace,
-                get_namespace_href(db_namespace),
-                self.ns_schema_link) for db_namespace in database_ns_list]
             namespaces = Namespaces()
             namespaces.namespaces = namespace_list
             if len(namespace_list) != 0 and len(namespace_list) == limit:
@@ -104,6 +92,36 @@ class NamespaceController(object):
             raise webob.exc.HTTPInternalServerError()
         return namespaces
 
+    def _list_namespaces(self, req, marker, limit, sort_key, sort_dir,
+                         filters):
+        ns_repo = self.gateway.get_metadef_namespace_repo(req.context)
+
+        # Get namespace id
+        if marker:
+            namespace_obj = ns_repo.get(marker)
+            marker = namespace_obj.namespace_id
+
+        database_ns_list = ns_repo.list(
+            marker=marker, limit=limit, sort_key=sort_key,
+            sort_dir=sort_dir, filters=filters)
+        for db_namespace in database_ns_list:
+            # Get resource type associations
+            filters = dict()
+            filters['namespace'] = db_namespace.namespace
+            rs_repo = (
+                self.gateway.get_metadef_resource_type_repo(req.context))
+            repo_rs_type_list = rs_repo.list(filters=filters)
+            resource_type_list = [ResourceTypeAssociation.to_wsme_model(
+                resource_type) for resource_type in repo_rs_type_list]
+            if resource_type_list:
+                db_namespace.resource_type_associations = (
+                    resource_type_list)
+
+        return [Namespace.to_wsme_model(
+            db_namespace,
+            get_namespace_href(db_namespace),
+            self.ns_schema_link) for db_namespace in database_ns_list]
+
     @utils.mutating
     def create(self, req, namespace):
         try:
@@ -212,19 +230,17 @@ class NamespaceController(object):
 
     def show(self, req, namespace, filters=None):
         try:
-            # Get namespace
+            # Get namespace along with its objects, resource type
+            # associations, properties and tags
             ns_repo = self.gateway.get_metadef_namespace_repo(req.context)
-            namespace_obj = ns_repo.get(namespace)
+            namespace_obj, details = ns_repo.get_details(namespace)
             namespace_detail = Namespace.to_wsme_model(
                 namespace_obj,
                 get_namespace_href(namespace_obj),
                 self.ns_schema_link)
-            ns_filters = dict()
-            ns_filters['namespace'] = namespace
 
             # Get objects
-            object_repo = self.gateway.get_metadef_object_repo(req.context)
-            db_metaobject_list = object_repo.list(filters=ns_filters)
+            db_metaobject_list = details['objects']
             object_list = [MetadefObject.to_wsme_model(
                 db_metaobject,
                 get_object_href(namespace, db_metaobject),
@@ -233,8 +249,7 @@ class NamespaceController(object):
                 namespace_detail.objects = object_list
 
             # Get resource type associations
-            rs_repo = self.gateway.get_metadef_resource_type_repo(req.context)
-            db_resource_type_list = rs_repo.list(filters=ns_filters)
+            db_resource_type_list = details['resource_type_associations']
             resource_type_list = [ResourceTypeAssociation.to_wsme_model(
                 resource_type) for resource_type in db_resource_type_list]
             if resource_type_list:
@@ -242,8 +257,7 @@ class NamespaceController(object):
                     resource_type_list)
 
             # Get properties
-            prop_repo = self.gateway.get_metadef_property_repo(req.context)
-            db_properties = prop_repo.list(filters=ns_filters)
+            db_properties = details['properties']
             property_list = Namespace.to_model_properties(db_properties)
             if property_list:
                 namespace_detail.properties = property_list
@@ -253,8 +267,7 @@ class NamespaceController(object):
                     namespace_detail, filters['resource_type'])
 
             # Get tags
-            tag_repo = self.gateway.get_metadef_tag_repo(req.context)
-            db_metatag_list = tag_repo.list(filters=ns_filters)
+            db_metatag_list = details['tags']
             tag_list = [MetadefTag(**{'name': db_metatag.name})
                         for db_metatag in db_metatag_list]
             if tag_list:
@@ -512,6 +525,10 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
     def show(self, response, namespace):
         ns_json = json.tojson(Namespace, namespace)
         response = self.__render(ns_json, response)
+        # NOTE: Clients sending the ETag back in If-None-Match get a
+        # 304 Not Modified without the body when nothing changed.
+        response.md5_etag()
+        response.conditional_response = True
 
     def index(self, response, result):
         params = dict(response.request.params)
@@ -528,6 +545,8 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
 
         ns_json = json.tojson(Namespaces, result)
         response = self.__render(ns_json, response)
+        response.md5_etag()
+        response.conditional_response = True
 
     def update(self, response, namespace):
         ns_json = json.tojson(Namespace, namespace)
@@ -26,6 +26,7 @@ from glance.api.v2.model.metadef_resource_type import ResourceTypeAssociation
 from glance.api.v2.model.metadef_resource_type import ResourceTypeAssociations
 from glance.api.v2.model.metadef_resource_type import ResourceTypes
 from glance.common import exception
+from glance.common import metadef_cache
 from glance.common import wsgi
 import glance.db
 import glance.gateway
@@ -47,13 +48,21 @@ class ResourceTypeController(object):
                                               policy_enforcer=self.policy)
 
     def index(self, req):
+        cache_key = metadef_cache.make_key('resource_types', req.context)
         try:
-            filters = {'namespace': None}
-            rs_type_repo = self.gateway.get_metadef_resource_type_repo(
-                req.context)
-            db_resource_type_list = rs_type_repo.list(filters=filters)
-            resource_type_list = [ResourceType.to_wsme_model(
-                resource_type) for resource_type in db_resource_type_list]
+            resource_type_list = metadef_cache.get(cache_key)
+            if resource_type_list is not None:
+                self.policy.enforce(req.context,
+                                    'list_metadef_resource_types', {})
+            else:
+                version = metadef_cache.get_version()
+                filters = {'namespace': None}
+                rs_type_repo = self.gateway.get_metadef_resource_type_repo(
+                    req.context)
+                db_resource_type_list = rs_type_repo.list(filters=filters)
+                resource_type_list = [ResourceType.to_wsme_model(
+                    resource_type) for resource_type in db_resource_type_list]
+                metadef_cache.store(cache_key, resource_type_list, version)
             resource_types = ResourceTypes()
             resource_types.resource_types = resource_type_list
         except exception.Forbidden as e:
@@ -186,6 +195,10 @@ class ResponseSerializer(wsgi.JSONResponseSerializer):
         body = jsonutils.dumps(resource_type_json, ensure_ascii=False)
         response.unicode_body = six.text_type(body)
         response.content_type = 'application/json'
+        # NOTE: Clients sending the ETag back in If-None-Match get a
+        # 304 Not Modified without the body when nothing changed.
+        response.md5_etag()
+        response.conditional_response = True
 
     def create(self, response, result):
         resource_type_json = json.tojson(ResourceTypeAssociation, result)
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
 import json
 import logging
 import os
@@ -31,8 +32,10 @@ from taskflow import task
 from taskflow.types import failure
 
 from glance.common import exception
+from glance.common import format_inspector
 from glance.common.scripts.image_import import main as image_import
 from glance.common.scripts import utils as script_utils
+from glance.common import utils
 from glance import i18n
 
 
@@ -41,9 +44,37 @@ _ = i18n._
 _LE = i18n._LE
 _LI = i18n._LI
 
+import_task_opts = [
+    cfg.BoolOpt('streaming_import',
+                default=False,
+                help=_("Whether image imports should stream the image data "
+                       "straight into the store. The disk format and virtual "
+                       "size are then read from the image header while the "
+                       "data is transferred, and the image is only copied to "
+                       "the work dir and introspected with qemu-img when its "
+                       "format can't be recognised. Streaming imports are "
+                       "not used when image conversion is enabled.")),
+]
+
+CHUNK_SIZE = 65536
 
 CONF = cfg.CONF
 
+# NOTE: Registered under the taskflow_executor section like the options of
+# the conversion task.
+CONF.register_opts(import_task_opts, group='taskflow_executor')
+CONF.import_opt('conversion_format', 'glance.async.flows.convert',
+                group='taskflow_executor')
+
+
+def _check_image_info(path, metadata):
+    backing_file = metadata.get('backing-filename')
+    if backing_file is not None:
+        msg = _("File %(path)s has invalid backing file "
+                "%(bfile)s, aborting.") % {'path': path,
+                                           'bfile': backing_file}
+        raise RuntimeError(msg)
+
 
 class _CreateImage(task.Task):
 
@@ -166,13 +197,7 @@ class _ImportToFS(task.Task):
                 LOG.error(msg)
 
         metadata = json.loads(stdout)
-
-        backing_file = metadata.get('backing-filename')
-        if backing_file is not None:
-            msg = _("File %(path)s has invalid backing file "
-                    "%(bfile)s, aborting.") % {'path': path,
-                                               'bfile': backing_file}
-            raise RuntimeError(msg)
+        _check_image_info(path, metadata)
 
         return path
 
@@ -272,49 +297,122 @@ class _ImportToStore(task.Task):
         image.status = 'saving'
         self.image_repo.save(image)
 
-        # NOTE(flaper87): Let's dance... and fall
-        #
-        # Unfortunatelly, because of the way our domain layers work and
-        # the checks done in the FS store, we can't simply rename the file
-        # and set the location. To do that, we'd have to duplicate the logic
-        # of every and each of the domain factories (quota, location, etc)
-        # and we'd also need to hack the FS store to prevent it from raising
-        # a "duplication path" error. I'd rather have this task copying the
-        # image bits one more time than duplicating all that logic.
-        #
-        # Since I don't think this should be the definitive solution, I'm
-        # leaving the code below as a reference for what should happen here
-        # once the FS store and domain code will be able to handle this case.
-        #
-        # if file_path is None:
-        #    image_import.set_image_data(image, self.uri, None)
-        #    return
-
         # NOTE(flaper87): Don't assume the image was stored in the
         # work_dir. Think in the case this path was provided by another task.
         # Also, lets try to neither assume things nor create "logic"
         # dependencies between this task and `_ImportToFS`
         #
-        # base_path = os.path.dirname(file_path.split("file://")[-1])
+        # The scratch file is handed to the domain layers as a local file.
+        # When the FS store is the default store and lives on the same
+        # filesystem as the scratch file (scenarios #3 and #4), the location
+        # layer hard links the file into the store instead of writing it
+        # again. The data is still read through the domain proxies so that
+        # the quota, size and checksum handling is the same as for a copy.
+        # In every other case the data is copied as usual.
+        if file_path is not None:
+            image_import.set_image_data(image, file_path, self.task_id,
+                                        linkable=True)
+        else:
+            image_import.set_image_data(image, self.uri, self.task_id)
 
-        # NOTE(flaper87): Hopefully just scenarios #3 and #4. I say
-        # hopefully because nothing prevents the user to use the same
-        # FS store path as a work dir
-        #
-        # image_path = os.path.join(base_path, image_id)
-        #
-        # if (base_path == CONF.glance_store.filesystem_store_datadir or
-        #      base_path in CONF.glance_store.filesystem_store_datadirs):
-        #     os.rename(file_path, image_path)
-        #
-        # image_import.set_image_data(image, image_path, None)
+        # NOTE(flaper87): We need to save the image again after the locations
+        # have been set in the image.
+        self.image_repo.save(image)
 
-        image_import.set_image_data(image, file_path or self.uri, self.task_id)
+
+class _StreamToStore(task.Task):
+
+    def __init__(self, task_id, task_type, image_repo, uri):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.image_repo = image_repo
+        self.uri = uri
+        super(_StreamToStore, self).__init__(
+            name='%s-StreamToStore-%s' % (task_type, task_id))
+
+    def _read_header(self, data):
+        chunks = []
+        length = 0
+        while length < format_inspector.HEADER_SIZE:
+            chunk = data.read(format_inspector.HEADER_SIZE - length)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            length += len(chunk)
+        return b''.join(chunks)
+
+    def _introspect(self, path):
+        stdout, stderr = putils.trycmd('qemu-img', 'info',
+                                       '--output=json', path,
+                                       log_errors=putils.LOG_ALL_ERRORS)
+        if stderr:
+            raise RuntimeError(stderr)
+        metadata = json.loads(stdout)
+        _check_image_info(path, metadata)
+        return {'format': metadata.get('format'),
+                'virtual-size': metadata.get('virtual-size', 0)}
+
+    def _import(self, image_id, info, data, size=None):
+        image = self.image_repo.get(image_id)
+        if info is not None:
+            image.disk_format = info['format']
+            image.virtual_size = info['virtual-size']
+        image.status = 'saving'
+        self.image_repo.save(image)
+
+        image.set_data(data, size=size)
 
         # NOTE(flaper87): We need to save the image again after the locations
         # have been set in the image.
         self.image_repo.save(image)
 
+    def _import_from_work_dir(self, image_id, header, data):
+        path = os.path.join(CONF.task.work_dir, '%s.tasks_import' % image_id)
+        try:
+            with open(path, 'wb') as scratch:
+                scratch.write(header)
+                for chunk in iter(lambda: data.read(CHUNK_SIZE), b''):
+                    scratch.write(chunk)
+
+            info = self._introspect(path)
+            # NOTE: The scratch file is linked into the store when possible,
+            # see location.ImageProxy.set_data.
+            scratch_data = utils.LocalFileReader(path)
+            try:
+                self._import(image_id, info, scratch_data, scratch_data.size)
+            finally:
+                scratch_data.close()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def execute(self, image_id):
+        """Stream the image data to the store, introspecting it on the way
+
+        :param image_id: Glance Image ID
+        """
+        data = script_utils.get_image_data_iter(self.uri)
+        try:
+            header = self._read_header(data)
+            info = format_inspector.inspect(header)
+            if info is None and CONF.task.work_dir is not None:
+                LOG.debug("%(task_id)s: Unrecognised image format, falling "
+                          "back to qemu-img introspection",
+                          {'task_id': self.task_id})
+                self._import_from_work_dir(image_id, header, data)
+                return
+
+            if info is not None and info['backing-file']:
+                msg = _("Image %(image_id)s of format %(format)s depends on "
+                        "a backing file, aborting.") % {
+                            'image_id': image_id, 'format': info['format']}
+                raise RuntimeError(msg)
+
+            rest = iter(lambda: data.read(CHUNK_SIZE), b'')
+            self._import(image_id, info, itertools.chain([header], rest))
+        finally:
+            data.close()
+
 
 class _SaveImage(task.Task):
 
@@ -417,6 +515,15 @@ def get_flow(**kwargs):
     flow = lf.Flow(task_type, retry=retry.AlwaysRevert()).add(
         _CreateImage(task_id, task_type, task_repo, image_repo, image_factory))
 
+    if (CONF.taskflow_executor.streaming_import and
+            CONF.taskflow_executor.conversion_format is None):
+        flow.add(
+            _StreamToStore(task_id, task_type, image_repo, uri),
+            _SaveImage(task_id, task_type, image_repo),
+            _CompleteTask(task_id, task_type, task_repo)
+        )
+        return flow
+
     import_to_store = _ImportToStore(task_id, task_type, image_repo, uri)
 
     try:
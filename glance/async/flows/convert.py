@@ -13,14 +13,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import json
 import logging
 import os
+import re
+import time
 
+from eventlet.green import subprocess
 from oslo_concurrency import processutils as putils
 from oslo_config import cfg
+from oslo_utils import encodeutils
 from taskflow.patterns import linear_flow as lf
 from taskflow import task
 
+from glance.common import format_inspector
+from glance.common.scripts import utils as script_utils
 from glance import i18n
 
 _ = i18n._
@@ -34,8 +41,22 @@ convert_task_opts = [
                choices=('qcow2', 'raw', 'vmdk'),
                help=_("The format to which images will be automatically "
                       "converted.")),
+    cfg.IntOpt('conversion_workers',
+               default=1,
+               min=1,
+               max=16,
+               help=_("The number of coroutines qemu-img uses to convert an "
+                      "image. Values greater than 1 also let qemu-img write "
+                      "the converted image out of order, and require "
+                      "qemu-img 2.9 or later.")),
 ]
 
+# NOTE: Minimum time in seconds between two updates of the task message
+# with the conversion progress.
+PROGRESS_INTERVAL = 5
+
+_PROGRESS_RE = re.compile(r'\((\d+(?:\.\d+)?)/100%\)')
+
 CONF = cfg.CONF
 
 # NOTE(flaper87): Registering under the taskflow_executor section
@@ -48,13 +69,70 @@ class _Convert(task.Task):
 
     conversion_missing_warned = False
 
-    def __init__(self, task_id, task_type, image_repo):
+    def __init__(self, task_id, task_type, image_repo, task_repo=None):
         self.task_id = task_id
         self.task_type = task_type
         self.image_repo = image_repo
+        self.task_repo = task_repo
         super(_Convert, self).__init__(
             name='%s-Convert-%s' % (task_type, task_id))
 
+    def _get_format(self, path):
+        with open(path, 'rb') as image_file:
+            info = format_inspector.inspect(
+                image_file.read(format_inspector.HEADER_SIZE))
+        if info is not None:
+            return info['format']
+
+        stdout, stderr = putils.trycmd('qemu-img', 'info',
+                                       '--output=json', path,
+                                       log_errors=putils.LOG_ALL_ERRORS)
+        if stderr:
+            raise RuntimeError(stderr)
+        return json.loads(stdout).get('format')
+
+    def _set_progress(self, message):
+        if self.task_repo is None:
+            return
+        task = script_utils.get_task(self.task_repo, self.task_id)
+        if task is None:
+            return
+        task.message = message
+        self.task_repo.save(task)
+
+    def _convert(self, conversion_format, src_path, dest_path):
+        cmd = ['qemu-img', 'convert', '-p', '-O', conversion_format]
+        workers = CONF.taskflow_executor.conversion_workers
+        if workers > 1:
+            cmd += ['-m', str(workers), '-W']
+        cmd += [src_path, dest_path]
+
+        LOG.debug("%(task_id)s: Running %(cmd)s",
+                  {'task_id': self.task_id, 'cmd': ' '.join(cmd)})
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        # NOTE: qemu-img reports progress as "(12.34/100%)" records
+        # separated by carriage returns. Anything else is an error message.
+        output = []
+        last_update = 0
+        for line in iter(process.stdout.readline, b''):
+            for record in encodeutils.safe_decode(line).split('\r'):
+                match = _PROGRESS_RE.search(record)
+                if match is None:
+                    if record.strip():
+                        output.append(record.strip())
+                    continue
+                now = time.time()
+                if now - last_update >= PROGRESS_INTERVAL:
+                    last_update = now
+                    self._set_progress(_("Converting image to %(format)s: "
+                                         "%(progress)s%%") %
+                                       {'format': conversion_format,
+                                        'progress': match.group(1)})
+
+        if process.wait() != 0:
+            raise RuntimeError('\n'.join(output))
+
     def execute(self, image_id, file_path):
 
         # NOTE(flaper87): A format must be explicitly
@@ -72,18 +150,18 @@ class _Convert(task.Task):
                 _Convert.conversion_missing_warned = True
             return
 
-        # TODO(flaper87): Check whether the image is in the desired
-        # format already. Probably using `qemu-img` just like the
-        # `Introspection` task.
-        dest_path = os.path.join(CONF.task.work_dir, "%s.converted" % image_id)
-        stdout, stderr = putils.trycmd('qemu-img', 'convert', '-O',
-                                       conversion_format, file_path, dest_path,
-                                       log_errors=putils.LOG_ALL_ERRORS)
+        src_path = file_path.split("file://")[-1]
+        if self._get_format(src_path) == conversion_format:
+            LOG.debug("%(task_id)s: Image is already in %(format)s format, "
+                      "skipping conversion",
+                      {'task_id': self.task_id, 'format': conversion_format})
+            return
 
-        if stderr:
-            raise RuntimeError(stderr)
+        dest_path = os.path.join(CONF.task.work_dir, "%s.converted" % image_id)
+        self._convert(conversion_format, src_path, dest_path)
+        self._set_progress(_("Image converted to %s") % conversion_format)
 
-        os.rename(dest_path, file_path.split("file://")[-1])
+        os.rename(dest_path, src_path)
         return file_path
 
     def revert(self, image_id, result=None, **kwargs):
@@ -104,11 +182,13 @@ def get_flow(**kwargs):
     :param task_id: Task ID.
     :param task_type: Type of the task.
     :param image_repo: Image repository used.
+    :param task_repo: Task repository used to report the progress.
     """
     task_id = kwargs.get('task_id')
     task_type = kwargs.get('task_type')
     image_repo = kwargs.get('image_repo')
+    task_repo = kwargs.get('task_repo')
 
     return lf.Flow(task_type).add(
-        _Convert(task_id, task_type, image_repo),
+        _Convert(task_id, task_type, image_repo, task_repo),
     )
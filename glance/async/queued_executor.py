@@ -0,0 +1,30 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_log import log as logging
+
+import glance.async
+
+
+LOG = logging.getLogger(__name__)
+
+
+class TaskExecutor(glance.async.TaskExecutor):
+    """Leaves tasks in the database for a glance-task-worker to run.
+
+    Tasks stay in 'pending' status, which makes the tasks table the work
+    queue: task workers claim pending tasks and run them with the taskflow
+    executor, outside of the API process.
+    """
+
+    def begin_processing(self, task_id):
+        LOG.debug("Task %s queued for a task worker", task_id)
@@ -0,0 +1,173 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import datetime
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import encodeutils
+from oslo_utils import timeutils
+
+from glance.async import taskflow_executor
+from glance import context
+import glance.db
+import glance.gateway
+from glance import i18n
+
+_ = i18n._
+_LE = i18n._LE
+_LI = i18n._LI
+_LW = i18n._LW
+LOG = logging.getLogger(__name__)
+
+task_worker_opts = [
+    cfg.IntOpt('poll_interval',
+               default=5,
+               help=_("Time in seconds between two checks of the task "
+                      "queue for pending tasks.")),
+    cfg.IntOpt('max_tasks',
+               default=4,
+               help=_("The maximum number of tasks a task worker process "
+                      "runs at the same time.")),
+    cfg.DictOpt('task_type_limits',
+                default={},
+                help=_("The maximum number of tasks of a given type a task "
+                       "worker process runs at the same time, as a list of "
+                       "type:limit pairs, e.g. 'import:2'. Task types not "
+                       "listed are only bounded by max_tasks.")),
+    cfg.IntOpt('claim_timeout',
+               default=600,
+               help=_("Time in seconds after which a task left in "
+                      "processing by a task worker which stopped renewing "
+                      "its claim, e.g. because it was killed, can be "
+                      "claimed again by another task worker. Must be "
+                      "larger than poll_interval.")),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(task_worker_opts, group='task_worker')
+CONF.import_opt('admin_role', 'glance.api.middleware.context')
+
+
+class TaskWorker(object):
+    """Runs the tasks queued by the 'queued' task executor.
+
+    Pending tasks are read from the database, claimed atomically so that
+    several worker processes can share one queue, and run with the
+    taskflow executor. A worker renews the claims on the tasks it runs at
+    every poll, so tasks whose claim has not been renewed for claim_timeout
+    seconds were abandoned by their worker and are claimed again.
+    """
+
+    def __init__(self, store_api=None):
+        self.db_api = glance.db.get_api()
+        self.gateway = glance.gateway.Gateway(self.db_api, store_api)
+        self.admin_context = context.RequestContext(
+            is_admin=True, roles=[CONF.admin_role])
+        self.max_tasks = CONF.task_worker.max_tasks
+        self.type_limits = {
+            task_type: int(limit) for task_type, limit
+            in CONF.task_worker.task_type_limits.items()}
+        self.pool = eventlet.greenpool.GreenPool(self.max_tasks)
+        self.running = collections.Counter()
+        self.running_ids = set()
+
+    def _has_capacity(self, task_type):
+        limit = self.type_limits.get(task_type)
+        return limit is None or self.running[task_type] < limit
+
+    def poll(self):
+        """Claim and start as many pending tasks as limits allow.
+
+        :returns: the number of tasks started
+        """
+        if self.running_ids:
+            self.db_api.task_claim_renew(self.admin_context,
+                                         list(self.running_ids))
+
+        free = self.max_tasks - sum(self.running.values())
+        if free <= 0:
+            return 0
+
+        stale_before = (timeutils.utcnow() - datetime.timedelta(
+            seconds=CONF.task_worker.claim_timeout))
+        tasks = self._get_stale_tasks(stale_before, free)
+        # NOTE: Tasks of a type at its limit are skipped, so fetch more
+        # candidates than there are free slots.
+        tasks += self.db_api.task_get_all(self.admin_context,
+                                          filters={'status': 'pending'},
+                                          sort_key='created_at',
+                                          sort_dir='asc',
+                                          limit=free * 2)
+        started = 0
+        for task in tasks:
+            if started == free:
+                break
+            if not self._has_capacity(task['type']):
+                continue
+            if not self.db_api.task_claim(self.admin_context, task['id'],
+                                          stale_before=stale_before):
+                # Another worker got there first
+                continue
+
+            self.running[task['type']] += 1
+            self.running_ids.add(task['id'])
+            self.pool.spawn_n(self._run_task, task['id'], task['type'],
+                              task['owner'])
+            started += 1
+        return started
+
+    def _get_stale_tasks(self, stale_before, limit):
+        """Return the processing tasks whose claim has expired."""
+        tasks = self.db_api.task_get_all(self.admin_context,
+                                         filters={'status': 'processing'},
+                                         sort_key='updated_at',
+                                         sort_dir='asc',
+                                         limit=limit)
+        stale = [task for task in tasks
+                 if task['updated_at'] < stale_before and
+                 task['id'] not in self.running_ids]
+        for task in stale:
+            LOG.warn(_LW("Task %s was abandoned by its task worker, "
+                         "claiming it again"), task['id'])
+        return stale
+
+    def _run_task(self, task_id, task_type, owner):
+        LOG.info(_LI("Task worker running task %(id)s of type %(type)s"),
+                 {'id': task_id, 'type': task_type})
+        try:
+            ctxt = context.RequestContext(is_admin=True, tenant=owner,
+                                          roles=[CONF.admin_role])
+            executor = taskflow_executor.TaskExecutor(
+                ctxt,
+                self.gateway.get_task_repo(ctxt),
+                self.gateway.get_repo(ctxt),
+                self.gateway.get_image_factory(ctxt))
+            executor._run(task_id, task_type)
+        except Exception as e:
+            LOG.error(_LE("Task %(id)s failed in the task worker: %(exc)s"),
+                      {'id': task_id,
+                       'exc': encodeutils.exception_to_unicode(e)})
+        finally:
+            self.running[task_type] -= 1
+            self.running_ids.discard(task_id)
+
+    def run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                LOG.error(_LE("Unable to read the task queue: %s"),
+                          encodeutils.exception_to_unicode(e))
+            eventlet.sleep(CONF.task_worker.poll_interval)
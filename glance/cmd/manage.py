@@ -42,10 +42,12 @@ from oslo_config import cfg
 from oslo_db.sqlalchemy import migration
 from oslo_log import log as logging
 from oslo_utils import encodeutils
+from oslo_utils import timeutils
 import six
 
 from glance.common import config
 from glance.common import exception
+import glance.context
 from glance.db import migration as db_migration
 from glance.db.sqlalchemy import api as db_api
 from glance.db.sqlalchemy import metadata
@@ -56,6 +58,9 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 _ = i18n._
 
+# Number of expired tasks deleted in each database transaction
+DEFAULT_TASK_BATCH_SIZE = 1000
+
 
 # Decorators for actions
 def args(*args, **kwargs):
@@ -138,6 +143,32 @@ class DbCommands(object):
         """Unload metadefinitions from database"""
         metadata.db_unload_metadefs(db_api.get_engine())
 
+    @args('--max_rows', metavar='<number>', type=int,
+          help='Maximum number of tasks deleted in each database '
+               'transaction, defaults to %d' % DEFAULT_TASK_BATCH_SIZE)
+    @args('--purge', action='store_true',
+          help='Remove the expired tasks from the database instead of '
+               'marking them deleted, tasks already marked deleted '
+               'included')
+    def delete_expired_tasks(self, max_rows=None, purge=False):
+        """Delete the tasks which expired, in batches"""
+        if max_rows is None:
+            max_rows = DEFAULT_TASK_BATCH_SIZE
+        elif max_rows < 1:
+            sys.exit(_("Maximum number of rows must be a positive integer"))
+        context = glance.context.RequestContext(is_admin=True)
+        # NOTE: Tasks expiring while this runs are left for the next run
+        expired_before = timeutils.utcnow()
+        total = 0
+        while True:
+            deleted = db_api.task_delete_expired(
+                context, expired_before=expired_before, max_rows=max_rows,
+                purge=purge)
+            total += deleted
+            if deleted < max_rows:
+                break
+        print(_("Deleted %d expired tasks") % total)
+
     @args('--path', metavar='<path>', help='Path to the directory where '
                                            'json metadata files should be '
                                            'saved.')
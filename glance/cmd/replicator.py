@@ -18,13 +18,19 @@
 
 from __future__ import print_function
 
+import functools
+import hashlib
 import os
 import sys
+import threading
 
+import futurist
+from futurist import waiters
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
+from oslo_utils import excutils
 from oslo_utils import uuidutils
 import six
 from six.moves import http_client
@@ -58,6 +64,15 @@ cli_opts = [
                 short='m',
                 default=False,
                 help="Only replicate metadata, not images."),
+    cfg.IntOpt('concurrency',
+               default=1,
+               help="Number of image data transfers to run concurrently."),
+    cfg.StrOpt('statefile',
+               default='',
+               help=("File in which livecopy records the images it has "
+                     "replicated. When an interrupted livecopy is run "
+                     "again with the same state file, those images are "
+                     "skipped.")),
     cfg.StrOpt('token',
                short='t',
                default='',
@@ -95,6 +110,11 @@ if os.path.exists(os.path.join(possible_topdir, 'glance', '__init__.py')):
     sys.path.insert(0, possible_topdir)
 
 
+# Number of disk operations the dump command may queue while it reads
+# further data from the network.
+DUMP_PIPELINE_DEPTH = 64
+
+
 COMMANDS = """Commands:
 
     help <command>  Output help for one of the commands below
@@ -348,6 +368,92 @@ def replication_size(options, args):
            'img_count': count})
 
 
+MANIFEST_FILE_NAME = 'manifest.json'
+
+
+class _PipelinedWriter(object):
+    """Performs queued disk operations in a background thread.
+
+    This lets the caller read the next chunk, or the next image, from the
+    network while earlier chunks are still being written to disk. At most
+    `depth` operations are queued, which bounds the memory used.
+    """
+
+    def __init__(self, depth):
+        self.queue = six.moves.queue.Queue(maxsize=depth)
+        self.error = None
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            operation, always = item
+            if self.error is None or always:
+                try:
+                    operation()
+                except Exception as e:
+                    if self.error is None:
+                        self.error = e
+
+    def submit(self, func, *args):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((functools.partial(func, *args), False))
+
+    def cleanup(self, func, *args):
+        """Queue an operation which runs even after an earlier one failed."""
+        self.queue.put((functools.partial(func, *args), True))
+
+    def join(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def _read_manifest(path):
+    """Read the manifest index of a dump directory.
+
+    path: a directory on disk containing a dump
+
+    Returns: a dictionary of image id to manifest entry, empty if the dump
+             has no manifest
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return jsonutils.loads(f.read())
+
+
+def _write_manifest(path, manifest):
+    manifest_path = os.path.join(path, MANIFEST_FILE_NAME)
+    with open(manifest_path + '.part', 'w') as f:
+        f.write(jsonutils.dumps(manifest))
+    os.rename(manifest_path + '.part', manifest_path)
+
+
+def _discard_part(f, part_path):
+    f.close()
+    try:
+        os.unlink(part_path)
+    except OSError:
+        pass
+
+
+def _write_metadata(data_path, image):
+    if six.PY3:
+        f = open(data_path, 'w', encoding='utf-8')
+    else:
+        f = open(data_path, 'w')
+    with f:
+        f.write(jsonutils.dumps(image))
+
+
 def replication_dump(options, args):
     """%(prog)s dump <server:port> <path>
 
@@ -367,34 +473,70 @@ def replication_dump(options, args):
     imageservice = get_image_service()
     client = imageservice(http_client.HTTPConnection(server, port),
                           options.mastertoken)
-    for image in client.get_images():
-        LOG.debug('Considering: %s' % image['id'])
 
-        data_path = os.path.join(path, image['id'])
-        if not os.path.exists(data_path):
-            LOG.info(_LI('Storing: %s'), image['id'])
+    manifest = _read_manifest(path)
+    writer = _PipelinedWriter(DUMP_PIPELINE_DEPTH)
+    try:
+        for image in client.get_images():
+            LOG.debug('Considering: %s' % image['id'])
 
-            # Dump glance information
-            if six.PY3:
-                f = open(data_path, 'w', encoding='utf-8')
-            else:
-                f = open(data_path, 'w')
-            with f:
-                f.write(jsonutils.dumps(image))
+            data_path = os.path.join(path, image['id'])
+            if os.path.exists(data_path):
+                continue
+
+            LOG.info(_LI('Storing: %s'), image['id'])
+            entry = {'status': image['status'], 'data': False}
 
             if image['status'] == 'active' and not options.metaonly:
                 # Now fetch the image. The metadata returned in headers here
                 # is the same as that which we got from the detailed images
-                # request earlier, so we can ignore it here. Note that we also
-                # only dump active images.
+                # request earlier, so we can ignore it here. Note that we
+                # also only dump active images.
                 LOG.debug('Image %s is active' % image['id'])
                 image_response = client.get_image(image['id'])
-                with open(data_path + '.img', 'wb') as f:
+                checksum = hashlib.md5()
+                size = 0
+
+                part_path = data_path + '.img.part'
+                f = open(part_path, 'wb')
+                try:
                     while True:
                         chunk = image_response.read(options.chunksize)
                         if not chunk:
                             break
-                        f.write(chunk)
+                        checksum.update(chunk)
+                        size += len(chunk)
+                        writer.submit(f.write, chunk)
+                    writer.submit(f.close)
+                except Exception:
+                    with excutils.save_and_reraise_exception():
+                        writer.cleanup(_discard_part, f, part_path)
+
+                expected = image.get('checksum')
+                if expected and checksum.hexdigest() != expected:
+                    LOG.error(_LE('Checksum mismatch for image %(id)s: '
+                                  'expected %(expected)s, got %(actual)s. '
+                                  'Discarding its data.'),
+                              {'id': image['id'], 'expected': expected,
+                               'actual': checksum.hexdigest()})
+                    writer.submit(os.unlink, part_path)
+                    continue
+
+                writer.submit(os.rename, part_path, data_path + '.img')
+                entry.update({'data': True, 'size': size,
+                              'checksum': checksum.hexdigest()})
+
+            # NOTE: The metadata file is written last, so its presence
+            # tells a later dump that this image is complete. The manifest
+            # entry is only recorded by the writer once the data and
+            # metadata files are in place.
+            writer.submit(_write_metadata, data_path, image)
+            writer.submit(manifest.__setitem__, image['id'], entry)
+    finally:
+        try:
+            writer.join()
+        finally:
+            _write_manifest(path, manifest)
 
 
 def _dict_diff(a, b):
@@ -445,6 +587,7 @@ def replication_load(options, args):
                           options.slavetoken)
 
     updated = []
+    manifest = _read_manifest(path)
 
     for ent in os.listdir(path):
         if uuidutils.is_uuid_like(ent):
@@ -481,13 +624,24 @@ def replication_load(options, args):
                     updated.append(meta['id'])
 
             else:
-                if not os.path.exists(os.path.join(path, image_uuid + '.img')):
+                img_file_name = os.path.join(path, image_uuid + '.img')
+                if not os.path.exists(img_file_name):
                     LOG.debug('%s dump is missing image data, skipping' %
                               image_uuid)
                     continue
 
-                # Upload the image itself
-                with open(os.path.join(path, image_uuid + '.img')) as img_file:
+                entry = manifest.get(image_uuid)
+                if (entry and entry.get('data') and
+                        os.path.getsize(img_file_name) != entry['size']):
+                    LOG.error(_LE('Image data for %(id)s does not match the '
+                                  'size recorded in the dump manifest, '
+                                  'skipping'), {'id': image_uuid})
+                    continue
+
+                # Upload the image itself. The file object is streamed to
+                # the server in blocks, so memory use does not depend on
+                # the image size; the server verifies the checksum.
+                with open(img_file_name, 'rb') as img_file:
                     try:
                         headers, body = client.add_image(meta, img_file)
                         _check_upload_response_headers(headers, body)
@@ -499,6 +653,77 @@ def replication_load(options, args):
     return updated
 
 
+class ReplicationState(object):
+    """Record of the images a livecopy has already replicated.
+
+    Image ids are appended to the state file one per line as soon as they
+    are replicated, so the file survives an interrupted run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.lock = threading.Lock()
+        self.state_file = None
+
+        if path:
+            if os.path.exists(path):
+                with open(path) as f:
+                    self.done = set(line.strip() for line in f
+                                    if line.strip())
+            self.state_file = open(path, 'a')
+
+    def __contains__(self, image_uuid):
+        return image_uuid in self.done
+
+    def add(self, image_uuid):
+        with self.lock:
+            self.done.add(image_uuid)
+            if self.state_file:
+                self.state_file.write('%s\n' % image_uuid)
+                self.state_file.flush()
+
+    def close(self):
+        if self.state_file:
+            self.state_file.close()
+
+
+def _get_images_by_id(client):
+    """Fetch the detailed list of images, keyed by image id.
+
+    client: the ImageService
+
+    Returns: a dictionary of image id to image metadata
+    """
+    return {image['id']: image for image in client.get_images()}
+
+
+def _livecopy_image_data(options, imageservice, master_server, master_port,
+                         slave_server, slave_port, image):
+    """Copy the data of a single image from the master to the slave.
+
+    Each call uses its own connections, so that several copies can run
+    concurrently.
+
+    Returns: True if the image was copied
+    """
+    master_client = imageservice(
+        http_client.HTTPConnection(master_server, master_port),
+        options.mastertoken)
+    slave_client = imageservice(
+        http_client.HTTPConnection(slave_server, slave_port),
+        options.slavetoken)
+
+    image_response = master_client.get_image(image['id'])
+    try:
+        headers, body = slave_client.add_image(image, image_response)
+        _check_upload_response_headers(headers, body)
+        return True
+    except exc.HTTPConflict:
+        LOG.error(_LE(IMAGE_ALREADY_PRESENT_MESSAGE) % image['id'])  # noqa
+        return False
+
+
 def replication_livecopy(options, args):
     """%(prog)s livecopy <fromserver:port> <toserver:port>
 
@@ -522,49 +747,76 @@ def replication_livecopy(options, args):
     master_conn = http_client.HTTPConnection(master_server, master_port)
     master_client = imageservice(master_conn, options.mastertoken)
 
-    updated = []
+    # NOTE: A single paged listing of the slave tells us which images are
+    # already present, instead of a HEAD request per master image.
+    slave_images = _get_images_by_id(slave_client)
+    state = ReplicationState(options.statefile)
+    executor = futurist.ThreadPoolExecutor(
+        max_workers=max(options.concurrency, 1))
 
-    for image in master_client.get_images():
-        LOG.debug('Considering %(id)s' % {'id': image['id']})
-        for key in options.dontreplicate.split(' '):
-            if key in image:
-                LOG.debug('Stripping %(header)s from master metadata',
-                          {'header': key})
-                del image[key]
+    updated = []
+    transfers = []
+
+    def _on_transfer_done(image_uuid, future):
+        if future.exception() is not None:
+            LOG.error(_LE('Image %(id)s failed to sync: %(exc)s'),
+                      {'id': image_uuid,
+                       'exc': encodeutils.exception_to_unicode(
+                           future.exception())})
+        elif future.result():
+            updated.append(image_uuid)
+            state.add(image_uuid)
 
-        if _image_present(slave_client, image['id']):
-            # NOTE(mikal): Perhaps we just need to update the metadata?
-            # Note that we don't attempt to change an image file once it
-            # has been uploaded.
-            headers = slave_client.get_image_meta(image['id'])
-            if headers['status'] == 'active':
-                for key in options.dontreplicate.split(' '):
-                    if key in image:
-                        LOG.debug('Stripping %(header)s from master '
-                                  'metadata', {'header': key})
-                        del image[key]
-                    if key in headers:
-                        LOG.debug('Stripping %(header)s from slave '
-                                  'metadata', {'header': key})
-                        del headers[key]
+    try:
+        for image in master_client.get_images():
+            LOG.debug('Considering %(id)s' % {'id': image['id']})
+            if image['id'] in state:
+                LOG.debug('Image %s was replicated by a previous run, '
+                          'skipping', image['id'])
+                continue
 
-                if _dict_diff(image, headers):
-                    LOG.info(_LI('Image %s metadata has changed'), image['id'])
-                    headers, body = slave_client.add_image_meta(image)
-                    _check_upload_response_headers(headers, body)
-                    updated.append(image['id'])
+            for key in options.dontreplicate.split(' '):
+                if key in image:
+                    LOG.debug('Stripping %(header)s from master metadata',
+                              {'header': key})
+                    del image[key]
 
-        elif image['status'] == 'active':
-            LOG.info(_LI('Image %s is being synced'), image['id'])
-            if not options.metaonly:
-                image_response = master_client.get_image(image['id'])
-                try:
-                    headers, body = slave_client.add_image(image,
-                                                           image_response)
-                    _check_upload_response_headers(headers, body)
-                    updated.append(image['id'])
-                except exc.HTTPConflict:
-                    LOG.error(_LE(IMAGE_ALREADY_PRESENT_MESSAGE) % image['id'])  # noqa
+            if image['id'] in slave_images:
+                # NOTE(mikal): Perhaps we just need to update the metadata?
+                # Note that we don't attempt to change an image file once it
+                # has been uploaded.
+                headers = dict(slave_images[image['id']])
+                if headers['status'] == 'active':
+                    for key in options.dontreplicate.split(' '):
+                        if key in headers:
+                            LOG.debug('Stripping %(header)s from slave '
+                                      'metadata', {'header': key})
+                            del headers[key]
+
+                    if _dict_diff(image, headers):
+                        LOG.info(_LI('Image %s metadata has changed'),
+                                 image['id'])
+                        headers, body = slave_client.add_image_meta(image)
+                        _check_upload_response_headers(headers, body)
+                        updated.append(image['id'])
+                state.add(image['id'])
+
+            elif image['status'] == 'active':
+                LOG.info(_LI('Image %s is being synced'), image['id'])
+                if not options.metaonly:
+                    future = executor.submit(_livecopy_image_data, options,
+                                             imageservice,
+                                             master_server, master_port,
+                                             slave_server, slave_port,
+                                             image)
+                    future.add_done_callback(
+                        functools.partial(_on_transfer_done, image['id']))
+                    transfers.append(future)
+
+        waiters.wait_for_all(transfers)
+    finally:
+        executor.shutdown()
+        state.close()
 
     return updated
 
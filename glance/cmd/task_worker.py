@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Glance Task Worker Service
+
+Runs the tasks queued by the 'queued' task executor. Several task workers
+may consume the same queue; each task is claimed by exactly one of them.
+"""
+
+import os
+import sys
+
+# If ../glance/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'glance', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+import eventlet
+
+import glance_store
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from glance.async import worker
+from glance.common import config
+
+eventlet.patcher.monkey_patch(all=False, socket=True, time=True, select=True,
+                              thread=True, os=True)
+
+CONF = cfg.CONF
+logging.register_options(CONF)
+
+
+def main():
+    try:
+        config.parse_args()
+        logging.setup(CONF, 'glance')
+
+        glance_store.register_opts(config.CONF)
+        glance_store.create_stores(config.CONF)
+        glance_store.verify_default_store()
+
+        worker.TaskWorker(glance_store).run()
+    except RuntimeError as e:
+        sys.exit("ERROR: %s" % e)
+
+
+if __name__ == '__main__':
+    main()
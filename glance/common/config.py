@@ -26,6 +26,7 @@ import os
 
 from oslo_config import cfg
 from oslo_policy import policy
+from oslo_utils import units
 from paste import deploy
 
 from glance import i18n
@@ -68,7 +69,10 @@ task_opts = [
     cfg.StrOpt('task_executor',
                default='taskflow',
                help=_("Specifies which task executor to be used to run the "
-                      "task scripts.")),
+                      "task scripts. 'taskflow' runs tasks inside the API "
+                      "worker that received them; 'queued' leaves them in "
+                      "the database to be run by glance-task-worker "
+                      "processes.")),
     cfg.StrOpt('work_dir',
                help=_('Work dir for asynchronous task operations. '
                       'The directory set here will be used to operate over '
@@ -173,6 +177,28 @@ common_opts = [
                       'digest-algorithms" to get the available algorithms '
                       'supported by the version of OpenSSL on the platform.'
                       ' Examples are "sha1", "sha256", "sha512", etc.')),
+    cfg.IntOpt('image_chunk_size', default=64 * units.Ki, min=4 * units.Ki,
+               help=_('Size in bytes of the chunks image data is read in '
+                      'from files, such as cached images, at the start of '
+                      'a transfer.')),
+    cfg.IntOpt('max_image_chunk_size', default=units.Mi, min=0,
+               help=_('Maximum size in bytes the chunks image data is read '
+                      'in from files grow to during a transfer. The chunk '
+                      'size is doubled every few chunks, which reduces the '
+                      'per chunk cost of the layers the data goes through. '
+                      'Setting it to no more than image_chunk_size disables '
+                      'growing the chunks.')),
+    cfg.BoolOpt('offload_data_processing', default=False,
+                help=_('If True, checksums of image data and writes to the '
+                       'image cache are run in native threads instead of '
+                       'the eventlet hub, so that concurrent transfers of a '
+                       'worker can use several CPUs. The number of native '
+                       'threads is set by the EVENTLET_THREADPOOL_SIZE '
+                       'environment variable.')),
+    cfg.IntOpt('offload_queue_size', default=4, min=1,
+               help=_('Maximum number of image data chunks of a single '
+                      'transfer waiting to be processed by a native thread '
+                      'when offload_data_processing is enabled.')),
 ]
 
 CONF = cfg.CONF
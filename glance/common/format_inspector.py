@@ -0,0 +1,106 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Helpers to recognise disk image formats from their first bytes.
+
+This allows image metadata to be gathered while the data is streamed,
+without having a local copy of the image to run ``qemu-img info`` on.
+Only formats whose virtual size is stored in a fixed place of the header
+are recognised; anything else needs to be introspected with qemu-img.
+"""
+
+import struct
+
+
+# NOTE: The ISO 9660 primary volume descriptor starts at 32k, every other
+# supported format keeps what we need in the first 512 bytes.
+HEADER_SIZE = 64 * 1024
+
+QCOW2_MAGIC = b'QFI\xfb'
+QCOW2_INCOMPAT_DATA_FILE = 1 << 2
+VHD_COOKIE = b'conectix'
+VHD_DIFFERENCING = 4
+VDI_SIGNATURE = 0xbeda107f
+VDI_DIFFERENCING = 4
+ISO_MAGIC = b'CD001'
+ISO_DESCRIPTOR_OFFSET = 0x8000
+
+
+def _unpack(fmt, header, offset):
+    return struct.unpack_from(fmt, header, offset)[0]
+
+
+def _inspect_qcow2(header):
+    if len(header) < 32 or header[:4] != QCOW2_MAGIC:
+        return None
+    version = _unpack('>I', header, 4)
+    has_backing_file = _unpack('>Q', header, 8) != 0
+    if version >= 3 and len(header) >= 80:
+        # NOTE: An external data file works just like a backing file.
+        incompatible = _unpack('>Q', header, 72)
+        has_backing_file |= bool(incompatible & QCOW2_INCOMPAT_DATA_FILE)
+    return {'format': 'qcow2',
+            'virtual-size': _unpack('>Q', header, 24),
+            'backing-file': has_backing_file}
+
+
+def _inspect_vhd(header):
+    # NOTE: Only dynamic and differencing disks have a copy of the footer
+    # at the beginning of the file. Fixed disks look like raw ones.
+    if len(header) < 64 or header[:8] != VHD_COOKIE:
+        return None
+    return {'format': 'vhd',
+            'virtual-size': _unpack('>Q', header, 48),
+            'backing-file': _unpack('>I', header, 60) == VHD_DIFFERENCING}
+
+
+def _inspect_vdi(header):
+    if len(header) < 0x178 or _unpack('<I', header, 0x40) != VDI_SIGNATURE:
+        return None
+    return {'format': 'vdi',
+            'virtual-size': _unpack('<Q', header, 0x170),
+            'backing-file': _unpack('<I', header, 0x4c) == VDI_DIFFERENCING}
+
+
+def _inspect_iso(header):
+    offset = ISO_DESCRIPTOR_OFFSET
+    if (len(header) < offset + 0x82 or
+            header[offset + 1:offset + 6] != ISO_MAGIC):
+        return None
+    blocks = _unpack('<I', header, offset + 0x50)
+    block_size = _unpack('<H', header, offset + 0x80)
+    return {'format': 'iso',
+            'virtual-size': blocks * block_size,
+            'backing-file': False}
+
+
+_INSPECTORS = (_inspect_qcow2, _inspect_vhd, _inspect_vdi, _inspect_iso)
+
+
+def inspect(header):
+    """Recognise a disk image format from the beginning of the image.
+
+    :param header: the first HEADER_SIZE bytes of the image, or the whole
+                   image if it is shorter than that
+    :returns: a dict with the 'format', 'virtual-size' and 'backing-file'
+              (whether the image depends on another file) keys, or None
+              when the format is not recognised
+    """
+    for inspector in _INSPECTORS:
+        info = inspector(header)
+        if info is not None:
+            return info
+    return None
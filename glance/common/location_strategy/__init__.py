@@ -26,11 +26,13 @@ _LE = i18n._LE
 
 location_strategy_opts = [
     cfg.StrOpt('location_strategy', default='location_order',
-               choices=('location_order', 'store_type'),
+               choices=('location_order', 'store_type', 'health'),
                help=_("This value sets what strategy will be used to "
                       "determine the image location order. Currently "
-                      "two strategies are packaged with Glance "
-                      "'location_order' and 'store_type'."))
+                      "three strategies are packaged with Glance "
+                      "'location_order', 'store_type' and 'health', which "
+                      "prefers the backends that recently served image "
+                      "data fastest and without errors."))
 ]
 
 CONF = cfg.CONF
@@ -114,3 +116,24 @@ def choose_best_location(locations, **kwargs):
         return locations[0]
     else:
         return None
+
+
+def tracks_location_health():
+    """Return whether the configured strategy orders locations by the
+    outcome of the previous reads of image data.
+    """
+    strategy_module = _available_strategies[CONF.location_strategy]
+    return hasattr(strategy_module, 'report_result')
+
+
+def report_location_result(uri, latency=None):
+    """
+    Let the configured strategy know the outcome of reading image data.
+
+    :param uri: The URI of the location read from.
+    :param latency: Number of seconds it took to get the first byte of
+                    data, None when reading failed.
+    """
+    strategy_module = _available_strategies[CONF.location_strategy]
+    if hasattr(strategy_module, 'report_result'):
+        strategy_module.report_result(uri, latency=latency)
@@ -0,0 +1,139 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Backend health based location strategy module"""
+
+import time
+
+from oslo_config import cfg
+import six.moves.urllib.parse as urlparse
+
+from glance import i18n
+
+_ = i18n._
+
+health_opts = [
+    cfg.IntOpt('error_half_life', default=60, min=1,
+               help=_('Number of seconds after which a failure to read '
+                      'image data from a backend weighs half as much in '
+                      'the health score of the backend.')),
+    cfg.FloatOpt('hedge_delay', default=0,
+                 help=_('Number of seconds to wait for the first byte of '
+                        'image data from a location before also reading '
+                        'from the next location of the image, the first '
+                        'one to answer being used. A value of \'0\' means '
+                        'locations are only tried one after the other, '
+                        'when reading from the previous ones failed.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(health_opts, group='health_location_strategy')
+
+# Weight of the last measure in the latency average of a backend
+LATENCY_WEIGHT = 0.3
+# Number of seconds a recent failure adds to the score of a backend
+ERROR_PENALTY = 10.0
+
+# NOTE: Backends are tracked by each API worker process on its own
+_BACKENDS = {}
+
+
+class _BackendHealth(object):
+    """Latency and recent failures of a backend."""
+
+    def __init__(self):
+        self.latency = None
+        self.errors = 0.0
+        self.updated_at = time.time()
+
+    def _decay(self):
+        now = time.time()
+        half_life = CONF.health_location_strategy.error_half_life
+        self.errors *= 0.5 ** ((now - self.updated_at) / half_life)
+        self.updated_at = now
+
+    def success(self, latency):
+        self._decay()
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += LATENCY_WEIGHT * (latency - self.latency)
+
+    def failure(self):
+        self._decay()
+        self.errors += 1
+
+    def score(self):
+        self._decay()
+        return (self.latency or 0.0) + self.errors * ERROR_PENALTY
+
+
+def _get_backend(uri):
+    """Return the backend of a location, its scheme and host, which tells
+    Ceph clusters apart for instance.
+    """
+    pieces = urlparse.urlparse(uri.strip())
+    return '%s://%s' % (pieces.scheme, pieces.netloc.rpartition('@')[2])
+
+
+def get_strategy_name():
+    """Return strategy module name."""
+    return 'health'
+
+
+def init():
+    """Initialize strategy module."""
+    _BACKENDS.clear()
+
+
+def report_result(uri, latency=None):
+    """
+    Record the outcome of reading image data from a location.
+
+    :param uri: The URI of the location.
+    :param latency: Number of seconds it took to get the first byte of
+                    data, None when reading failed.
+    """
+    health = _BACKENDS.setdefault(_get_backend(uri), _BackendHealth())
+    if latency is None:
+        health.failure()
+    else:
+        health.success(latency)
+
+
+def get_score(uri):
+    """
+    Return the health score of the backend of a location, the lower the
+    better. Backends never read from score 0 so that they get tried.
+
+    :param uri: The URI of the location.
+    """
+    health = _BACKENDS.get(_get_backend(uri))
+    return health.score() if health is not None else 0.0
+
+
+def get_ordered_locations(locations, uri_key='url', **kwargs):
+    """
+    Order image location list.
+
+    :param locations: The original image location list.
+    :param uri_key: The key name for location URI in image location dictionary.
+    :return: The image location list with the healthiest backends first,
+             locations of equally healthy backends keep their order.
+    """
+    if not locations:
+        return locations
+    return sorted(locations,
+                  key=lambda location: get_score(location.get(uri_key, '')))
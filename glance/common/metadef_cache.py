@@ -0,0 +1,126 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cache of the metadata definitions catalog listings.
+
+Listings are cached per API worker and per caller, so that the visibility
+rules and policies applied when they were loaded still hold when they are
+served again. Every metadata definition write made through the notifier
+proxies bumps the catalog version and drops the cached listings. Writes
+made by other API workers or by glance-manage are only seen once the
+cached listings expire.
+"""
+
+import datetime
+
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+from oslo_utils import timeutils
+
+from glance import i18n
+
+_ = i18n._
+
+metadef_cache_opts = [
+    cfg.IntOpt('metadef_catalog_cache_ttl', default=0, min=0,
+               help=_('Number of seconds during which the metadata '
+                      'definitions namespaces and resource types listings '
+                      'are cached by each API worker. The listings cached '
+                      'by a worker are dropped whenever a metadata '
+                      'definition is changed through it, but changes made '
+                      'through other workers are only seen once they '
+                      'expire. The default value of 0 disables the '
+                      'cache.')),
+    cfg.IntOpt('metadef_catalog_cache_size', default=1000, min=1,
+               help=_('Maximum number of metadata definitions listings '
+                      'cached by each API worker.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(metadef_cache_opts)
+
+
+class _MetadefCatalogCache(object):
+    """Versioned cache of the listings of the metadef catalog."""
+
+    def __init__(self):
+        self.version = 0
+        self._entries = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if timeutils.utcnow() >= expires_at:
+            del self._entries[key]
+            return None
+        return value
+
+    def set(self, key, value, version):
+        # NOTE: A listing loaded while the catalog was changed may already
+        # be out of date, it is only kept if the version did not move.
+        if version != self.version:
+            return
+        now = timeutils.utcnow()
+        if len(self._entries) >= CONF.metadef_catalog_cache_size:
+            self._entries = {k: v for k, v in self._entries.items()
+                             if v[0] > now}
+            if len(self._entries) >= CONF.metadef_catalog_cache_size:
+                self._entries.clear()
+        expires_at = now + datetime.timedelta(
+            seconds=CONF.metadef_catalog_cache_ttl)
+        self._entries[key] = (expires_at, value)
+
+    def invalidate(self):
+        self.version += 1
+        self._entries.clear()
+
+
+_CACHE = _MetadefCatalogCache()
+
+
+def make_key(listing, context, **params):
+    """Build the key caching a listing of the catalog for a caller."""
+    params['filters'] = dict(params.get('filters') or {})
+    return jsonutils.dumps({'listing': listing,
+                            'tenant': context.tenant,
+                            'user': context.user,
+                            'is_admin': context.is_admin,
+                            'roles': sorted(context.roles),
+                            'params': params}, sort_keys=True)
+
+
+def get_version():
+    return _CACHE.version
+
+
+def get(key):
+    """Return a cached listing, or None when it has to be loaded."""
+    if not CONF.metadef_catalog_cache_ttl:
+        return None
+    return _CACHE.get(key)
+
+
+def store(key, value, version):
+    """Cache a listing loaded while the catalog was at this version."""
+    if CONF.metadef_catalog_cache_ttl:
+        _CACHE.set(key, value, version)
+
+
+def invalidate():
+    """Drop all the cached listings after a change of the catalog."""
+    _CACHE.invalidate()
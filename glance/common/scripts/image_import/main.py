@@ -27,6 +27,7 @@ from glance.api.v2 import images as v2_api
 from glance.common import exception
 from glance.common.scripts import utils as script_utils
 from glance.common import store_utils
+from glance.common import utils
 from glance import i18n
 
 
@@ -147,13 +148,22 @@ def create_image(image_repo, image_factory, image_properties, task_id):
     return image
 
 
-def set_image_data(image, uri, task_id):
+def set_image_data(image, uri, task_id, linkable=False):
+    """Import the data found at ``uri`` into the image.
+
+    :param linkable: whether ``uri`` points to a local scratch file which may
+                     be linked into a filesystem store instead of copied
+    """
     data_iter = None
     try:
         LOG.info(_LI("Task %(task_id)s: Got image data uri %(data_uri)s to be "
                  "imported"), {"data_uri": uri, "task_id": task_id})
-        data_iter = script_utils.get_image_data_iter(uri)
-        image.set_data(data_iter)
+        if linkable:
+            data_iter = utils.LocalFileReader(uri.split("file://")[-1])
+            image.set_data(data_iter, size=data_iter.size)
+        else:
+            data_iter = script_utils.get_image_data_iter(uri)
+            image.set_data(data_iter)
     except Exception as e:
         with excutils.save_and_reraise_exception():
             LOG.warn(_LW("Task %(task_id)s failed with exception %(error)s") %
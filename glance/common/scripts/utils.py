@@ -21,8 +21,14 @@ __all__ = [
     'get_image_data_iter',
 ]
 
+import collections
+import itertools
 
+import eventlet
+from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import encodeutils
+from six.moves import range
 from six.moves import urllib
 
 from glance.common import exception
@@ -32,6 +38,31 @@ from glance import i18n
 LOG = logging.getLogger(__name__)
 _ = i18n._
 _LE = i18n._LE
+_LW = i18n._LW
+
+import_opts = [
+    cfg.IntOpt('import_range_requests',
+               default=1,
+               min=1,
+               help=_("The number of byte ranges fetched concurrently when "
+                      "importing image data from an HTTP server that "
+                      "supports range requests. 1 disables ranged "
+                      "requests.")),
+    cfg.IntOpt('import_range_size',
+               default=8 * 1024 * 1024,
+               min=1,
+               help=_("The size in bytes of the byte ranges fetched by "
+                      "ranged imports. At most import_range_requests ranges "
+                      "are held in memory per import.")),
+    cfg.IntOpt('import_range_retries',
+               default=3,
+               min=0,
+               help=_("The number of times a failed byte range is fetched "
+                      "again before the import fails.")),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(import_opts, group='task')
 
 
 def get_task(task_repo, task_id):
@@ -133,4 +164,112 @@ def get_image_data_iter(uri):
         # into memory. Some images may be quite heavy.
         return open(uri, "r")
 
-    return urllib.request.urlopen(uri)
+    response = urllib.request.urlopen(uri)
+    if CONF.task.import_range_requests <= 1:
+        return response
+
+    headers = response.info()
+    try:
+        size = int(headers.get('Content-Length'))
+    except (TypeError, ValueError):
+        size = None
+    if (headers.get('Accept-Ranges') != 'bytes' or size is None or
+            size <= CONF.task.import_range_size):
+        return response
+
+    response.close()
+    return RangedHTTPReader(uri, size,
+                            concurrency=CONF.task.import_range_requests,
+                            range_size=CONF.task.import_range_size,
+                            retries=CONF.task.import_range_retries)
+
+
+class RangedHTTPReader(object):
+    """Reads an HTTP resource by fetching byte ranges concurrently.
+
+    Up to `concurrency` ranges are fetched at the same time, each in its own
+    green thread and connection, and handed out in order. A range that
+    fails is fetched again up to `retries` times. At most `concurrency`
+    ranges are buffered in memory.
+    """
+
+    def __init__(self, uri, size, concurrency, range_size, retries=0):
+        self.uri = uri
+        self.size = size
+        self.concurrency = concurrency
+        self.range_size = range_size
+        self.retries = retries
+        self._pending = collections.deque()
+        self._chunks = None
+        self._buffer = b''
+        self._position = 0
+
+    def _fetch_range(self, start, end):
+        expected = end - start + 1
+        for attempt in range(self.retries + 1):
+            try:
+                request = urllib.request.Request(
+                    self.uri, headers={'Range': 'bytes=%d-%d' % (start, end)})
+                response = urllib.request.urlopen(request)
+                try:
+                    if response.getcode() != 206:
+                        raise IOError(_("Range request not honoured, got "
+                                        "status %s") % response.getcode())
+                    data = response.read()
+                finally:
+                    response.close()
+                if len(data) != expected:
+                    raise IOError(_("Got %(got)d bytes instead of "
+                                    "%(expected)d") % {'got': len(data),
+                                                       'expected': expected})
+                return data
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                LOG.warn(_LW("Failed to fetch bytes %(start)d-%(end)d of "
+                             "%(uri)s, retrying: %(error)s"),
+                         {'start': start, 'end': end, 'uri': self.uri,
+                          'error': encodeutils.exception_to_unicode(e)})
+
+    def __iter__(self):
+        ranges = ((start, min(start + self.range_size, self.size) - 1)
+                  for start in range(0, self.size, self.range_size))
+        for start, end in itertools.islice(ranges, self.concurrency):
+            self._pending.append(eventlet.spawn(self._fetch_range,
+                                                start, end))
+        try:
+            while self._pending:
+                data = self._pending[0].wait()
+                self._pending.popleft()
+                # NOTE: Only start the next range once one was handed out,
+                # to keep the amount of buffered data bounded.
+                for start, end in itertools.islice(ranges, 1):
+                    self._pending.append(eventlet.spawn(self._fetch_range,
+                                                        start, end))
+                yield data
+        finally:
+            self.close()
+
+    def read(self, length=None):
+        if self._chunks is None:
+            self._chunks = iter(self)
+        if self._position >= len(self._buffer):
+            self._buffer = next(self._chunks, b'')
+            self._position = 0
+        if length is None:
+            length = len(self._buffer) - self._position
+
+        result = []
+        while length > 0 and self._buffer:
+            data = self._buffer[self._position:self._position + length]
+            result.append(data)
+            length -= len(data)
+            self._position += len(data)
+            if self._position >= len(self._buffer):
+                self._buffer = next(self._chunks, b'') if length else b''
+                self._position = 0
+        return b''.join(result)
+
+    def close(self):
+        while self._pending:
+            self._pending.popleft().kill()
@@ -26,11 +26,15 @@ try:
     from eventlet import sleep
 except ImportError:
     from time import sleep
+import eventlet
 from eventlet.green import socket
+from eventlet import queue
+from eventlet import tpool
 
 import functools
 import os
 import re
+import sys
 import uuid
 
 from OpenSSL import crypto
@@ -67,30 +71,60 @@ IMAGE_META_HEADERS = ['x-image-meta-location', 'x-image-meta-size',
 GLANCE_TEST_SOCKET_FD_STR = 'GLANCE_TEST_SOCKET_FD'
 
 
-def chunkreadable(iter, chunk_size=65536):
+# Number of chunks of a sustained stream after which the chunk size doubles
+ADAPTIVE_CHUNK_GROWTH = 4
+
+
+def _grow_chunk_size(chunk_size, max_chunk_size, count):
+    if count % ADAPTIVE_CHUNK_GROWTH == 0 and chunk_size < max_chunk_size:
+        return min(chunk_size * 2, max_chunk_size)
+    return chunk_size
+
+
+def chunkreadable(iter, chunk_size=None, max_chunk_size=None):
     """
     Wrap a readable iterator with a reader yielding chunks of
     a preferred size, otherwise leave iterator unchanged.
 
     :param iter: an iter which may also be readable
-    :param chunk_size: maximum size of chunk
+    :param chunk_size: maximum size of chunk, see chunkiter
+    :param max_chunk_size: size the chunks may grow to, see chunkiter
     """
-    return chunkiter(iter, chunk_size) if hasattr(iter, 'read') else iter
+    if hasattr(iter, 'read'):
+        return chunkiter(iter, chunk_size, max_chunk_size)
+    return iter
 
 
-def chunkiter(fp, chunk_size=65536):
+def chunkiter(fp, chunk_size=None, max_chunk_size=None):
     """
     Return an iterator to a file-like obj which yields fixed size chunks
 
+    The chunk size doubles every ADAPTIVE_CHUNK_GROWTH full chunks until
+    it reaches max_chunk_size, so that long reads are done in fewer, larger
+    chunks.
+
     :param fp: a file-like object
-    :param chunk_size: maximum size of chunk
+    :param chunk_size: maximum size of the first chunks, defaults to the
+                       image_chunk_size option
+    :param max_chunk_size: maximum size of chunk, defaults to the
+                           max_image_chunk_size option when chunk_size is
+                           not given and to chunk_size otherwise
     """
+    if chunk_size is None:
+        chunk_size = CONF.image_chunk_size
+        if max_chunk_size is None:
+            max_chunk_size = CONF.max_image_chunk_size
+    max_chunk_size = max_chunk_size or chunk_size
+    count = 0
     while True:
         chunk = fp.read(chunk_size)
         if chunk:
             yield chunk
         else:
             break
+        if len(chunk) == chunk_size:
+            count += 1
+            chunk_size = _grow_chunk_size(chunk_size, max_chunk_size, count)
 
 
 def cooperative_iter(iter):
@@ -124,6 +158,183 @@ def cooperative_read(fd):
     return readfn
 
 
+def offload(func, *args, **kwargs):
+    """
+    Call a blocking or CPU bound function, in a native thread when
+    offload_data_processing is enabled.
+
+    :param func: function to call, which must not use eventlet
+    """
+    if CONF.offload_data_processing:
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+_OFFLOAD_END = object()
+
+
+def offload_iter(iter, func):
+    """
+    Return an iterator yielding the chunks of another one after passing
+    each of them to a function.
+
+    When offload_data_processing is enabled the function is called by a
+    native thread, in the order of the chunks, while they are already
+    yielded, with at most offload_queue_size chunks waiting. Otherwise it
+    is called before each chunk is yielded. Either way a chunk the function
+    fails on is still yielded, and the error is raised afterwards.
+
+    :param iter: an iterator to wrap
+    :param func: function to call with every chunk, which must not use
+                 eventlet
+    """
+    if not CONF.offload_data_processing:
+        for chunk in iter:
+            try:
+                func(chunk)
+            finally:
+                yield chunk
+        return
+
+    chunks = queue.LightQueue(CONF.offload_queue_size)
+    errors = []
+
+    def process():
+        while True:
+            chunk = chunks.get()
+            if chunk is _OFFLOAD_END:
+                return
+            if not errors:
+                try:
+                    tpool.execute(func, chunk)
+                except Exception:
+                    errors.append(sys.exc_info())
+
+    worker = eventlet.spawn(process)
+    try:
+        for chunk in iter:
+            chunks.put(chunk)
+            yield chunk
+            if errors:
+                break
+    finally:
+        chunks.put(_OFFLOAD_END)
+        worker.wait()
+    if errors:
+        six.reraise(*errors[0])
+
+
+class StreamingIterator(object):
+    """
+    Iterator over image data doing the per chunk work of every layer the
+    data goes through in a single loop.
+
+    Instead of wrapping the data in a generator of their own, which costs a
+    generator frame per layer and chunk, layers add hooks to the iterator.
+    The iterator counts the bytes sent, available in bytes_sent once the
+    iteration is over, and may schedule after each chunk, which replaces
+    cooperative_iter.
+    """
+    def __init__(self, data, cooperative=False):
+        """
+        :param data: an iterator over image data
+        :param cooperative: whether to let other eventlet threads run
+                            after each chunk
+        """
+        self.data = data
+        self.cooperative = cooperative
+        self.bytes_sent = 0
+        self._chunk_hooks = []
+        self._end_hooks = []
+        self._error_hooks = []
+        self._iterator = None
+
+    def add_hooks(self, chunk=None, end=None, error=None):
+        """Add hooks, which are run in the order they were added.
+
+        :param chunk: called with every chunk before it is yielded
+        :param end: called with the number of bytes sent once all the data
+                    has been sent, may raise an exception to fail the
+                    transfer
+        :param error: called with the exception info when the transfer
+                      fails or is interrupted
+        """
+        if self._iterator is not None:
+            raise RuntimeError('Hooks must be added before iterating')
+        if chunk is not None:
+            self._chunk_hooks.append(chunk)
+        if end is not None:
+            self._end_hooks.append(end)
+        if error is not None:
+            self._error_hooks.append(error)
+
+    def __iter__(self):
+        if self._iterator is None:
+            self._iterator = self._iterate()
+        return self._iterator
+
+    def next(self):
+        return next(iter(self))
+
+    __next__ = next
+
+    def close(self):
+        if self._iterator is not None:
+            self._iterator.close()
+
+    def _iterate(self):
+        # NOTE: Every chunk goes through this loop, hence the local
+        # variables and the specialised loops for the common cases.
+        data = self.data
+        chunk_hooks = self._chunk_hooks
+        hook = chunk_hooks[0] if len(chunk_hooks) == 1 else None
+        cooperative = self.cooperative
+        sent = 0
+        try:
+            if not chunk_hooks and not cooperative:
+                for chunk in data:
+                    yield chunk
+                    sent += len(chunk)
+            elif hook is not None and not cooperative:
+                for chunk in data:
+                    hook(chunk)
+                    yield chunk
+                    sent += len(chunk)
+            else:
+                for chunk in data:
+                    for hook in chunk_hooks:
+                        hook(chunk)
+                    if cooperative:
+                        sleep(0)
+                    yield chunk
+                    sent += len(chunk)
+            self.bytes_sent = sent
+            for hook in self._end_hooks:
+                hook(sent)
+        except BaseException:
+            exc_info = sys.exc_info()
+            self.bytes_sent = sent
+            for hook in self._error_hooks:
+                try:
+                    hook(exc_info)
+                except Exception:
+                    LOG.exception(_LE("Error hook of an image data "
+                                      "iterator failed"))
+            six.reraise(*exc_info)
+
+
+def streaming_iter(data):
+    """
+    Return a StreamingIterator over image data, the data itself if it
+    already is one.
+
+    :param data: an iterator over image data
+    """
+    if isinstance(data, StreamingIterator):
+        return data
+    return StreamingIterator(data)
+
+
 MAX_COOP_READER_BUFFER_SIZE = 134217728  # 128M seems like a sane buffer limit
 
 
@@ -245,6 +456,54 @@ class LimitingReader(object):
         return result
 
 
+class LocalFileReader(object):
+    """
+    Reader for image data held in a local file.
+
+    Besides being read like any other image data object, the file may be
+    linked into a filesystem store living on the same filesystem, which
+    saves writing the data a second time.
+    """
+    def __init__(self, path, chunk_size=65536):
+        """
+        :param path: path to the local file
+        :param chunk_size: size of the chunks returned by the iterator
+        """
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.chunk_size = chunk_size
+        self.fd = open(path, 'rb')
+
+    def __iter__(self):
+        return iter(lambda: offload(self.fd.read, self.chunk_size), b'')
+
+    def read(self, i=None):
+        if i is None:
+            return offload(self.fd.read)
+        return offload(self.fd.read, i)
+
+    def close(self):
+        self.fd.close()
+
+
+def get_local_file_reader(data):
+    """
+    Return the LocalFileReader behind a chain of image data readers, if any.
+
+    :param data: image data object, possibly wrapped in LimitingReader or
+                 CooperativeReader objects
+    """
+    while True:
+        if isinstance(data, LocalFileReader):
+            return data
+        elif isinstance(data, LimitingReader):
+            data = data.data
+        elif isinstance(data, CooperativeReader):
+            data = data.fd
+        else:
+            return None
+
+
 def image_meta_to_http_headers(image_meta):
     """
     Returns a set of image metadata into a dict
@@ -644,7 +903,8 @@ def stash_conf_values():
         'tcp_keepidle': CONF.cert_file,
         'backlog': CONF.backlog,
         'key_file': CONF.key_file,
-        'cert_file': CONF.cert_file
+        'cert_file': CONF.cert_file,
+        'reuse_port': CONF.reuse_port,
     }
 
     return conf
@@ -23,6 +23,7 @@ from __future__ import print_function
 
 import errno
 import functools
+import multiprocessing
 import os
 import signal
 import sys
@@ -38,6 +39,7 @@ from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import encodeutils
 import routes
 import routes.middleware
 import six
@@ -77,6 +79,14 @@ socket_opts = [
                                    'server securely.')),
     cfg.StrOpt('key_file', help=_('Private key file to use when starting API '
                                   'server securely.')),
+    cfg.BoolOpt('reuse_port', default=False,
+                help=_('If True, each worker process listens on its own '
+                       'socket bound with SO_REUSEPORT and the kernel '
+                       'balances new connections between the workers, '
+                       'instead of all workers accepting connections from a '
+                       'single shared socket. Connections queued on the '
+                       'socket of a worker that is shut down on reload are '
+                       'dropped. Only available on Linux 3.9 and later.')),
 ]
 
 eventlet_opts = [
@@ -103,6 +113,33 @@ eventlet_opts = [
                       'If an incoming connection is idle for this number of '
                       'seconds it will be closed. A value of \'0\' means '
                       'wait forever.')),
+    cfg.StrOpt('http_version', default='HTTP/1.1',
+               choices=('HTTP/1.0', 'HTTP/1.1'),
+               help=_('The highest HTTP protocol version the server speaks. '
+                      'With HTTP/1.1 connections are kept alive by default '
+                      'and responses of unknown length, such as image '
+                      'downloads, are sent with chunked transfer encoding. '
+                      'With HTTP/1.0 the connection is closed after every '
+                      'such response.')),
+    cfg.IntOpt('keepalive_idle_timeout', default=0, min=0,
+               help=_('Number of seconds an idle keep-alive connection is '
+                      'kept open waiting for the next request. A value of '
+                      '\'0\' means client_socket_timeout is used.')),
+    cfg.IntOpt('max_requests_per_connection', default=0, min=0,
+               help=_('Maximum number of requests served on a single '
+                      'keep-alive connection before it is closed. A value '
+                      'of \'0\' means no limit.')),
+    cfg.IntOpt('worker_greenthreads', min=1,
+               help=_('The maximum number of green threads each worker '
+                      'process uses to serve requests, that is the maximum '
+                      'number of requests a worker handles at the same time. '
+                      'Lowering it makes busy workers stop accepting '
+                      'connections sooner, leaving them to the other '
+                      'workers. Defaults to 1000.')),
+    cfg.BoolOpt('worker_cpu_affinity', default=False,
+                help=_('If True, each worker process is pinned to its own '
+                       'CPU. Only useful when workers does not exceed the '
+                       'number of CPUs.')),
 ]
 
 profiler_opts = [
@@ -123,6 +160,10 @@ CONF.register_opts(profiler_opts, group="profiler")
 
 ASYNC_EVENTLET_THREAD_POOL_LIST = []
 
+# NOTE: Python 2 doesn't define SO_REUSEPORT, its value on Linux is 15.
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT',
+                       15 if sys.platform.startswith('linux') else None)
+
 
 def get_bind_addr(default_port=None):
     """Return the host and port to bind to."""
@@ -153,13 +194,38 @@ def ssl_wrap_socket(sock):
     return ssl.wrap_socket(sock, **ssl_kwargs)
 
 
-def get_socket(default_port):
+def _listen_reuse_port(bind_addr, family, listen=True):
+    """Bind a socket which shares its address with other SO_REUSEPORT sockets.
+
+    :param listen: whether to start listening on the socket. A socket that
+                   is bound but not listening reserves the address without
+                   receiving any connection.
+    """
+    if SO_REUSEPORT is None:
+        raise RuntimeError(_("SO_REUSEPORT is not supported on this "
+                             "platform"))
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        sock.bind(bind_addr)
+        if listen:
+            sock.listen(CONF.backlog)
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def get_socket(default_port, reuse_port=False, listen=True):
     """
     Bind socket to bind ip:port in conf
 
     note: Mostly comes from Swift with a few small changes...
 
     :param default_port: port to bind to if none is specified in conf
+    :param reuse_port: whether to bind the socket with SO_REUSEPORT
+    :param listen: whether to listen on a SO_REUSEPORT socket
 
     :returns : a socket object as returned from socket.listen or
                ssl.wrap_socket if conf specifies cert_file
@@ -188,9 +254,13 @@ def get_socket(default_port):
 
     while not sock and time.time() < retry_until:
         try:
-            sock = eventlet.listen(bind_addr,
-                                   backlog=CONF.backlog,
-                                   family=address_family)
+            if reuse_port:
+                sock = _listen_reuse_port(bind_addr, address_family,
+                                          listen=listen)
+            else:
+                sock = eventlet.listen(bind_addr,
+                                       backlog=CONF.backlog,
+                                       family=address_family)
         except socket.error as err:
             if err.args[0] != errno.EADDRINUSE:
                 raise
@@ -217,6 +287,20 @@ def set_eventlet_hub():
                 reason=msg)
 
 
+def set_cpu_affinity(cpu):
+    """Pin the current process to the given CPU."""
+    try:
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, [cpu])
+        else:
+            processutils.execute('taskset', '-pc', str(cpu), str(os.getpid()))
+    except (OSError, processutils.ProcessExecutionError) as err:
+        LOG.warn(_LW('Unable to pin process %(pid)d to CPU %(cpu)d: '
+                     '%(err)s'),
+                 {'pid': os.getpid(), 'cpu': cpu,
+                  'err': encodeutils.exception_to_unicode(err)})
+
+
 def initialize_glance_store():
     """Initialize glance store."""
     glance_store.register_opts(CONF)
@@ -242,6 +326,41 @@ def get_asynchronous_eventlet_pool(size=1000):
     return pool
 
 
+class HttpProtocol(eventlet.wsgi.HttpProtocol):
+    """Request handler enforcing the keep-alive limits of the server."""
+
+    default_request_version = 'HTTP/1.0'
+
+    def setup(self):
+        eventlet.wsgi.HttpProtocol.setup(self)
+        self.requests_served = 0
+        # NOTE: On python 2 the request is read from a duplicate of the
+        # connection socket, which has its own timeout.
+        self._read_sock = getattr(self.rfile, '_sock', self.connection)
+
+    def handle_one_request(self):
+        if self.requests_served and CONF.keepalive_idle_timeout:
+            # NOTE: Only wait that long for the next request line, the
+            # regular socket timeout is restored once it has been read.
+            self._read_sock.settimeout(CONF.keepalive_idle_timeout)
+        eventlet.wsgi.HttpProtocol.handle_one_request(self)
+
+    def parse_request(self):
+        if not eventlet.wsgi.HttpProtocol.parse_request(self):
+            return False
+        if self.requests_served and CONF.keepalive_idle_timeout:
+            self._read_sock.settimeout(self.server.socket_timeout)
+        if self.protocol_version == 'HTTP/1.0':
+            # NOTE: eventlet picks chunked encoding based on the version
+            # of the request, which must not happen in HTTP/1.0 responses.
+            self.request_version = 'HTTP/1.0'
+        self.requests_served += 1
+        max_requests = CONF.max_requests_per_connection
+        if max_requests and self.requests_served >= max_requests:
+            self.close_connection = 1
+        return True
+
+
 class Server(object):
     """Server class to manage multiple WSGI sockets and applications.
 
@@ -253,6 +372,7 @@ class Server(object):
         self._logger = logging.getLogger("eventlet.wsgi.server")
         self.threads = threads
         self.children = set()
+        self.children_cpus = {}
         self.stale_children = set()
         self.running = True
         # NOTE(abhishek): Allows us to only re-initialize glance_store when
@@ -316,9 +436,11 @@ class Server(object):
                 self.run_child()
 
     def create_pool(self):
-        return eventlet.GreenPool(size=self.threads)
+        return eventlet.GreenPool(size=CONF.worker_greenthreads or
+                                  self.threads)
 
     def _remove_children(self, pid):
+        self.children_cpus.pop(pid, None)
         if pid in self.children:
             self.children.remove(pid)
             LOG.info(_LI('Removed dead child %s'), pid)
@@ -413,6 +535,29 @@ class Server(object):
         except KeyboardInterrupt:
             pass
 
+    def _get_child_cpu(self):
+        """Return the first CPU no current child is pinned to."""
+        if not CONF.worker_cpu_affinity:
+            return None
+        used = set(self.children_cpus[pid] for pid in self.children
+                   if pid in self.children_cpus)
+        cpus = range(multiprocessing.cpu_count())
+        free = [cpu for cpu in cpus if cpu not in used]
+        return free[0] if free else len(self.children) % len(cpus)
+
+    def _get_child_socket(self):
+        """Return a listening socket of its own for a child process."""
+        sock = get_socket(self.default_port, reuse_port=True)
+        # sockets can hang around forever without keepalive
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # This option isn't available in the OS X version of eventlet
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE,
+                            CONF.tcp_keepidle)
+        if CONF.cert_file and CONF.key_file:
+            sock = ssl_wrap_socket(sock)
+        return sock
+
     def run_child(self):
         def child_hup(*args):
             """Shuts down child processes, existing requests are handled."""
@@ -420,8 +565,16 @@ class Server(object):
             eventlet.wsgi.is_accepting = False
             self.sock.close()
 
+        cpu = self._get_child_cpu()
         pid = os.fork()
         if pid == 0:
+            if cpu is not None:
+                set_cpu_affinity(cpu)
+            if CONF.reuse_port:
+                # NOTE: The parent's socket is bound but not listening, it
+                # only reserves the address.
+                self.sock.close()
+                self.sock = self._get_child_socket()
             signal.signal(signal.SIGHUP, child_hup)
             signal.signal(signal.SIGTERM, signal.SIG_DFL)
             # ignore the interrupt signal to avoid a race whereby
@@ -440,6 +593,8 @@ class Server(object):
         else:
             LOG.info(_LI('Started child %s'), pid)
             self.children.add(pid)
+            if cpu is not None:
+                self.children_cpus[pid] = cpu
 
     def run_server(self):
         """Run a WSGI server."""
@@ -447,7 +602,6 @@ class Server(object):
             utils.setup_remote_pydev_debug(cfg.CONF.pydev_worker_debug_host,
                                            cfg.CONF.pydev_worker_debug_port)
 
-        eventlet.wsgi.HttpProtocol.default_request_version = "HTTP/1.0"
         self.pool = self.create_pool()
         try:
             eventlet.wsgi.server(self.sock,
@@ -456,7 +610,9 @@ class Server(object):
                                  custom_pool=self.pool,
                                  debug=False,
                                  keepalive=CONF.http_keepalive,
-                                 socket_timeout=self.client_socket_timeout)
+                                 socket_timeout=self.client_socket_timeout,
+                                 protocol=HttpProtocol,
+                                 max_http_version=CONF.http_version)
         except socket.error as err:
             if err[0] != errno.EINVAL:
                 raise
@@ -473,7 +629,9 @@ class Server(object):
                              log=self._logger,
                              debug=False,
                              keepalive=CONF.http_keepalive,
-                             socket_timeout=self.client_socket_timeout)
+                             socket_timeout=self.client_socket_timeout,
+                             protocol=HttpProtocol,
+                             max_http_version=CONF.http_version)
 
     def configure_socket(self, old_conf=None, has_changed=None):
         """
@@ -496,7 +654,8 @@ class Server(object):
         # Do we need a fresh socket?
         new_sock = (old_conf is None or (
                     has_changed('bind_host') or
-                    has_changed('bind_port')))
+                    has_changed('bind_port') or
+                    has_changed('reuse_port')))
         # Will we be using https?
         use_ssl = not (not CONF.cert_file or not CONF.key_file)
         # Were we using https before?
@@ -512,7 +671,11 @@ class Server(object):
             self._sock = None
             if old_conf is not None:
                 self.sock.close()
-            _sock = get_socket(self.default_port)
+            # NOTE: With reuse_port every worker listens on a socket of its
+            # own, the one of the parent process only reserves the address.
+            reuse_port = CONF.reuse_port and CONF.workers != 0
+            _sock = get_socket(self.default_port, reuse_port=reuse_port,
+                               listen=not reuse_port)
             _sock.setsockopt(socket.SOL_SOCKET,
                              socket.SO_REUSEADDR, 1)
             # sockets can hang around forever without keepalive
@@ -544,7 +707,8 @@ class Server(object):
                 self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE,
                                      CONF.tcp_keepidle)
 
-        if old_conf is not None and has_changed('backlog'):
+        if (old_conf is not None and has_changed('backlog') and
+                not CONF.reuse_port):
             self.sock.listen(CONF.backlog)
 
 
@@ -199,7 +199,7 @@ class ImageRepo(object):
             key = CONF.metadata_encryption_key
             for l in locations:
                 l['url'] = crypt.urlsafe_decrypt(key, l['url'])
-        return glance.domain.Image(
+        image = glance.domain.Image(
             image_id=db_image['id'],
             name=db_image['name'],
             status=db_image['status'],
@@ -219,9 +219,10 @@ class ImageRepo(object):
             extra_properties=properties,
             tags=db_tags
         )
+        image.clear_changes()
+        return image
 
-    def _format_image_to_db(self, image):
-        locations = image.locations
+    def _format_locations_to_db(self, locations):
         if CONF.metadata_encryption_key:
             key = CONF.metadata_encryption_key
             ld = []
@@ -232,6 +233,10 @@ class ImageRepo(object):
                            # NOTE(zhiyan): New location has no ID field.
                            'id': loc.get('id')})
             locations = ld
+        return locations
+
+    def _format_image_to_db(self, image):
+        locations = self._format_locations_to_db(image.locations)
         return {
             'id': image.image_id,
             'name': image.name,
@@ -251,6 +256,18 @@ class ImageRepo(object):
             'properties': dict(image.extra_properties),
         }
 
+    def _format_changes_to_db(self, changes):
+        image_values = dict(changes['attributes'])
+        if 'visibility' in image_values:
+            visibility = image_values.pop('visibility')
+            image_values['is_public'] = visibility == 'public'
+        if changes['properties']:
+            image_values['properties'] = changes['properties']
+        if changes['locations'] is not None:
+            image_values['locations'] = self._format_locations_to_db(
+                changes['locations'])
+        return image_values
+
     def add(self, image):
         image_values = self._format_image_to_db(image)
         if (image_values['size'] is not None
@@ -259,29 +276,39 @@ class ImageRepo(object):
         # the updated_at value is not set in the _format_image_to_db
         # function since it is specific to image create
         image_values['updated_at'] = image.updated_at
+        image_values['tags'] = list(image.tags)
         new_values = self.db_api.image_create(self.context, image_values)
-        self.db_api.image_tag_set_all(self.context,
-                                      image.image_id, image.tags)
         image.created_at = new_values['created_at']
         image.updated_at = new_values['updated_at']
+        image.clear_changes()
 
     def save(self, image, from_state=None):
-        image_values = self._format_image_to_db(image)
-        if (image_values['size'] is not None
-           and image_values['size'] > CONF.image_size_cap):
+        if image.size is not None and image.size > CONF.image_size_cap:
             raise exception.ImageSizeLimitExceeded
+        changes = image.get_changes()
         try:
-            new_values = self.db_api.image_update(self.context,
-                                                  image.image_id,
-                                                  image_values,
-                                                  purge_props=True,
-                                                  from_state=from_state)
+            if changes is None:
+                new_values = self.db_api.image_update(
+                    self.context, image.image_id,
+                    self._format_image_to_db(image), purge_props=True,
+                    from_state=from_state)
+                self.db_api.image_tag_set_all(self.context, image.image_id,
+                                              image.tags)
+            else:
+                # NOTE: Only what changed since the image was read is
+                # written, in a single call to the DB API.
+                new_values = self.db_api.image_update(
+                    self.context, image.image_id,
+                    self._format_changes_to_db(changes),
+                    from_state=from_state,
+                    delete_props=changes['deleted_properties'],
+                    add_tags=changes['added_tags'],
+                    delete_tags=changes['deleted_tags'])
         except (exception.ImageNotFound, exception.Forbidden):
             msg = _("No image found with ID %s") % image.image_id
             raise exception.ImageNotFound(msg)
-        self.db_api.image_tag_set_all(self.context, image.image_id,
-                                      image.tags)
         image.updated_at = new_values['updated_at']
+        image.clear_changes()
 
     def remove(self, image):
         image_values = self._format_image_to_db(image)
@@ -546,6 +573,46 @@ class MetadefNamespaceRepo(object):
             raise exception.NotFound(msg)
         return self._format_namespace_from_db(db_api_namespace)
 
+    def get_details(self, namespace):
+        """
+        Return a namespace along with a dict of its 'objects',
+        'resource_type_associations', 'properties' and 'tags', all loaded
+        at once.
+        """
+        try:
+            db_api_namespace = self.db_api.metadef_namespace_get_details(
+                self.context, namespace)
+        except (exception.NotFound, exception.Forbidden):
+            msg = _('Could not find namespace %s') % namespace
+            raise exception.NotFound(msg)
+        namespace_entity = self._format_namespace_from_db(db_api_namespace)
+
+        object_repo = MetadefObjectRepo(self.context, self.db_api)
+        resource_type_repo = MetadefResourceTypeRepo(self.context,
+                                                     self.db_api)
+        property_repo = MetadefPropertyRepo(self.context, self.db_api)
+        tag_repo = MetadefTagRepo(self.context, self.db_api)
+        details = {
+            'objects': [
+                object_repo._format_metadef_object_from_db(
+                    metadata_object, namespace_entity)
+                for metadata_object in db_api_namespace['objects']],
+            'resource_type_associations': [
+                resource_type_repo._format_resource_type_from_db(
+                    resource_type, namespace_entity)
+                for resource_type in
+                db_api_namespace['resource_type_associations']],
+            'properties': [
+                property_repo._format_metadef_property_from_db(
+                    property, namespace_entity)
+                for property in db_api_namespace['properties']],
+            'tags': [
+                tag_repo._format_metadef_tag_from_db(
+                    metadata_tag, namespace_entity)
+                for metadata_tag in db_api_namespace['tags']],
+        }
+        return namespace_entity, details
+
     def list(self, marker=None, limit=None, sort_key='created_at',
              sort_dir='desc', filters=None):
         db_namespaces = self.db_api.metadef_namespace_get_all(
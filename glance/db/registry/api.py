@@ -65,7 +65,8 @@ def image_create(client, values):
 
 
 @_get_client
-def image_update(client, image_id, values, purge_props=False, from_state=None):
+def image_update(client, image_id, values, purge_props=False, from_state=None,
+                 delete_props=None, add_tags=None, delete_tags=None):
     """
     Set the given properties on an image and update it.
 
@@ -73,7 +74,9 @@ def image_update(client, image_id, values, purge_props=False, from_state=None):
     """
     return client.image_update(values=values,
                                image_id=image_id,
-                               purge_props=purge_props, from_state=from_state)
+                               purge_props=purge_props, from_state=from_state,
+                               delete_props=delete_props, add_tags=add_tags,
+                               delete_tags=delete_tags)
 
 
 @_get_client
@@ -247,6 +250,15 @@ def image_location_delete(client, image_id, location_id, status, session=None):
                                  status=status)
 
 
+@_get_client
+def image_location_get_all_by_status(client, status, deleted_before=None,
+                                     marker=None, limit=None, session=None):
+    """Get image locations in a given status."""
+    return client.image_location_get_all_by_status(
+        status=status, deleted_before=deleted_before, marker=marker,
+        limit=limit)
+
+
 @_get_client
 def image_location_update(client, image_id, location, session=None):
     """Update image location."""
@@ -304,6 +316,16 @@ def task_update(client, task_id, values, session=None):
     return client.task_update(task_id=task_id, values=values, session=session)
 
 
+@_get_client
+def task_claim(client, task_id, stale_before=None, session=None):
+    return client.task_claim(task_id=task_id, stale_before=stale_before)
+
+
+@_get_client
+def task_claim_renew(client, task_ids, session=None):
+    return client.task_claim_renew(task_ids=task_ids)
+
+
 # Metadef
 @_get_client
 def metadef_namespace_get_all(
@@ -319,6 +341,12 @@ def metadef_namespace_get(client, namespace_name, session=None):
     return client.metadef_namespace_get(namespace_name=namespace_name)
 
 
+@_get_client
+def metadef_namespace_get_details(client, namespace_name, session=None):
+    return client.metadef_namespace_get_details(
+        namespace_name=namespace_name)
+
+
 @_get_client
 def metadef_namespace_create(client, values, session=None):
     return client.metadef_namespace_create(values=values)
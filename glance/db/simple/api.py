@@ -34,7 +34,7 @@ _LW = i18n._LW
 
 DATA = {
     'images': {},
-    'members': {},
+    'members': [],
     'metadef_namespace_resource_types': [],
     'metadef_namespaces': [],
     'metadef_objects': [],
@@ -50,7 +50,16 @@ DATA = {
     'artifact_tags': {},
     'artifact_dependencies': {},
     'artifact_blobs': {},
-    'artifact_blob_locations': {}
+    'artifact_blob_locations': {},
+    # NOTE: Secondary indexes, which hold the ids of the images with a
+    # given owner, status or tag, the public ones, and the members of each
+    # image and of each tenant.
+    'images_by_owner': {},
+    'images_by_status': {},
+    'images_by_tag': {},
+    'public_images': set(),
+    'members_by_image': {},
+    'members_by_tenant': {},
 }
 
 INDEX = 0
@@ -87,7 +96,13 @@ def reset():
         'locations': [],
         'tasks': {},
         'task_info': {},
-        'artifacts': {}
+        'artifacts': {},
+        'images_by_owner': {},
+        'images_by_status': {},
+        'images_by_tag': {},
+        'public_images': set(),
+        'members_by_image': {},
+        'members_by_tenant': {},
     }
 
 
@@ -104,6 +119,47 @@ def _get_session():
     return DATA
 
 
+def _index_image(image):
+    """Add an image to the owner, status and visibility indexes."""
+    DATA['images_by_owner'].setdefault(image['owner'], set()).add(image['id'])
+    DATA['images_by_status'].setdefault(image['status'],
+                                        set()).add(image['id'])
+    if image['is_public']:
+        DATA['public_images'].add(image['id'])
+
+
+def _unindex_image(image):
+    """Remove an image from the owner, status and visibility indexes."""
+    DATA['images_by_owner'].get(image['owner'], set()).discard(image['id'])
+    DATA['images_by_status'].get(image['status'], set()).discard(image['id'])
+    DATA['public_images'].discard(image['id'])
+
+
+def _set_image_tags(image_id, tags):
+    """Replace the tags of an image, keeping the tag index up to date."""
+    for tag in DATA['tags'].get(image_id, []):
+        DATA['images_by_tag'].get(tag, set()).discard(image_id)
+    DATA['tags'][image_id] = tags
+    for tag in tags:
+        DATA['images_by_tag'].setdefault(tag, set()).add(image_id)
+
+
+def _index_member(member):
+    DATA['members_by_image'].setdefault(member['image_id'],
+                                        []).append(member)
+    DATA['members_by_tenant'].setdefault(member['member'], []).append(member)
+
+
+def _unindex_member(member):
+    for index, key in (('members_by_image', member['image_id']),
+                       ('members_by_tenant', member['member'])):
+        members = DATA[index].get(key, [])
+        for i, indexed_member in enumerate(members):
+            if indexed_member is member:
+                del members[i]
+                break
+
+
 @utils.no_4byte_params
 def _image_location_format(image_id, value, meta_data, status, deleted=False):
     dt = timeutils.utcnow()
@@ -244,7 +300,7 @@ def _image_format(image_id, **values):
 
 def _filter_images(images, filters, context,
                    status='accepted', is_public=None,
-                   admin_as_user=False):
+                   admin_as_user=False, member_image_ids=None):
     filtered_images = []
     if 'properties' in filters:
         prop_filter = filters.pop('properties')
@@ -255,10 +311,10 @@ def _filter_images(images, filters, context,
 
     visibility = filters.pop('visibility', None)
 
+    if member_image_ids is None:
+        member_image_ids = _member_image_ids(context, status)
     for image in images:
-        member = image_member_find(context, image_id=image['id'],
-                                   member=context.owner, status=status)
-        is_member = len(member) > 0
+        is_member = image['id'] in member_image_ids
         has_ownership = context.owner and image['owner'] == context.owner
         can_see = (image['is_public'] or has_ownership or is_member or
                    (context.is_admin and not admin_as_user))
@@ -331,6 +387,50 @@ def _filter_images(images, filters, context,
     return filtered_images
 
 
+def _member_image_ids(context, status=None):
+    """Return the ids of the images shared with the tenant of a context."""
+    members = image_member_find(context, member=context.owner,
+                                status=status)
+    return set(member['image_id'] for member in members)
+
+
+def _image_candidates(context, filters, member_image_ids, is_public=None,
+                      admin_as_user=False):
+    """
+    Return the images which may match the given filters, as found in the
+    secondary indexes. They still have to go through _filter_images.
+    """
+    id_sets = []
+    if not context.is_admin or admin_as_user:
+        visible_ids = DATA['public_images'] | member_image_ids
+        if context.owner:
+            visible_ids |= DATA['images_by_owner'].get(context.owner, set())
+        id_sets.append(visible_ids)
+
+    if is_public or filters.get('visibility') == 'public':
+        id_sets.append(DATA['public_images'])
+
+    image_status = filters.get('status')
+    if isinstance(image_status, six.string_types):
+        id_sets.append(DATA['images_by_status'].get(image_status, set()))
+
+    owner = filters.get('owner')
+    if isinstance(owner, six.string_types):
+        # NOTE: Images without an owner are matched against a property
+        # named owner instead, see _filter_images.
+        id_sets.append(DATA['images_by_owner'].get(owner, set()) |
+                       DATA['images_by_owner'].get(None, set()))
+
+    for tag in filters.get('tags') or []:
+        id_sets.append(DATA['images_by_tag'].get(tag, set()))
+
+    if not id_sets:
+        return list(DATA['images'].values())
+    id_sets.sort(key=len)
+    image_ids = id_sets[0].intersection(*id_sets[1:])
+    return [DATA['images'][image_id] for image_id in image_ids]
+
+
 def _do_pagination(context, images, marker, limit, show_deleted,
                    status='accepted'):
     start = 0
@@ -419,9 +519,12 @@ def image_get_all(context, filters=None, marker=None, limit=None,
                   member_status='accepted', is_public=None,
                   admin_as_user=False, return_tag=False):
     filters = filters or {}
-    images = DATA['images'].values()
+    member_image_ids = _member_image_ids(
+        context, None if member_status == 'all' else member_status)
+    images = _image_candidates(context, filters, member_image_ids,
+                               is_public, admin_as_user)
     images = _filter_images(images, filters, context, member_status,
-                            is_public, admin_as_user)
+                            is_public, admin_as_user, member_image_ids)
     images = _sort_images(images, sort_key, sort_dir)
     images = _do_pagination(context, images, marker, limit,
                             filters.get('deleted'))
@@ -465,7 +568,12 @@ def image_member_find(context, image_id=None, member=None,
                       status=None, include_deleted=False):
     filters = []
     images = DATA['images']
-    members = DATA['members']
+    if image_id is not None:
+        members = DATA['members_by_image'].get(image_id, [])
+    elif member is not None:
+        members = DATA['members_by_tenant'].get(member, [])
+    else:
+        members = DATA['members']
 
     def is_visible(member):
         return (member['member'] == context.owner or
@@ -496,8 +604,7 @@ def image_member_count(context, image_id):
         msg = _("Image id is required.")
         raise exception.Invalid(msg)
 
-    members = DATA['members']
-    return len([x for x in members if x['image_id'] == image_id])
+    return len(DATA['members_by_image'].get(image_id, []))
 
 
 @log_call
@@ -508,6 +615,7 @@ def image_member_create(context, values):
                                   values.get('status', 'pending'))
     global DATA
     DATA['members'].append(member)
+    _index_member(member)
     return copy.deepcopy(member)
 
 
@@ -516,8 +624,10 @@ def image_member_update(context, member_id, values):
     global DATA
     for member in DATA['members']:
         if member['id'] == member_id:
+            _unindex_member(member)
             member.update(values)
             member['updated_at'] = timeutils.utcnow()
+            _index_member(member)
             return copy.deepcopy(member)
     else:
         raise exception.NotFound()
@@ -529,6 +639,7 @@ def image_member_delete(context, member_id):
     for i, member in enumerate(DATA['members']):
         if member['id'] == member_id:
             del DATA['members'][i]
+            _unindex_member(member)
             break
     else:
         raise exception.NotFound()
@@ -605,6 +716,27 @@ def image_location_delete(context, image_id, location_id, status,
         raise exception.NotFound(msg)
 
 
+@log_call
+def image_location_get_all_by_status(context, status, deleted_before=None,
+                                     marker=None, limit=None):
+    locations = [loc for loc in DATA['locations'] if loc['status'] == status]
+
+    if deleted_before is not None:
+        locations = [loc for loc in locations
+                     if loc['deleted_at'] and
+                     loc['deleted_at'] < deleted_before]
+    locations.sort(key=lambda loc: (loc['image_id'], loc['id']))
+    if marker is not None:
+        marker = tuple(marker)
+        locations = [loc for loc in locations
+                     if (loc['image_id'], loc['id']) > marker]
+
+    if limit is not None:
+        locations = locations[:limit]
+
+    return [copy.deepcopy(loc) for loc in locations]
+
+
 def _image_locations_set(context, image_id, locations):
     # NOTE(zhiyan): 1. Remove records from DB for deleted locations
     used_loc_ids = [loc['id'] for loc in locations if loc.get('id')]
@@ -686,14 +818,16 @@ def image_create(context, image_values):
 
     image = _image_format(image_id, **image_values)
     DATA['images'][image_id] = image
-    DATA['tags'][image_id] = image.pop('tags', [])
+    _set_image_tags(image_id, image.pop('tags', []))
+    _index_image(image)
 
     return _normalize_locations(context, copy.deepcopy(image))
 
 
 @log_call
 def image_update(context, image_id, image_values, purge_props=False,
-                 from_state=None):
+                 from_state=None, delete_props=None, add_tags=None,
+                 delete_tags=None):
     global DATA
     try:
         image = DATA['images'][image_id]
@@ -706,15 +840,24 @@ def image_update(context, image_id, image_values, purge_props=False,
 
     # replace values for properties that already exist
     new_properties = image_values.pop('properties', {})
+    delete_props = delete_props or []
     for prop in image['properties']:
         if prop['name'] in new_properties:
             prop['value'] = new_properties.pop(prop['name'])
-        elif purge_props:
+        elif purge_props or prop['name'] in delete_props:
             # this matches weirdness in the sqlalchemy api
             prop['deleted'] = True
 
+    if add_tags or delete_tags:
+        tags = DATA['tags'].get(image_id, [])
+        tags = [tag for tag in tags if tag not in (delete_tags or [])]
+        tags.extend(tag for tag in set(add_tags or []) if tag not in tags)
+        _set_image_tags(image_id, tags)
+
     image['updated_at'] = timeutils.utcnow()
+    _unindex_image(image)
     _image_update(image, image_values, new_properties)
+    _index_image(image)
     DATA['images'][image_id] = image
     return _normalize_locations(context, copy.deepcopy(image))
 
@@ -724,6 +867,7 @@ def image_destroy(context, image_id):
     global DATA
     try:
         delete_time = timeutils.utcnow()
+        _unindex_image(DATA['images'][image_id])
         DATA['images'][image_id]['deleted'] = True
         DATA['images'][image_id]['deleted_at'] = delete_time
 
@@ -732,6 +876,7 @@ def image_destroy(context, image_id):
         if (DATA['images'][image_id]['status'] not in
                 ['deleted', 'pending_delete']):
             DATA['images'][image_id]['status'] = 'deleted'
+        _index_image(DATA['images'][image_id])
 
         _image_locations_delete_all(context, image_id,
                                     delete_time=delete_time)
@@ -770,7 +915,7 @@ def image_tag_get(context, image_id, value):
 @log_call
 def image_tag_set_all(context, image_id, values):
     global DATA
-    DATA['tags'][image_id] = values
+    _set_image_tags(image_id, values)
 
 
 @log_call
@@ -778,6 +923,7 @@ def image_tag_set_all(context, image_id, values):
 def image_tag_create(context, image_id, value):
     global DATA
     DATA['tags'][image_id].append(value)
+    DATA['images_by_tag'].setdefault(value, set()).add(image_id)
     return value
 
 
@@ -788,6 +934,8 @@ def image_tag_delete(context, image_id, value):
         DATA['tags'][image_id].remove(value)
     except ValueError:
         raise exception.NotFound()
+    if value not in DATA['tags'][image_id]:
+        DATA['images_by_tag'].get(value, set()).discard(image_id)
 
 
 def is_image_mutable(context, image):
@@ -904,6 +1052,29 @@ def task_update(context, task_id, values):
     return _format_task_from_db(task, task_info)
 
 
+@log_call
+def task_claim(context, task_id, stale_before=None):
+    task = DATA['tasks'].get(task_id)
+    if task is None or task['deleted']:
+        return False
+    stale = (stale_before is not None and task['status'] == 'processing' and
+             task['updated_at'] < stale_before)
+    if task['status'] != 'pending' and not stale:
+        return False
+    task['status'] = 'processing'
+    task['updated_at'] = timeutils.utcnow()
+    return True
+
+
+@log_call
+def task_claim_renew(context, task_ids):
+    for task_id in task_ids:
+        task = DATA['tasks'].get(task_id)
+        if (task is not None and not task['deleted'] and
+                task['status'] == 'processing'):
+            task['updated_at'] = timeutils.utcnow()
+
+
 @log_call
 def task_get(context, task_id, force_show_deleted=False):
     task, task_info = _task_get(context, task_id, force_show_deleted)
@@ -1199,6 +1370,20 @@ def metadef_namespace_get(context, namespace_name):
     return namespace
 
 
+@log_call
+def metadef_namespace_get_details(context, namespace_name):
+    """Get a namespace object along with all its children"""
+    namespace = dict(metadef_namespace_get(context, namespace_name))
+    namespace['objects'] = metadef_object_get_all(context, namespace_name)
+    namespace['properties'] = metadef_property_get_all(context,
+                                                       namespace_name)
+    namespace['tags'] = metadef_tag_get_all(context, namespace_name)
+    namespace['resource_type_associations'] = (
+        metadef_resource_type_association_get_all_by_namespace(
+            context, namespace_name))
+    return namespace
+
+
 @log_call
 def metadef_namespace_get_all(context,
                               marker=None,
@@ -125,18 +125,26 @@ def _check_mutate_authorization(context, image_ref):
 
 def image_create(context, values):
     """Create an image from the values dictionary."""
-    return _image_update(context, values, None, purge_props=False)
+    values = values.copy()
+    tags = values.pop('tags', None)
+    return _image_update(context, values, None, purge_props=False,
+                         add_tags=tags)
 
 
 def image_update(context, image_id, values, purge_props=False,
-                 from_state=None):
+                 from_state=None, delete_props=None, add_tags=None,
+                 delete_tags=None):
     """
     Set the given properties on an image and update it.
 
+    :param delete_props: Names of properties to remove from the image
+    :param add_tags: Tags to add to the image
+    :param delete_tags: Tags to remove from the image
     :raises ImageNotFound if image does not exist.
     """
     return _image_update(context, values, image_id, purge_props,
-                         from_state=from_state)
+                         from_state=from_state, delete_props=delete_props,
+                         add_tags=add_tags, delete_tags=delete_tags)
 
 
 @retry(retry_on_exception=_retry_on_deadlock, wait_fixed=500,
@@ -709,13 +717,17 @@ def _update_values(image_ref, values):
        stop_max_attempt_number=50)
 @utils.no_4byte_params
 def _image_update(context, values, image_id, purge_props=False,
-                  from_state=None):
+                  from_state=None, delete_props=None, add_tags=None,
+                  delete_tags=None):
     """
     Used internally by image_create and image_update
 
     :param context: Request context
     :param values: A dict of attributes to set
     :param image_id: If None, create the image, otherwise, find and update it
+    :param delete_props: Names of properties to remove from the image
+    :param add_tags: Tags to add to the image
+    :param delete_tags: Tags to remove from the image
     """
 
     # NOTE(jbresnah) values is altered in this so a copy is needed
@@ -805,12 +817,16 @@ def _image_update(context, values, image_id, purge_props=False,
                                           % values['id'])
 
         _set_properties_for_image(context, image_ref, properties, purge_props,
-                                  session)
+                                  session, delete_props=delete_props)
 
         if location_data:
             _image_locations_set(context, image_ref.id, location_data,
                                  session=session)
 
+        if add_tags or delete_tags:
+            _image_tags_update(context, image_ref.id, add_tags, delete_tags,
+                               session=session)
+
     return image_get(context, image_ref.id)
 
 
@@ -884,6 +900,44 @@ def image_location_delete(context, image_id, location_id, status,
         raise exception.NotFound(msg)
 
 
+def image_location_get_all_by_status(context, status, deleted_before=None,
+                                     marker=None, limit=None, session=None):
+    """
+    Get image locations in a given status, ordered by image id and then
+    location id so that the locations of an image are returned together.
+
+    :param status: location status to filter on, e.g. 'pending_delete'
+    :param deleted_before: only return locations deleted before this time
+    :param marker: (image id, location id) pair after which to start the page
+    :param limit: maximum number of locations to return
+    """
+    session = session or get_session()
+    query = session.query(models.ImageLocation).filter_by(status=status)
+
+    if deleted_before is not None:
+        query = query.filter(
+            models.ImageLocation.deleted_at < deleted_before)
+    if marker is not None:
+        marker_image_id, marker_id = marker
+        query = query.filter(sa_sql.or_(
+            models.ImageLocation.image_id > marker_image_id,
+            sa_sql.and_(models.ImageLocation.image_id == marker_image_id,
+                        models.ImageLocation.id > marker_id)))
+
+    query = query.order_by(models.ImageLocation.image_id,
+                           models.ImageLocation.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [{'id': loc_ref.id,
+             'image_id': loc_ref.image_id,
+             'url': loc_ref.value,
+             'metadata': loc_ref.meta_data,
+             'status': loc_ref.status,
+             'deleted_at': loc_ref.deleted_at}
+            for loc_ref in query.all()]
+
+
 def _image_locations_set(context, image_id, locations, session=None):
     # NOTE(zhiyan): 1. Remove records from DB for deleted locations
     session = session or get_session()
@@ -894,16 +948,29 @@ def _image_locations_set(context, image_id, locations, session=None):
     if loc_ids:
         query = query.filter(~models.ImageLocation.id.in_(loc_ids))
 
-    for loc_id in [loc_ref.id for loc_ref in query.all()]:
-        image_location_delete(context, image_id, loc_id, 'deleted',
-                              session=session)
+    delete_time = timeutils.utcnow()
+    query.update({'deleted': True,
+                  'status': 'deleted',
+                  'updated_at': delete_time,
+                  'deleted_at': delete_time},
+                 synchronize_session=False)
 
     # NOTE(zhiyan): 2. Adding or update locations
+    new_locations = []
     for loc in locations:
         if loc.get('id') is None:
-            image_location_add(context, image_id, loc, session=session)
+            deleted = loc['status'] in ('deleted', 'pending_delete')
+            new_locations.append({'image_id': image_id,
+                                  'value': loc['url'],
+                                  'meta_data': loc['metadata'],
+                                  'status': loc['status'],
+                                  'deleted': deleted,
+                                  'deleted_at': delete_time if deleted
+                                  else None})
         else:
             image_location_update(context, image_id, loc, session=session)
+    _image_child_entries_create(models.ImageLocation, *new_locations,
+                                session=session)
 
 
 def _image_locations_delete_all(context, image_id,
@@ -920,7 +987,8 @@ def _image_locations_delete_all(context, image_id,
 
 @utils.no_4byte_params
 def _set_properties_for_image(context, image_ref, properties,
-                              purge_props=False, session=None):
+                              purge_props=False, session=None,
+                              delete_props=None):
     """
     Create or update a set of image_properties for a given image
 
@@ -928,11 +996,13 @@ def _set_properties_for_image(context, image_ref, properties,
     :param image_ref: An Image object
     :param properties: A dict of properties to set
     :param session: A SQLAlchemy session to use (if present)
+    :param delete_props: Names of properties to delete, when they exist
     """
     orig_properties = {}
     for prop_ref in image_ref.properties:
         orig_properties[prop_ref.name] = prop_ref
 
+    new_properties = []
     for name, value in six.iteritems(properties):
         prop_values = {'image_id': image_ref.id,
                        'name': name,
@@ -942,14 +1012,69 @@ def _set_properties_for_image(context, image_ref, properties,
             _image_property_update(context, prop_ref, prop_values,
                                    session=session)
         else:
-            image_property_create(context, prop_values, session=session)
+            new_properties.append(prop_values)
+    _image_child_entries_create(models.ImageProperty, *new_properties,
+                                session=session)
 
+    delete_props = set(delete_props or [])
     if purge_props:
-        for key in orig_properties.keys():
-            if key not in properties:
-                prop_ref = orig_properties[key]
-                image_property_delete(context, prop_ref.name,
-                                      image_ref.id, session=session)
+        delete_props.update(orig_properties)
+    prop_ids = [ref.id for name, ref in six.iteritems(orig_properties)
+                if (name in delete_props and name not in properties and
+                    not ref.deleted)]
+    _image_child_entries_delete(models.ImageProperty, prop_ids,
+                                session=session)
+
+
+@utils.no_4byte_params
+def _image_child_entries_create(child_model_cls, *entries, **kwargs):
+    """
+    Creates child entries of images in a single INSERT statement.
+
+    :param child_model_cls: the ORM model class.
+    :param entries: dicts of column values, one for each entry to create.
+                    They must all have the same keys.
+    :param session: A SQLAlchemy session to use (if present)
+    """
+    if not entries:
+        return
+    session = kwargs.get('session') or get_session()
+
+    now = timeutils.utcnow()
+    rows = []
+    for entry in entries:
+        row = {'created_at': now, 'updated_at': now,
+               'deleted': False, 'deleted_at': None}
+        row.update(entry)
+        rows.append(row)
+    session.execute(child_model_cls.__table__.insert(), rows)
+
+
+def _image_child_entries_delete(child_model_cls, entry_ids, delete_time=None,
+                                session=None):
+    """
+    Soft-deletes child entries of images by id in a single UPDATE statement.
+
+    :param child_model_cls: the ORM model class.
+    :param entry_ids: ids of the child entries to delete.
+    :param delete_time: datetime of deletion to be set.
+                        If None, uses current datetime.
+    :param session: A SQLAlchemy session to use (if present)
+
+    :rtype: int
+    :return: The number of child entries got soft-deleted.
+    """
+    if not entry_ids:
+        return 0
+    session = session or get_session()
+
+    delete_time = delete_time or timeutils.utcnow()
+    query = session.query(child_model_cls).filter(
+        child_model_cls.id.in_(entry_ids))
+    return query.update({'deleted': True,
+                         'updated_at': delete_time,
+                         'deleted_at': delete_time},
+                        synchronize_session=False)
 
 
 def _image_child_entry_delete_all(child_model_cls, image_id, delete_time=None,
@@ -1154,18 +1279,34 @@ def image_tag_set_all(context, image_id, tags):
     # NOTE(kragniz): tag ordering should match exactly what was provided, so a
     # subsequent call to image_tag_get_all returns them in the correct order
 
+    _check_image_id(image_id)
     session = get_session()
-    existing_tags = image_tag_get_all(context, image_id, session)
+    with session.begin():
+        existing_tags = image_tag_get_all(context, image_id, session)
+        tags_set = set(tags)
+        delete_tags = [tag for tag in existing_tags if tag not in tags_set]
+        _image_tags_update(context, image_id, tags, delete_tags,
+                           session=session)
 
-    tags_created = []
-    for tag in tags:
-        if tag not in tags_created and tag not in existing_tags:
-            tags_created.append(tag)
-            image_tag_create(context, image_id, tag, session)
 
-    for tag in existing_tags:
-        if tag not in tags:
-            image_tag_delete(context, image_id, tag, session)
+def _image_tags_update(context, image_id, add_tags=None, delete_tags=None,
+                       session=None):
+    """Add and remove some tags of an image, leaving the others alone"""
+    session = session or get_session()
+    query = session.query(models.ImageTag.id, models.ImageTag.value).filter_by(
+        image_id=image_id).filter_by(deleted=False)
+    existing_tags = {tag.value: tag.id for tag in query}
+
+    new_tags = []
+    for tag in add_tags or []:
+        if tag not in existing_tags:
+            existing_tags[tag] = None
+            new_tags.append({'image_id': image_id, 'value': tag})
+    _image_child_entries_create(models.ImageTag, *new_tags, session=session)
+
+    tag_ids = [existing_tags[tag] for tag in set(delete_tags or [])
+               if existing_tags.get(tag) is not None]
+    _image_child_entries_delete(models.ImageTag, tag_ids, session=session)
 
 
 @utils.no_4byte_params
@@ -1319,6 +1460,53 @@ def task_update(context, task_id, values, session=None):
     return task_get(context, task_id, session)
 
 
+def task_claim(context, task_id, stale_before=None, session=None):
+    """
+    Atomically move a pending task to the 'processing' status.
+
+    The claim time is recorded in the task's updated_at column, which the
+    claiming worker renews with task_claim_renew while it runs the task.
+
+    :param stale_before: also claim the task if it is in 'processing' and
+                         its claim was last renewed before this time, i.e.
+                         the worker running it has gone away
+    :returns: True if the task was claimed, False if it was not pending,
+              e.g. because another task worker claimed it first.
+    """
+    session = session or get_session()
+    with session.begin():
+        query = session.query(models.Task).filter_by(id=task_id,
+                                                     deleted=False)
+        claimable = models.Task.status == 'pending'
+        if stale_before is not None:
+            claimable = sa_sql.or_(
+                claimable,
+                sa_sql.and_(models.Task.status == 'processing',
+                            models.Task.updated_at < stale_before))
+        query = query.filter(claimable)
+        updated = query.update({'status': 'processing',
+                                'updated_at': timeutils.utcnow()},
+                               synchronize_session=False)
+    return updated == 1
+
+
+def task_claim_renew(context, task_ids, session=None):
+    """
+    Renew the claims on tasks still in the 'processing' status.
+
+    :param task_ids: ids of the tasks run by the calling task worker
+    """
+    if not task_ids:
+        return
+    session = session or get_session()
+    with session.begin():
+        query = session.query(models.Task).filter(
+            models.Task.id.in_(task_ids)).filter_by(status='processing',
+                                                    deleted=False)
+        query.update({'updated_at': timeutils.utcnow()},
+                     synchronize_session=False)
+
+
 def task_get(context, task_id, session=None, force_show_deleted=False):
     """Fetch a task entity by id"""
     task_ref = _task_get(context, task_id, session=session,
@@ -1334,6 +1522,51 @@ def task_delete(context, task_id, session=None):
     return _task_format(task_ref, task_ref.info)
 
 
+def task_delete_expired(context, expired_before=None, max_rows=None,
+                        purge=False):
+    """
+    Delete a batch of expired tasks.
+
+    :param expired_before: delete the tasks which expired before this time,
+                           defaults to now
+    :param max_rows: maximum number of tasks to delete, the ones which
+                     expired first being deleted first
+    :param purge: remove the tasks and their info from the database instead
+                  of marking them deleted, tasks already marked deleted
+                  included
+    :returns: the number of tasks deleted
+    """
+    expired_before = expired_before or timeutils.utcnow()
+    session = get_session()
+    with session.begin():
+        query = session.query(models.Task.id).filter(
+            models.Task.expires_at < expired_before)
+        if not purge:
+            query = query.filter_by(deleted=False)
+        query = query.order_by(models.Task.expires_at)
+        if max_rows is not None:
+            query = query.limit(max_rows)
+        task_ids = [task_id for task_id, in query]
+        if not task_ids:
+            return 0
+
+        if purge:
+            session.query(models.TaskInfo).filter(
+                models.TaskInfo.task_id.in_(task_ids)).delete(
+                    synchronize_session=False)
+            session.query(models.Task).filter(
+                models.Task.id.in_(task_ids)).delete(
+                    synchronize_session=False)
+        else:
+            delete_time = timeutils.utcnow()
+            session.query(models.Task).filter(
+                models.Task.id.in_(task_ids)).update(
+                    {'deleted': True, 'deleted_at': delete_time,
+                     'updated_at': delete_time},
+                    synchronize_session=False)
+    return len(task_ids)
+
+
 def task_get_all(context, filters=None, marker=None, limit=None,
                  sort_key='created_at', sort_dir='desc', admin_as_user=False):
     """
@@ -1485,6 +1718,29 @@ def metadef_namespace_get(context, namespace_name, session=None):
         context, namespace_name, session)
 
 
+def metadef_namespace_get_details(context, namespace_name, session=None):
+    """
+    Get a namespace along with its objects, properties, tags and resource
+    type associations, or raise if it does not exist or is not visible.
+    """
+    session = session or get_session()
+    with session.begin(subtransactions=True):
+        namespace = metadef_namespace_api.get(
+            context, namespace_name, session)
+        namespace_id = namespace['id']
+        namespace['objects'] = metadef_object_api.get_all_by_namespace_id(
+            namespace_id, session)
+        namespace['properties'] = (
+            metadef_property_api.get_all_by_namespace_id(namespace_id,
+                                                         session))
+        namespace['tags'] = metadef_tag_api.get_all_by_namespace_id(
+            namespace_id, session)
+        namespace['resource_type_associations'] = (
+            metadef_association_api.get_all_by_namespace_id(namespace_id,
+                                                            session))
+    return namespace
+
+
 def metadef_namespace_create(context, values, session=None):
     """Create a namespace or raise if it already exists."""
     session = session or get_session()
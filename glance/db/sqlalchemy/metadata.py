@@ -17,6 +17,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import json
 import os
 from os.path import isfile
@@ -24,6 +25,7 @@ from os.path import join
 import re
 
 from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_log import log as logging
 from oslo_utils import encodeutils
 from oslo_utils import timeutils
@@ -31,6 +33,7 @@ import six
 import sqlalchemy
 from sqlalchemy import and_
 from sqlalchemy.schema import MetaData
+from sqlalchemy.sql import bindparam
 from sqlalchemy.sql import select
 
 from glance import i18n
@@ -76,18 +79,6 @@ def get_metadef_tags_table(meta):
     return sqlalchemy.Table('metadef_tags', meta, autoload=True)
 
 
-def _get_resource_type_id(meta, name):
-    rt_table = get_metadef_resource_types_table(meta)
-    resource_type = (
-        select([rt_table.c.id]).
-        where(rt_table.c.name == name).
-        select_from(rt_table).
-        execute().fetchone())
-    if resource_type:
-        return resource_type[0]
-    return None
-
-
 def _get_resource_type(meta, resource_type_id):
     rt_table = get_metadef_resource_types_table(meta)
     return (
@@ -105,17 +96,6 @@ def _get_namespace_resource_types(meta, namespace_id):
         execute().fetchall())
 
 
-def _get_namespace_resource_type_by_ids(meta, namespace_id, rt_id):
-    namespace_resource_types_table = (
-        get_metadef_namespace_resource_types_table(meta))
-    return (
-        namespace_resource_types_table.select().
-        where(and_(
-            namespace_resource_types_table.c.namespace_id == namespace_id,
-            namespace_resource_types_table.c.resource_type_id == rt_id)).
-        execute().fetchone())
-
-
 def _get_properties(meta, namespace_id):
     properties_table = get_metadef_properties_table(meta)
     return (
@@ -140,18 +120,6 @@ def _get_tags(meta, namespace_id):
         execute().fetchall())
 
 
-def _get_resource_id(table, namespace_id, resource_name):
-    resource = (
-        select([table.c.id]).
-        where(and_(table.c.namespace_id == namespace_id,
-                   table.c.name == resource_name)).
-        select_from(table).
-        execute().fetchone())
-    if resource:
-        return resource[0]
-    return None
-
-
 def _clear_metadata(meta):
     metadef_tables = [get_metadef_properties_table(meta),
                       get_metadef_objects_table(meta),
@@ -165,7 +133,7 @@ def _clear_metadata(meta):
         LOG.info(_LI("Table %s has been cleared"), table)
 
 
-def _clear_namespace_metadata(meta, namespace_id):
+def _clear_namespace_metadata(conn, meta, namespace_id):
     metadef_tables = [get_metadef_properties_table(meta),
                       get_metadef_objects_table(meta),
                       get_metadef_tags_table(meta),
@@ -173,9 +141,189 @@ def _clear_namespace_metadata(meta, namespace_id):
     namespaces_table = get_metadef_namespaces_table(meta)
 
     for table in metadef_tables:
-        table.delete().where(table.c.namespace_id == namespace_id).execute()
-    namespaces_table.delete().where(
-        namespaces_table.c.id == namespace_id).execute()
+        conn.execute(
+            table.delete().where(table.c.namespace_id == namespace_id))
+    conn.execute(namespaces_table.delete().where(
+        namespaces_table.c.id == namespace_id))
+
+
+def _get_ids_by_name(conn, table, namespace_id):
+    rows = conn.execute(
+        select([table.c.name, table.c.id]).
+        where(table.c.namespace_id == namespace_id)).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def _unique_by_name(rows):
+    unique = collections.OrderedDict()
+    for values in rows:
+        if values['name'] in unique:
+            LOG.warning(_LW("Duplicate entry for values: %s"), values)
+        else:
+            unique[values['name']] = values
+    return unique
+
+
+def _diff_rows(rows, db_ids, now, prefer_new):
+    """
+    Split the rows read from a metadata file into the rows missing from the
+    database and, with prefer_new, the rows to update.
+    """
+    inserts = []
+    updates = []
+    for name, values in six.iteritems(rows):
+        db_id = db_ids.get(name)
+        if db_id is None:
+            values.update({'created_at': now})
+            inserts.append(values)
+        elif prefer_new:
+            values.update({'updated_at': now, 'b_id': db_id})
+            updates.append(values)
+    return inserts, updates
+
+
+def _bulk_insert(conn, table, rows):
+    if rows:
+        conn.execute(table.insert(), rows)
+
+
+def _bulk_update(conn, table, rows, *key_columns):
+    # NOTE: Each row holds the values of the key columns matching it as
+    # b_<column>, bound parameters can not share the name of the columns
+    # being set.
+    if rows:
+        conn.execute(table.update().where(and_(*[
+            table.c[column] == bindparam('b_%s' % column)
+            for column in key_columns])), rows)
+
+
+def _load_namespace(conn, meta, metadata, rt_ids, merge=False,
+                    prefer_new=False, overwrite=False):
+    """
+    Load the namespace described by a metadata file.
+
+    The rows of an existing namespace are read once and compared with the
+    file, the differences are then written with a single statement per
+    table. Returns the ids of the resource types created, or None when the
+    namespace is skipped.
+    """
+    namespaces_table = get_metadef_namespaces_table(meta)
+    namespace_rt_table = get_metadef_namespace_resource_types_table(meta)
+    objects_table = get_metadef_objects_table(meta)
+    tags_table = get_metadef_tags_table(meta)
+    properties_table = get_metadef_properties_table(meta)
+    resource_types_table = get_metadef_resource_types_table(meta)
+    now = timeutils.utcnow()
+
+    values = {
+        'namespace': metadata.get('namespace', None),
+        'display_name': metadata.get('display_name', None),
+        'description': metadata.get('description', None),
+        'visibility': metadata.get('visibility', None),
+        'protected': metadata.get('protected', None),
+        'owner': metadata.get('owner', 'admin')
+    }
+
+    db_namespace = conn.execute(
+        select([namespaces_table.c.id]).
+        where(namespaces_table.c.namespace == values['namespace'])
+    ).fetchone()
+
+    if db_namespace and overwrite:
+        LOG.info(_LI("Overwriting namespace %s"), values['namespace'])
+        _clear_namespace_metadata(conn, meta, db_namespace[0])
+        db_namespace = None
+
+    if not db_namespace:
+        values.update({'created_at': now})
+        result = conn.execute(namespaces_table.insert(), values)
+        namespace_id = result.inserted_primary_key[0]
+    elif not merge:
+        LOG.info(_LI("Skipping namespace %s. It already exists in the "
+                     "database."), values['namespace'])
+        return None
+    else:
+        namespace_id = db_namespace[0]
+        if prefer_new:
+            values.update({'updated_at': now})
+            conn.execute(namespaces_table.update().where(
+                namespaces_table.c.id == namespace_id), values)
+
+    resource_types = _unique_by_name(
+        metadata.get('resource_type_associations', []))
+    missing = [name for name in resource_types if name not in rt_ids]
+    new_rt_ids = {}
+    if missing:
+        _bulk_insert(conn, resource_types_table, [
+            {'name': name, 'created_at': now, 'protected': True}
+            for name in missing])
+        rows = conn.execute(
+            select([resource_types_table.c.name, resource_types_table.c.id]).
+            where(resource_types_table.c.name.in_(missing))).fetchall()
+        new_rt_ids = {row[0]: row[1] for row in rows}
+    if prefer_new:
+        _bulk_update(conn, resource_types_table, [
+            {'updated_at': now, 'b_id': rt_ids[name]}
+            for name in resource_types if name in rt_ids], 'id')
+
+    db_rt_ids = set()
+    if db_namespace:
+        rows = conn.execute(
+            select([namespace_rt_table.c.resource_type_id]).
+            where(namespace_rt_table.c.namespace_id == namespace_id)
+        ).fetchall()
+        db_rt_ids = set(row[0] for row in rows)
+    inserts = []
+    updates = []
+    for name, resource_type in six.iteritems(resource_types):
+        rt_id = new_rt_ids.get(name, rt_ids.get(name))
+        values = {
+            'namespace_id': namespace_id,
+            'resource_type_id': rt_id,
+            'properties_target': resource_type.get(
+                'properties_target', None),
+            'prefix': resource_type.get('prefix', None)
+        }
+        if rt_id not in db_rt_ids:
+            values.update({'created_at': now})
+            inserts.append(values)
+        elif prefer_new:
+            values.update({'updated_at': now,
+                           'b_namespace_id': namespace_id,
+                           'b_resource_type_id': rt_id})
+            updates.append(values)
+    _bulk_insert(conn, namespace_rt_table, inserts)
+    _bulk_update(conn, namespace_rt_table, updates,
+                 'namespace_id', 'resource_type_id')
+
+    properties = collections.OrderedDict(
+        (name, {
+            'name': name,
+            'namespace_id': namespace_id,
+            'json_schema': json.dumps(schema)
+        }) for name, schema in six.iteritems(metadata.get('properties', {})))
+    objects = _unique_by_name({
+        'name': object['name'],
+        'description': object.get('description', None),
+        'namespace_id': namespace_id,
+        'json_schema': json.dumps(object.get('properties', None))
+    } for object in metadata.get('objects', []))
+    tags = _unique_by_name({
+        'name': tag.get('name'),
+        'namespace_id': namespace_id,
+    } for tag in metadata.get('tags', []))
+
+    for table, rows in ((properties_table, properties),
+                        (objects_table, objects),
+                        (tags_table, tags)):
+        db_ids = {}
+        if db_namespace:
+            db_ids = _get_ids_by_name(conn, table, namespace_id)
+        inserts, updates = _diff_rows(rows, db_ids, now, prefer_new)
+        _bulk_insert(conn, table, inserts)
+        _bulk_update(conn, table, updates, 'id')
+
+    return new_rt_ids
 
 
 def _populate_metadata(meta, metadata_path=None, merge=False,
@@ -199,13 +347,21 @@ def _populate_metadata(meta, metadata_path=None, merge=False,
                   metadata_path)
         return
 
-    namespaces_table = get_metadef_namespaces_table(meta)
-    namespace_rt_table = get_metadef_namespace_resource_types_table(meta)
-    objects_table = get_metadef_objects_table(meta)
-    tags_table = get_metadef_tags_table(meta)
-    properties_table = get_metadef_properties_table(meta)
+    total_watch = timeutils.StopWatch()
+    total_watch.start()
+
+    # NOTE: The tables are reflected once, before any transaction is opened.
+    get_metadef_namespaces_table(meta)
+    get_metadef_namespace_resource_types_table(meta)
+    get_metadef_objects_table(meta)
+    get_metadef_tags_table(meta)
+    get_metadef_properties_table(meta)
     resource_types_table = get_metadef_resource_types_table(meta)
 
+    rows = select([resource_types_table.c.name,
+                   resource_types_table.c.id]).execute().fetchall()
+    rt_ids = {row[0]: row[1] for row in rows}
+
     for json_schema_file in json_schema_files:
         try:
             file = join(metadata_path, json_schema_file)
@@ -218,159 +374,31 @@ def _populate_metadata(meta, metadata_path=None, merge=False,
                        "error_msg": encodeutils.exception_to_unicode(e)})
             continue
 
-        values = {
-            'namespace': metadata.get('namespace', None),
-            'display_name': metadata.get('display_name', None),
-            'description': metadata.get('description', None),
-            'visibility': metadata.get('visibility', None),
-            'protected': metadata.get('protected', None),
-            'owner': metadata.get('owner', 'admin')
-        }
-
-        db_namespace = select(
-            [namespaces_table.c.id]
-        ).where(
-            namespaces_table.c.namespace == values['namespace']
-        ).select_from(
-            namespaces_table
-        ).execute().fetchone()
-
-        if db_namespace and overwrite:
-            LOG.info(_LI("Overwriting namespace %s"), values['namespace'])
-            _clear_namespace_metadata(meta, db_namespace[0])
-            db_namespace = None
-
-        if not db_namespace:
-            values.update({'created_at': timeutils.utcnow()})
-            _insert_data_to_db(namespaces_table, values)
-
-            db_namespace = select(
-                [namespaces_table.c.id]
-            ).where(
-                namespaces_table.c.namespace == values['namespace']
-            ).select_from(
-                namespaces_table
-            ).execute().fetchone()
-        elif not merge:
-            LOG.info(_LI("Skipping namespace %s. It already exists in the "
-                         "database."), values['namespace'])
+        # NOTE: Each namespace is loaded in its own transaction, a file
+        # which can not be loaded leaves the database as it was.
+        watch = timeutils.StopWatch()
+        watch.start()
+        try:
+            with meta.bind.begin() as conn:
+                new_rt_ids = _load_namespace(conn, meta, metadata, rt_ids,
+                                             merge, prefer_new, overwrite)
+        except (db_exc.DBError, sqlalchemy.exc.SQLAlchemyError) as e:
+            LOG.error(_LE("Failed to load json file %(file_path)s while "
+                          "populating metadata due to: %(error_msg)s"),
+                      {"file_path": file,
+                       "error_msg": encodeutils.exception_to_unicode(e)})
             continue
-        elif prefer_new:
-            values.update({'updated_at': timeutils.utcnow()})
-            _update_data_in_db(namespaces_table, values,
-                               namespaces_table.c.id, db_namespace[0])
-
-        namespace_id = db_namespace[0]
 
-        for resource_type in metadata.get('resource_type_associations', []):
-            rt_id = _get_resource_type_id(meta, resource_type['name'])
-            if not rt_id:
-                val = {
-                    'name': resource_type['name'],
-                    'created_at': timeutils.utcnow(),
-                    'protected': True
-                }
-                _insert_data_to_db(resource_types_table, val)
-                rt_id = _get_resource_type_id(meta, resource_type['name'])
-            elif prefer_new:
-                val = {'updated_at': timeutils.utcnow()}
-                _update_data_in_db(resource_types_table, val,
-                                   resource_types_table.c.id, rt_id)
-
-            values = {
-                'namespace_id': namespace_id,
-                'resource_type_id': rt_id,
-                'properties_target': resource_type.get(
-                    'properties_target', None),
-                'prefix': resource_type.get('prefix', None)
-            }
-            namespace_resource_type = _get_namespace_resource_type_by_ids(
-                meta, namespace_id, rt_id)
-            if not namespace_resource_type:
-                values.update({'created_at': timeutils.utcnow()})
-                _insert_data_to_db(namespace_rt_table, values)
-            elif prefer_new:
-                values.update({'updated_at': timeutils.utcnow()})
-                _update_rt_association(namespace_rt_table, values,
-                                       rt_id, namespace_id)
-
-        for property, schema in six.iteritems(metadata.get('properties',
-                                                           {})):
-            values = {
-                'name': property,
-                'namespace_id': namespace_id,
-                'json_schema': json.dumps(schema)
-            }
-            property_id = _get_resource_id(properties_table,
-                                           namespace_id, property)
-            if not property_id:
-                values.update({'created_at': timeutils.utcnow()})
-                _insert_data_to_db(properties_table, values)
-            elif prefer_new:
-                values.update({'updated_at': timeutils.utcnow()})
-                _update_data_in_db(properties_table, values,
-                                   properties_table.c.id, property_id)
-
-        for object in metadata.get('objects', []):
-            values = {
-                'name': object['name'],
-                'description': object.get('description', None),
-                'namespace_id': namespace_id,
-                'json_schema': json.dumps(
-                    object.get('properties', None))
-            }
-            object_id = _get_resource_id(objects_table, namespace_id,
-                                         object['name'])
-            if not object_id:
-                values.update({'created_at': timeutils.utcnow()})
-                _insert_data_to_db(objects_table, values)
-            elif prefer_new:
-                values.update({'updated_at': timeutils.utcnow()})
-                _update_data_in_db(objects_table, values,
-                                   objects_table.c.id, object_id)
-
-        for tag in metadata.get('tags', []):
-            values = {
-                'name': tag.get('name'),
-                'namespace_id': namespace_id,
-            }
-            tag_id = _get_resource_id(tags_table, namespace_id, tag['name'])
-            if not tag_id:
-                values.update({'created_at': timeutils.utcnow()})
-                _insert_data_to_db(tags_table, values)
-            elif prefer_new:
-                values.update({'updated_at': timeutils.utcnow()})
-                _update_data_in_db(tags_table, values,
-                                   tags_table.c.id, tag_id)
-
-        LOG.info(_LI("File %s loaded to database."), file)
-
-    LOG.info(_LI("Metadata loading finished"))
-
-
-def _insert_data_to_db(table, values, log_exception=True):
-    try:
-        table.insert(values=values).execute()
-    except sqlalchemy.exc.IntegrityError:
-        if log_exception:
-            LOG.warning(_LW("Duplicate entry for values: %s"), values)
-
-
-def _update_data_in_db(table, values, column, value):
-    try:
-        (table.update(values=values).
-         where(column == value).execute())
-    except sqlalchemy.exc.IntegrityError:
-        LOG.warning(_LW("Duplicate entry for values: %s"), values)
+        if new_rt_ids is None:
+            continue
+        rt_ids.update(new_rt_ids)
 
+        LOG.info(_LI("File %(file_path)s loaded to database in "
+                     "%(elapsed).2f seconds."),
+                 {"file_path": file, "elapsed": watch.elapsed()})
 
-def _update_rt_association(table, values, rt_id, namespace_id):
-    try:
-        (table.update(values=values).
-         where(and_(table.c.resource_type_id == rt_id,
-                    table.c.namespace_id == namespace_id)).execute())
-    except sqlalchemy.exc.IntegrityError:
-        LOG.warning(_LW("Duplicate entry for values: %s"), values)
+    LOG.info(_LI("Metadata loading finished in %.2f seconds."),
+             total_watch.elapsed())
 
 
 def _export_data_to_file(meta, path):
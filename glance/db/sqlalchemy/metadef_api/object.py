@@ -58,10 +58,10 @@ def _get_by_name(context, namespace_name, name, session):
     return metadef_object
 
 
-def get_all(context, namespace_name, session):
-    namespace = namespace_api.get(context, namespace_name, session)
+def get_all_by_namespace_id(namespace_id, session):
+    """Get the objects of a namespace, visibility check assumed done"""
     query = session.query(models.MetadefObject).filter_by(
-        namespace_id=namespace['id'])
+        namespace_id=namespace_id)
     md_objects = query.all()
 
     md_objects_list = []
@@ -70,6 +70,11 @@ def get_all(context, namespace_name, session):
     return md_objects_list
 
 
+def get_all(context, namespace_name, session):
+    namespace = namespace_api.get(context, namespace_name, session)
+    return get_all_by_namespace_id(namespace['id'], session)
+
+
 def create(context, namespace_name, values, session):
     namespace = namespace_api.get(context, namespace_name, session)
     values.update({'namespace_id': namespace['id']})
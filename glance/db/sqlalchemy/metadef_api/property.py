@@ -70,10 +70,10 @@ def get(context, namespace_name, name, session):
     return property_rec.to_dict()
 
 
-def get_all(context, namespace_name, session):
-    namespace = namespace_api.get(context, namespace_name, session)
+def get_all_by_namespace_id(namespace_id, session):
+    """Get the properties of a namespace, visibility check assumed done"""
     query = session.query(models.MetadefProperty).filter_by(
-        namespace_id=namespace['id'])
+        namespace_id=namespace_id)
     properties = query.all()
 
     properties_list = []
@@ -82,6 +82,11 @@ def get_all(context, namespace_name, session):
     return properties_list
 
 
+def get_all(context, namespace_name, session):
+    namespace = namespace_api.get(context, namespace_name, session)
+    return get_all_by_namespace_id(namespace['id'], session)
+
+
 def create(context, namespace_name, values, session):
     namespace = namespace_api.get(context, namespace_name, session)
     values.update({'namespace_id': namespace['id']})
@@ -130,17 +130,14 @@ def get(context, namespace_name, resource_type_name, session):
     return _to_model_dict(resource_type_name, found)
 
 
-def get_all_by_namespace(context, namespace_name, session):
-    """List resource_type associations by namespace, raise if not found"""
-
-    # namespace get raises an exception if not visible
-    namespace = namespace_api.get(
-        context, namespace_name, session)
+def get_all_by_namespace_id(namespace_id, session):
+    """List resource_type associations by namespace id"""
 
+    # visibility check assumed done in calling routine via namespace_get
     db_recs = (
         session.query(models.MetadefResourceType)
         .join(models.MetadefResourceType.associations)
-        .filter_by(namespace_id=namespace['id'])
+        .filter_by(namespace_id=namespace_id)
         .values(models.MetadefResourceType.name,
                 models.MetadefNamespaceResourceType.properties_target,
                 models.MetadefNamespaceResourceType.prefix,
@@ -157,6 +154,15 @@ def get_all_by_namespace(context, namespace_name, session):
     return model_dict_list
 
 
+def get_all_by_namespace(context, namespace_name, session):
+    """List resource_type associations by namespace, raise if not found"""
+
+    # namespace get raises an exception if not visible
+    namespace = namespace_api.get(
+        context, namespace_name, session)
+    return get_all_by_namespace_id(namespace['id'], session)
+
+
 def create(context, namespace_name, values, session):
     """Create an association, raise if already exists or ns not found."""
 
@@ -56,6 +56,22 @@ def _get_by_name(context, namespace_name, name, session):
     return metadef_tag
 
 
+def get_all_by_namespace_id(namespace_id, session):
+    """
+    Get the tags of a namespace, most recent first, visibility check
+    assumed done
+    """
+    query = (session.query(models.MetadefTag)
+             .filter_by(namespace_id=namespace_id)
+             .order_by(models.MetadefTag.created_at.desc(),
+                       models.MetadefTag.id.desc()))
+
+    metadef_tag_list = []
+    for tag in query.all():
+        metadef_tag_list.append(tag.to_dict())
+    return metadef_tag_list
+
+
 def get_all(context, namespace_name, session, filters=None, marker=None,
             limit=None, sort_key='created_at', sort_dir='desc'):
     """Get all tags that match zero or more filters.
@@ -0,0 +1,27 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+
+from sqlalchemy import MetaData, Table, Index
+
+STATUS_DELETED_AT_INDEX = 'ix_image_locations_status_deleted_at'
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    image_locations = Table('image_locations', meta, autoload=True)
+
+    index = Index(STATUS_DELETED_AT_INDEX, image_locations.c.status,
+                  image_locations.c.deleted_at)
+    index.create(migrate_engine)
@@ -179,7 +179,9 @@ class ImageLocation(BASE, GlanceBase):
     """Represents an image location in the datastore."""
     __tablename__ = 'image_locations'
     __table_args__ = (Index('ix_image_locations_image_id', 'image_id'),
-                      Index('ix_image_locations_deleted', 'deleted'),)
+                      Index('ix_image_locations_deleted', 'deleted'),
+                      Index('ix_image_locations_status_deleted_at',
+                            'status', 'deleted_at'),)
 
     id = Column(Integer, primary_key=True, nullable=False)
     image_id = Column(String(36), ForeignKey('images.id'), nullable=False)
@@ -221,7 +223,8 @@ class Task(BASE, GlanceBase):
                       Index('ix_tasks_status', 'status'),
                       Index('ix_tasks_owner', 'owner'),
                       Index('ix_tasks_deleted', 'deleted'),
-                      Index('ix_tasks_updated_at', 'updated_at'))
+                      Index('ix_tasks_updated_at', 'updated_at'),
+                      Index('ix_tasks_expires_at', 'expires_at'))
 
     id = Column(String(36), primary_key=True,
                 default=lambda: str(uuid.uuid4()))
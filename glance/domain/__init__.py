@@ -15,6 +15,7 @@
 #    under the License.
 
 import collections
+import copy
 import datetime
 import uuid
 
@@ -114,7 +115,15 @@ class Image(object):
         'deactivated': ('active', 'deleted'),
     }
 
+    # Attributes whose changes are tracked between two saves of the image,
+    # besides its properties, tags and locations.
+    _tracked_attributes = ('name', 'status', 'visibility', 'min_disk',
+                           'min_ram', 'protected', 'checksum', 'owner',
+                           'disk_format', 'container_format', 'size',
+                           'virtual_size')
+
     def __init__(self, image_id, status, created_at, updated_at, **kwargs):
+        self._saved_state = None
         self.image_id = image_id
         self.status = status
         self.created_at = created_at
@@ -281,6 +290,51 @@ class Image(object):
     def set_data(self, data, size=None):
         raise NotImplementedError()
 
+    def clear_changes(self):
+        """Take the current state of the image as the stored one."""
+        attributes = {attr: getattr(self, attr)
+                      for attr in self._tracked_attributes}
+        self._saved_state = (attributes, dict(self.extra_properties),
+                             set(self.tags),
+                             copy.deepcopy(list(self.locations)))
+
+    def get_changes(self):
+        """
+        Return the changes made to the image since clear_changes() was last
+        called, or None if it never was.
+
+        :returns: A dict with the changed attributes under 'attributes',
+                  the added or changed properties under 'properties', the
+                  names of removed properties under 'deleted_properties',
+                  the 'added_tags' and 'deleted_tags', and the whole new
+                  list of 'locations' if it changed, None otherwise.
+        """
+        if self._saved_state is None:
+            return None
+        attributes, properties, tags, locations = self._saved_state
+
+        changed_attributes = {}
+        for attr, value in six.iteritems(attributes):
+            if getattr(self, attr) != value:
+                changed_attributes[attr] = getattr(self, attr)
+
+        changed_properties = {}
+        for name, value in six.iteritems(dict(self.extra_properties)):
+            if name not in properties or properties[name] != value:
+                changed_properties[name] = value
+
+        current_locations = list(self.locations)
+        return {
+            'attributes': changed_attributes,
+            'properties': changed_properties,
+            'deleted_properties': [name for name in properties
+                                   if name not in self.extra_properties],
+            'added_tags': list(self.tags - tags),
+            'deleted_tags': list(tags - self.tags),
+            'locations': (current_locations
+                          if current_locations != locations else None),
+        }
+
 
 class ExtraProperties(collections.MutableMapping, dict):
 
@@ -171,6 +171,12 @@ class Image(object):
     def get_member_repo(self):
         return self.helper.proxy(self.base.get_member_repo())
 
+    def clear_changes(self):
+        self.base.clear_changes()
+
+    def get_changes(self):
+        return self.base.get_changes()
+
 
 class Task(object):
     def __init__(self, base):
@@ -238,6 +244,10 @@ class MetadefNamespaceRepo(object):
         namespace_obj = self.base.get(namespace)
         return self.namespace_proxy_helper.proxy(namespace_obj)
 
+    def get_details(self, namespace):
+        namespace_obj, details = self.base.get_details(namespace)
+        return self.namespace_proxy_helper.proxy(namespace_obj), details
+
     def add(self, namespace):
         self.base.add(self.namespace_proxy_helper.unproxy(namespace))
 
@@ -18,6 +18,7 @@ LRU Cache for Image Data
 """
 
 import hashlib
+import sys
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -54,6 +55,79 @@ CONF = cfg.CONF
 CONF.register_opts(image_cache_opts)
 
 
+class _CacheTee(object):
+    """
+    Hooks of a StreamingIterator writing image data into the cache, in the
+    same way ImageCache.cache_tee_iter does.
+    """
+    def __init__(self, driver, image_id, image_checksum):
+        self.driver = driver
+        self.image_id = image_id
+        self.image_checksum = image_checksum
+        self.checksum = hashlib.md5()
+        self.context = None
+        self.cache_file = None
+        self.done = False
+
+    def _close(self, exc_info=(None, None, None)):
+        self.done = True
+        if self.context is not None:
+            self.context.__exit__(*exc_info)
+
+    def _fail(self, exc_info):
+        self._close(exc_info)
+        LOG.exception(_LE("Exception encountered while tee'ing "
+                          "image '%(image_id)s' into cache: %(error)s. "
+                          "Continuing with response.") %
+                      {'image_id': self.image_id,
+                       'error': encodeutils.exception_to_unicode(
+                           exc_info[1])})
+
+    def _open(self):
+        self.context = self.driver.open_for_write(self.image_id)
+        self.cache_file = self.context.__enter__()
+
+    def chunk(self, chunk):
+        if self.done:
+            return
+        try:
+            if self.cache_file is None:
+                self._open()
+            try:
+                self.cache_file.write(chunk)
+            finally:
+                self.checksum.update(chunk)
+        except Exception:
+            self._fail(sys.exc_info())
+
+    def end(self, bytes_sent):
+        if self.done:
+            return
+        try:
+            if self.cache_file is None:
+                self._open()
+            self.cache_file.flush()
+        except Exception:
+            self._fail(sys.exc_info())
+            return
+
+        if (self.image_checksum and
+                self.image_checksum != self.checksum.hexdigest()):
+            msg = _("Checksum verification failed. Aborted "
+                    "caching of image '%s'.") % self.image_id
+            try:
+                raise exception.GlanceException(msg)
+            except exception.GlanceException as e:
+                with excutils.save_and_reraise_exception():
+                    self._close(sys.exc_info())
+                    LOG.exception(encodeutils.exception_to_unicode(e))
+        self._close()
+
+    def error(self, exc_info):
+        if not self.done:
+            self._close(exc_info)
+
+
 class ImageCache(object):
 
     """Provides an LRU cache for image data."""
@@ -241,6 +315,13 @@ class ImageCache(object):
 
         LOG.debug("Tee'ing image '%s' into cache", image_id)
 
+        if (isinstance(image_iter, utils.StreamingIterator) and
+                not CONF.offload_data_processing):
+            tee = _CacheTee(self.driver, image_id, image_checksum)
+            image_iter.add_hooks(chunk=tee.chunk, end=tee.end,
+                                 error=tee.error)
+            return image_iter
+
         return self.cache_tee_iter(image_id, image_iter, image_checksum)
 
     def cache_tee_iter(self, image_id, image_iter, image_checksum):
@@ -248,13 +329,15 @@ class ImageCache(object):
             current_checksum = hashlib.md5()
 
             with self.driver.open_for_write(image_id) as cache_file:
-                for chunk in image_iter:
+                def write(chunk):
                     try:
                         cache_file.write(chunk)
                     finally:
                         current_checksum.update(chunk)
-                        yield chunk
-                cache_file.flush()
+
+                for chunk in utils.offload_iter(image_iter, write):
+                    yield chunk
+                utils.offload(cache_file.flush)
 
                 if (image_checksum and
                         image_checksum != current_checksum.hexdigest()):
@@ -15,7 +15,13 @@
 
 import collections
 import copy
+import hashlib
+import itertools
+import os
+import time
 
+import eventlet
+import eventlet.queue
 import glance_store as store
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -23,6 +29,7 @@ from oslo_utils import encodeutils
 from oslo_utils import excutils
 
 from glance.common import exception
+from glance.common import location_strategy
 from glance.common import signature_utils
 from glance.common import utils
 import glance.domain.proxy
@@ -34,6 +41,8 @@ _LE = i18n._LE
 _LI = i18n._LI
 
 CONF = cfg.CONF
+CONF.import_opt('hedge_delay', 'glance.common.location_strategy.health',
+                group='health_location_strategy')
 LOG = logging.getLogger(__name__)
 
 
@@ -377,16 +386,84 @@ class ImageProxy(glance.domain.proxy.Image):
                     self.image.image_id,
                     location)
 
+    def _get_filesystem_store_path(self, source):
+        """Return where ``source`` can be linked into the filesystem store.
+
+        Returns None unless the filesystem store is the default store, uses
+        a single data directory and lives on the same filesystem as the
+        source file.
+        """
+        conf = CONF.glance_store
+        if (conf.default_store != 'file' or conf.filesystem_store_datadirs or
+                conf.filesystem_store_metadata_file or
+                not conf.filesystem_store_datadir):
+            return None
+        try:
+            same_fs = (os.stat(source.path).st_dev ==
+                       os.stat(conf.filesystem_store_datadir).st_dev)
+        except OSError:
+            return None
+        if not same_fs:
+            return None
+        return os.path.join(conf.filesystem_store_datadir,
+                            self.image.image_id)
+
+    def _link_to_backend(self, data, source):
+        """Link a local file into the filesystem store instead of copying.
+
+        The data is still read through the wrapping readers, so size limits
+        are enforced and the checksum is computed the way the store would,
+        but it is not written a second time.
+
+        :returns: the same tuple as add_to_backend or None if the file could
+                  not be linked
+        """
+        path = self._get_filesystem_store_path(source)
+        if path is None:
+            return None
+        if os.path.exists(path):
+            raise store.Duplicate(image=path)
+        try:
+            os.link(source.path, path)
+        except OSError as e:
+            LOG.debug("Unable to link %(src)s into the filesystem store, "
+                      "copying it instead: %(err)s",
+                      {'src': source.path,
+                       'err': encodeutils.exception_to_unicode(e)})
+            return None
+
+        try:
+            checksum = hashlib.md5()
+            size = 0
+            for chunk in utils.offload_iter(data, checksum.update):
+                size += len(chunk)
+            file_perm = CONF.glance_store.filesystem_store_file_perm
+            if file_perm > 0:
+                os.chmod(path, int(str(file_perm), 8))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                os.unlink(path)
+
+        LOG.debug("Linked %(src)s into the filesystem store at %(dst)s",
+                  {'src': source.path, 'dst': path})
+        return 'file://%s' % path, size, checksum.hexdigest(), {}
+
     def set_data(self, data, size=None):
         if size is None:
             size = 0  # NOTE(markwash): zero -> unknown size
-        location, size, checksum, loc_meta = self.store_api.add_to_backend(
-            CONF,
-            self.image.image_id,
-            utils.LimitingReader(utils.CooperativeReader(data),
-                                 CONF.image_size_cap),
-            size,
-            context=self.context)
+        reader = utils.LimitingReader(utils.CooperativeReader(data),
+                                      CONF.image_size_cap)
+        result = None
+        source = utils.get_local_file_reader(data)
+        if source is not None:
+            result = self._link_to_backend(reader, source)
+        if result is None:
+            result = self.store_api.add_to_backend(CONF,
+                                                   self.image.image_id,
+                                                   reader,
+                                                   size,
+                                                   context=self.context)
+        location, size, checksum, loc_meta = result
 
         # Verify the signature (if correct properties are present)
         if (signature_utils.should_verify_signature(
@@ -412,6 +489,8 @@ class ImageProxy(glance.domain.proxy.Image):
             # When the above glance_store bug is fixed we can
             # add a msg as usual.
             raise store.NotFound(image=None)
+        if location_strategy.tracks_location_health():
+            return self._get_data_tracked(offset, chunk_size)
         err = None
         for loc in self.image.locations:
             try:
@@ -433,6 +512,144 @@ class ImageProxy(glance.domain.proxy.Image):
                       'image %s but all have failed.') % self.image.image_id)
         raise err
 
+    def _open_location(self, loc, offset, chunk_size):
+        """Get the first chunk of image data from a location.
+
+        :returns: an _OpenedData iterator over the image data of the
+                  location
+        """
+        data, size = self.store_api.get_from_backend(
+            loc['url'],
+            offset=offset,
+            chunk_size=chunk_size,
+            context=self.context)
+        try:
+            return _OpenedData(data)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                _close_data(data)
+
+    def _get_data_tracked(self, offset, chunk_size):
+        """Get image data, failing over to the next location of the image
+        until one produces its first byte.
+
+        When hedge_delay is set, the next location is also read from if the
+        previous ones did not produce their first byte in time, and the
+        first location to do so is used. The data of the other locations is
+        closed once they produce their first byte.
+        """
+        hedge_delay = CONF.health_location_strategy.hedge_delay or None
+        locations = list(self.image.locations)
+        results = eventlet.queue.LightQueue()
+        pending = {}
+        cancelled = []
+
+        def open_location(loc):
+            start = time.time()
+            try:
+                data = self._open_location(loc, offset, chunk_size)
+            except Exception as e:
+                location_strategy.report_location_result(loc['url'])
+                results.put((loc, None, e))
+                return
+            if cancelled:
+                # NOTE: Another location was used, and this one was
+                # reported as slow when it was cancelled.
+                _close_data(data)
+                return
+            location_strategy.report_location_result(loc['url'],
+                                                     time.time() - start)
+            results.put((loc, data, None))
+
+        err = None
+        start_next = True
+        while True:
+            if start_next and locations:
+                loc = locations.pop(0)
+                pending[id(loc)] = (eventlet.spawn(open_location, loc),
+                                    loc, time.time())
+            start_next = False
+            if not pending:
+                break
+            try:
+                loc, data, e = results.get(
+                    timeout=hedge_delay if locations else None)
+            except eventlet.queue.Empty:
+                start_next = True
+                continue
+            del pending[id(loc)]
+            if e is None:
+                cancelled.append(True)
+                self._cancel_pending(pending, results)
+                return data
+            LOG.warn(_('Get image %(id)s data failed: '
+                       '%(err)s.')
+                     % {'id': self.image.image_id,
+                        'err': encodeutils.exception_to_unicode(e)})
+            err = e
+            start_next = True
+        LOG.error(_LE('Glance tried all active locations to get data for '
+                      'image %s but all have failed.') % self.image.image_id)
+        raise err
+
+    def _cancel_pending(self, pending, results):
+        """Release the locations opened besides the one being used.
+
+        Locations still opening close their data themselves when they are
+        done, and the data of the ones already opened is closed here.
+        """
+        for thread, loc, start in pending.values():
+            if not thread.dead:
+                # NOTE: The location was at least that slow
+                location_strategy.report_location_result(
+                    loc['url'], time.time() - start)
+        while True:
+            try:
+                loc, data, e = results.get_nowait()
+            except eventlet.queue.Empty:
+                break
+            if data is not None:
+                _close_data(data)
+
+
+class _OpenedData(object):
+    """Image data of a location whose first chunk has already been read.
+
+    Iterating goes through an itertools.chain of the first chunk and the
+    rest of the data, so there is no per chunk overhead, while close()
+    still reaches the backend iterator.
+    """
+    def __init__(self, data):
+        self.data = data
+        iterator = iter(data)
+        try:
+            first = [next(iterator)]
+        except StopIteration:
+            first = []
+        self._iterator = itertools.chain(first, iterator)
+
+    def __iter__(self):
+        return self._iterator
+
+    def next(self):
+        return next(self._iterator)
+
+    __next__ = next
+
+    def close(self):
+        _close_data(self.data)
+
+
+def _close_data(data):
+    close = getattr(data, 'close', None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception as e:
+        LOG.debug("Unable to close image data: %s",
+                  encodeutils.exception_to_unicode(e))
+
 
 class ImageMemberRepoProxy(glance.domain.proxy.Repo):
     def __init__(self, repo, image, context, store_api):
@@ -15,7 +15,10 @@
 #    under the License.
 
 import abc
+import functools
 
+import eventlet
+from eventlet import queue
 import glance_store
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -24,14 +27,18 @@ from oslo_utils import encodeutils
 from oslo_utils import excutils
 from oslo_utils import timeutils
 import six
+from six.moves import range
 import webob
 
 from glance.common import exception
+from glance.common import metadef_cache
+from glance.common import utils
 from glance.domain import proxy as domain_proxy
 from glance import i18n
 
 _ = i18n._
 _LE = i18n._LE
+_LW = i18n._LW
 
 notifier_opts = [
     cfg.StrOpt('default_publisher_id', default="image.localhost",
@@ -45,6 +52,32 @@ notifier_opts = [
                      '"image.create" notification will not be sent after '
                      'image is created and none of the notifications for '
                      'metadefinition namespaces will be sent.'),
+    cfg.IntOpt('notification_queue_size', default=0, min=0,
+               help=_('Maximum number of notifications waiting to be sent '
+                      'by each API worker. When greater than 0, '
+                      'notifications are queued and sent by a background '
+                      'green thread instead of during the request, and '
+                      'queued notifications are lost if the worker stops. '
+                      'The default value of 0 sends them during the '
+                      'request.')),
+    cfg.IntOpt('notification_batch_size', default=100, min=1,
+               help=_('Maximum number of queued notifications sent in a '
+                      'row before letting other green threads run.')),
+    cfg.StrOpt('notification_overflow_policy', default='drop',
+               choices=('drop', 'block'),
+               help=_('What to do with a notification when the queue of '
+                      'notifications waiting to be sent is full: \'drop\' '
+                      'it and log a warning, or \'block\' the request '
+                      'until there is room in the queue.')),
+    cfg.IntOpt('image_send_aggregation_interval', default=0, min=0,
+               help=_('Number of seconds during which the bytes sent by '
+                      'the complete downloads of an image to a user are '
+                      'added up, before being notified as a single '
+                      'image.send notification with the number of '
+                      'downloads. Incomplete downloads are still notified '
+                      'one by one, and the counts not notified yet are '
+                      'lost if the API worker stops. The default value of '
+                      '0 sends a notification for every download.')),
 ]
 
 CONF = cfg.CONF
@@ -71,31 +104,204 @@ class Notifier(object):
         self._transport = get_transport()
         self._notifier = oslo_messaging.Notifier(self._transport,
                                                  publisher_id=publisher_id)
+        self.enabled = _has_live_driver(self._notifier)
+
+    def _notify(self, priority, event_type, payload):
+        if not self.enabled:
+            return
+        notify = getattr(self._notifier, priority)
+        if CONF.notification_queue_size:
+            _get_dispatcher().dispatch(notify, event_type, payload)
+        else:
+            notify({}, event_type, payload)
 
     def warn(self, event_type, payload):
-        self._notifier.warn({}, event_type, payload)
+        self._notify('warn', event_type, payload)
 
     def info(self, event_type, payload):
-        self._notifier.info({}, event_type, payload)
+        self._notify('info', event_type, payload)
 
     def error(self, event_type, payload):
-        self._notifier.error({}, event_type, payload)
+        self._notify('error', event_type, payload)
+
+
+def _has_live_driver(notifier):
+    """Whether an oslo.messaging notifier sends notifications anywhere."""
+    is_enabled = getattr(notifier, 'is_enabled', None)
+    if is_enabled is not None:
+        return bool(is_enabled())
+    # NOTE: Older oslo.messaging releases have no is_enabled(), no driver
+    # or only the noop one means that notifications are dropped.
+    driver_names = getattr(notifier, '_driver_names', ['messaging'])
+    return any(name != 'noop' for name in driver_names)
+
+
+class _NotificationDispatcher(object):
+    """
+    Queue of notifications sent by a background green thread, so that
+    requests do not wait for the message bus.
+    """
+
+    def __init__(self, queue_size, batch_size, overflow_policy):
+        self._queue = queue.LightQueue(queue_size)
+        self._batch_size = batch_size
+        self._overflow_policy = overflow_policy
+        self._sender = None
+
+    def dispatch(self, notify, event_type, payload):
+        # NOTE: The sender is started by the first notification so that it
+        # runs in the API worker rather than in the process forking it.
+        if self._sender is None:
+            self._sender = eventlet.spawn(self._send_forever)
+
+        notification = (notify, event_type, payload)
+        if self._overflow_policy == 'block':
+            self._queue.put(notification)
+            return
+        try:
+            self._queue.put_nowait(notification)
+        except queue.Full:
+            LOG.warn(_LW("Notification queue is full, dropping %s "
+                         "notification."), event_type)
+
+    def _send(self, notify, event_type, payload):
+        try:
+            notify({}, event_type, payload)
+        except Exception:
+            LOG.exception(_LE("Failed to send %s notification."),
+                          event_type)
+
+    def _send_batch(self):
+        self._send(*self._queue.get())
+        for i in range(self._batch_size - 1):
+            try:
+                notification = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._send(*notification)
+
+    def _send_forever(self):
+        while True:
+            self._send_batch()
+            eventlet.sleep(0)
+
+
+_DISPATCHER = None
+
+
+def _get_dispatcher():
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        _DISPATCHER = _NotificationDispatcher(
+            CONF.notification_queue_size, CONF.notification_batch_size,
+            CONF.notification_overflow_policy)
+    return _DISPATCHER
+
+
+class _ImageSendAggregator(object):
+    """
+    Bytes sent per image and receiver, notified every interval by a
+    background green thread.
+    """
+
+    def __init__(self, interval):
+        self._interval = interval
+        self._sent = {}
+        self._flusher = None
+
+    def add(self, notify, payload):
+        if self._flusher is None:
+            self._flusher = eventlet.spawn(self._flush_forever)
+
+        key = (payload['image_id'], payload['owner_id'],
+               payload['receiver_tenant_id'], payload['receiver_user_id'])
+        sent = self._sent.setdefault(key, [notify, 0, 0])
+        sent[1] += payload['bytes_sent']
+        sent[2] += 1
+
+    def flush(self):
+        sent, self._sent = self._sent, {}
+        for key, (notify, bytes_sent, downloads) in six.iteritems(sent):
+            image_id, owner_id, tenant_id, user_id = key
+            payload = {
+                'bytes_sent': bytes_sent,
+                'downloads': downloads,
+                'image_id': image_id,
+                'owner_id': owner_id,
+                'receiver_tenant_id': tenant_id,
+                'receiver_user_id': user_id,
+            }
+            try:
+                notify('image.send', payload)
+            except Exception:
+                LOG.exception(_LE("Failed to send image.send notification "
+                                  "for image %s."), image_id)
+
+    def _flush_forever(self):
+        while True:
+            eventlet.sleep(self._interval)
+            self.flush()
+
+
+_IMAGE_SEND_AGGREGATOR = None
+
+
+def _get_image_send_aggregator():
+    global _IMAGE_SEND_AGGREGATOR
+    if _IMAGE_SEND_AGGREGATOR is None:
+        _IMAGE_SEND_AGGREGATOR = _ImageSendAggregator(
+            CONF.image_send_aggregation_interval)
+    return _IMAGE_SEND_AGGREGATOR
+
+
+def notify_image_send(notifier, payload, complete=True):
+    """
+    Send an image.send notification, or add the bytes sent to the next
+    one for the image and receiver when they are aggregated.
+
+    :param notifier: The notifier sending the notification.
+    :param payload: The image.send payload of a single download.
+    :param complete: Whether all the image data was sent, incomplete
+                     downloads are notified as errors right away.
+    """
+    if not complete:
+        notifier.error('image.send', payload)
+    elif CONF.image_send_aggregation_interval:
+        _get_image_send_aggregator().add(notifier.info, payload)
+    else:
+        notifier.info('image.send', payload)
 
 
 def _get_notification_group(notification):
     return notification.split('.', 1)[0]
 
 
-def _is_notification_enabled(notification):
+# The disabled_notifications option value and the set made out of it
+_DISABLED_NOTIFICATIONS = (None, frozenset())
+
+
+def _get_disabled_notifications():
+    global _DISABLED_NOTIFICATIONS
+    # NOTE: The option value is a new list whenever the configuration is
+    # reloaded or overridden, the set is only rebuilt then.
     disabled_notifications = CONF.disabled_notifications
-    notification_group = _get_notification_group(notification)
+    if _DISABLED_NOTIFICATIONS[0] is not disabled_notifications:
+        _DISABLED_NOTIFICATIONS = (disabled_notifications,
+                                   frozenset(disabled_notifications))
+    return _DISABLED_NOTIFICATIONS[1]
+
 
-    notifications = (notification, notification_group)
-    for disabled_notification in disabled_notifications:
-        if disabled_notification in notifications:
-            return False
+def _is_notification_enabled(notification, notifier=None):
+    if notifier is not None and not getattr(notifier, 'enabled', True):
+        return False
 
-    return True
+    disabled_notifications = _get_disabled_notifications()
+    if not disabled_notifications:
+        return True
+
+    return (notification not in disabled_notifications and
+            _get_notification_group(notification)
+            not in disabled_notifications)
 
 
 def _send_notification(notify, notification_type, payload):
@@ -267,11 +473,16 @@ class NotificationBase(object):
         return {}
 
     def send_notification(self, notification_id, obj, extra_payload=None):
+        # NOTE: Payloads are only built for the notifications which are
+        # actually sent, formatting them is not free.
+        if not _is_notification_enabled(notification_id, self.notifier):
+            return
+
         payload = self.get_payload(obj)
         if extra_payload is not None:
             payload.update(extra_payload)
 
-        _send_notification(self.notifier.info, notification_id, payload)
+        self.notifier.info(notification_id, payload)
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -310,6 +521,16 @@ class NotificationRepoProxy(NotificationBase):
         pass
 
 
+class MetadefNotificationRepoProxy(NotificationRepoProxy):
+    def send_notification(self, notification_id, obj, extra_payload=None):
+        # NOTE: Every metadef write is followed by its notification, even
+        # when notifications are disabled, which is when the cached
+        # catalog listings become out of date.
+        metadef_cache.invalidate()
+        super(MetadefNotificationRepoProxy, self).send_notification(
+            notification_id, obj, extra_payload=extra_payload)
+
+
 @six.add_metaclass(abc.ABCMeta)
 class NotificationFactoryProxy(object):
     def __init__(self, factory, context, notifier):
@@ -344,31 +565,27 @@ class ImageProxy(NotificationProxy, domain_proxy.Image):
             'receiver_user_id': self.context.user,
         }
 
-    def _get_chunk_data_iterator(self, data, chunk_size=None):
-        sent = 0
-        for chunk in data:
-            yield chunk
-            sent += len(chunk)
-
-        if sent != (chunk_size or self.repo.size):
-            notify = self.notifier.error
-        else:
-            notify = self.notifier.info
-
+    def _notify_image_sent(self, sent, chunk_size=None):
+        complete = sent == (chunk_size or self.repo.size)
         try:
-            _send_notification(notify, 'image.send',
-                               self._format_image_send(sent))
+            notify_image_send(self.notifier, self._format_image_send(sent),
+                              complete=complete)
         except Exception as err:
             msg = (_LE("An error occurred during image.send"
                        " notification: %(err)s") % {'err': err})
             LOG.error(msg)
 
     def get_data(self, offset=0, chunk_size=None):
-        # Due to the need of evaluating subsequent proxies, this one
-        # should return a generator, the call should be done before
-        # generator creation
+        # NOTE: The notification is sent by a hook of the iterator once
+        # all the data has been sent, subsequent proxies are evaluated
+        # right away.
         data = self.repo.get_data(offset=offset, chunk_size=chunk_size)
-        return self._get_chunk_data_iterator(data, chunk_size=chunk_size)
+        if not _is_notification_enabled('image.send', self.notifier):
+            return data
+        data = utils.streaming_iter(data)
+        data.add_hooks(end=functools.partial(self._notify_image_sent,
+                                             chunk_size=chunk_size))
+        return data
 
     def set_data(self, data, size=None):
         self.send_notification('image.prepare', self.repo)
@@ -549,7 +766,7 @@ class MetadefNamespaceFactoryProxy(NotificationFactoryProxy,
         return MetadefNamespaceProxy
 
 
-class MetadefNamespaceRepoProxy(NotificationRepoProxy,
+class MetadefNamespaceRepoProxy(MetadefNotificationRepoProxy,
                                 domain_proxy.MetadefNamespaceRepo):
     def get_super_class(self):
         return domain_proxy.MetadefNamespaceRepo
@@ -621,7 +838,7 @@ class MetadefObjectFactoryProxy(NotificationFactoryProxy,
         return MetadefObjectProxy
 
 
-class MetadefObjectRepoProxy(NotificationRepoProxy,
+class MetadefObjectRepoProxy(MetadefNotificationRepoProxy,
                              domain_proxy.MetadefObjectRepo):
     def get_super_class(self):
         return domain_proxy.MetadefObjectRepo
@@ -675,7 +892,7 @@ class MetadefPropertyFactoryProxy(NotificationFactoryProxy,
         return MetadefPropertyProxy
 
 
-class MetadefPropertyRepoProxy(NotificationRepoProxy,
+class MetadefPropertyRepoProxy(MetadefNotificationRepoProxy,
                                domain_proxy.MetadefPropertyRepo):
     def get_super_class(self):
         return domain_proxy.MetadefPropertyRepo
@@ -730,7 +947,7 @@ class MetadefResourceTypeFactoryProxy(NotificationFactoryProxy,
         return MetadefResourceTypeProxy
 
 
-class MetadefResourceTypeRepoProxy(NotificationRepoProxy,
+class MetadefResourceTypeRepoProxy(MetadefNotificationRepoProxy,
                                    domain_proxy.MetadefResourceTypeRepo):
     def get_super_class(self):
         return domain_proxy.MetadefResourceTypeRepo
@@ -776,7 +993,8 @@ class MetadefTagFactoryProxy(NotificationFactoryProxy,
         return MetadefTagProxy
 
 
-class MetadefTagRepoProxy(NotificationRepoProxy, domain_proxy.MetadefTagRepo):
+class MetadefTagRepoProxy(MetadefNotificationRepoProxy,
+                          domain_proxy.MetadefTagRepo):
     def get_super_class(self):
         return domain_proxy.MetadefTagRepo
 
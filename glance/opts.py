@@ -25,12 +25,18 @@ import itertools
 
 import glance.api.middleware.context
 import glance.api.versions
+import glance.async.flows.base_import
+import glance.async.flows.convert
 import glance.async.taskflow_executor
+import glance.async.worker
 import glance.common.config
 import glance.common.location_strategy
+import glance.common.location_strategy.health
 import glance.common.location_strategy.store_type
+import glance.common.metadef_cache
 import glance.common.property_utils
 import glance.common.rpc
+import glance.common.scripts.utils
 import glance.common.wsgi
 import glance.image_cache
 import glance.image_cache.drivers.sqlite
@@ -47,6 +53,7 @@ _api_opts = [
         glance.api.versions.versions_opts,
         glance.common.config.common_opts,
         glance.common.location_strategy.location_strategy_opts,
+        glance.common.metadef_cache.metadef_cache_opts,
         glance.common.property_utils.property_opts,
         glance.common.rpc.rpc_opts,
         glance.common.wsgi.bind_opts,
@@ -62,11 +69,18 @@ _api_opts = [
         glance.registry.client.v1.api.registry_client_ctx_opts,
         glance.scrubber.scrubber_opts))),
     ('image_format', glance.common.config.image_format_opts),
-    ('task', glance.common.config.task_opts),
-    ('taskflow_executor',
-     glance.async.taskflow_executor.taskflow_executor_opts),
+    ('task', list(itertools.chain(
+        glance.common.config.task_opts,
+        glance.common.scripts.utils.import_opts))),
+    ('taskflow_executor', list(itertools.chain(
+        glance.async.taskflow_executor.taskflow_executor_opts,
+        glance.async.flows.base_import.import_task_opts,
+        glance.async.flows.convert.convert_task_opts))),
+    ('task_worker', glance.async.worker.task_worker_opts),
     ('store_type_location_strategy',
      glance.common.location_strategy.store_type.store_type_opts),
+    ('health_location_strategy',
+     glance.common.location_strategy.health.health_opts),
     ('paste_deploy', glance.common.config.paste_deploy_opts)
 ]
 _registry_opts = [
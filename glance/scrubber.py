@@ -14,6 +14,8 @@
 #    under the License.
 
 import calendar
+import collections
+import datetime
 import time
 
 import eventlet
@@ -21,7 +23,9 @@ from glance_store import exceptions as store_exceptions
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import encodeutils
+from oslo_utils import timeutils
 import six
+from six.moves.urllib import parse as urlparse
 
 from glance.common import crypt
 from glance.common import exception
@@ -47,6 +51,31 @@ scrubber_opts = [
                       'signifies serial scrubbing. Any value above '
                       'one indicates the max number of images that '
                       'may be scrubbed in parallel.')),
+    cfg.IntOpt('scrub_batch_size', default=0,
+               help=_('The maximum number of images to fetch from the '
+                      'scrub queue and scrub in one batch. The default is '
+                      'zero, which signifies that all pending images are '
+                      'fetched before scrubbing starts. Any value above '
+                      'zero bounds the memory used by a scrub run and lets '
+                      'large backlogs drain batch by batch.')),
+    cfg.IntOpt('scrub_location_pool_size', default=1,
+               help=_('The size of thread pool to be used for deleting '
+                      'the locations of a single image. The default is '
+                      'one, which signifies that the locations of an '
+                      'image are deleted serially.')),
+    cfg.FloatOpt('scrub_rate_limit', default=0,
+                 help=_('The maximum number of location deletes per second '
+                        'that may be issued to a single backend store, '
+                        'identified by its location scheme. The default is '
+                        'zero, which signifies no rate limiting.')),
+    cfg.StrOpt('scrub_queue_source', default='registry',
+               choices=('registry', 'db'),
+               help=_('Where the scrubber reads its queue of image '
+                      'locations pending delete from. \'registry\' pages '
+                      'pending_delete images through the registry API; '
+                      '\'db\' queries the image_locations table directly '
+                      'through the configured data_api, filtering on status '
+                      'and deletion time in the database.')),
     cfg.BoolOpt('delayed_delete', default=False,
                 help=_('Turn on/off delayed delete.')),
     cfg.StrOpt('admin_role', default='admin',
@@ -85,6 +114,8 @@ CONF = cfg.CONF
 CONF.register_opts(scrubber_opts)
 CONF.import_opt('metadata_encryption_key', 'glance.common.config')
 
+DB_QUEUE_PAGE_SIZE = 1000
+
 
 class ScrubDBQueue(object):
     """Database-based image scrub queue class."""
@@ -153,13 +184,42 @@ class ScrubDBQueue(object):
             for image in images:
                 yield image
 
-    def get_all_locations(self):
-        """Returns a list of image id and location tuple from scrub queue.
+    def _get_locations_page(self, deleted_before, marker):
+        return db_api.get_api().image_location_get_all_by_status(
+            self.admin_context, 'pending_delete',
+            deleted_before=deleted_before, marker=marker,
+            limit=DB_QUEUE_PAGE_SIZE)
 
-        :retval a list of image id, location id and uri tuple from scrub queue
+    def _iter_db_locations(self):
+        """Generator of pending_delete locations read from the database.
+
+        Locations are paged in (image id, location id) order and the
+        locations of an image are only yielded once all of them have been
+        read, so an image is never split across a page boundary.
         """
-        ret = []
+        deleted_before = (timeutils.utcnow() -
+                          datetime.timedelta(seconds=self.scrub_time))
+        marker = None
+        image_records = []
+        while True:
+            locations = self._get_locations_page(deleted_before, marker)
+            if len(locations) == 0:
+                break
+            marker = (locations[-1]['image_id'], locations[-1]['id'])
+
+            for loc in locations:
+                if (image_records and
+                        image_records[0][0] != loc['image_id']):
+                    for record in image_records:
+                        yield record
+                    image_records = []
+                image_records.append((loc['image_id'], loc['id'],
+                                      self._encrypt(loc['url'])))
 
+        for record in image_records:
+            yield record
+
+    def _iter_registry_locations(self):
         for image in self._get_all_images():
             deleted_at = image.get('deleted_at')
             if not deleted_at:
@@ -178,14 +238,32 @@ class ScrubDBQueue(object):
                 if loc['status'] != 'pending_delete':
                     continue
 
-                if self.metadata_encryption_key:
-                    uri = crypt.urlsafe_encrypt(self.metadata_encryption_key,
-                                                loc['url'], 64)
-                else:
-                    uri = loc['url']
+                yield (image['id'], loc['id'], self._encrypt(loc['url']))
+
+    def _encrypt(self, uri):
+        if self.metadata_encryption_key:
+            return crypt.urlsafe_encrypt(self.metadata_encryption_key,
+                                         uri, 64)
+        return uri
+
+    def iter_locations(self):
+        """Generator of image id and location tuples from scrub queue.
 
-                ret.append((image['id'], loc['id'], uri))
-        return ret
+        Locations are fetched page by page as the generator is consumed, so
+        only one page is held in memory at a time.
+
+        :retval a generator of image id, location id and uri tuples
+        """
+        if CONF.scrub_queue_source == 'db':
+            return self._iter_db_locations()
+        return self._iter_registry_locations()
+
+    def get_all_locations(self):
+        """Returns a list of image id and location tuple from scrub queue.
+
+        :retval a list of image id, location id and uri tuple from scrub queue
+        """
+        return list(self.iter_locations())
 
     def has_image(self, image_id):
         """Returns whether the queue contains an image or not.
@@ -211,6 +289,27 @@ def get_scrub_queue():
     return _db_queue
 
 
+class RateLimiter(object):
+    """Spaces out calls so that at most `rate` of them run per second.
+
+    Each caller reserves the next free slot before sleeping, so concurrent
+    greenthreads sharing a limiter are serialized onto the same schedule.
+    A rate of zero disables limiting.
+    """
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_slot = 0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.time()
+        delay = self.next_slot - now
+        self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            eventlet.sleep(delay)
+
+
 class Daemon(object):
     def __init__(self, wakeup_time=300, threads=100):
         LOG.info(_LI("Starting Daemon: wakeup_time=%(wakeup_time)s "
@@ -272,6 +371,9 @@ class Scrubber(object):
 
         self.db_queue = get_scrub_queue()
         self.pool = eventlet.greenpool.GreenPool(CONF.scrub_pool_size)
+        self.batch_size = CONF.scrub_batch_size
+        self.location_pool_size = max(CONF.scrub_location_pool_size, 1)
+        self.rate_limiters = {}
 
     def _get_delete_jobs(self):
         try:
@@ -281,48 +383,123 @@ class Scrubber(object):
                       encodeutils.exception_to_unicode(err))
             return {}
 
-        delete_jobs = {}
+        return self._group_delete_jobs(records)
+
+    def _group_delete_jobs(self, records):
+        delete_jobs = collections.OrderedDict()
         for image_id, loc_id, loc_uri in records:
             if image_id not in delete_jobs:
                 delete_jobs[image_id] = []
             delete_jobs[image_id].append((image_id, loc_id, loc_uri))
         return delete_jobs
 
-    def run(self, event=None):
-        delete_jobs = self._get_delete_jobs()
+    def _get_delete_job_batches(self):
+        """Generator of delete jobs, batch_size images at a time.
+
+        The scrub queue is consumed lazily, so at most one batch of images
+        (plus one registry page) is held in memory while scrubbing. The
+        queue yields the locations of an image together and a batch is only
+        closed when the next image starts, so an image is never marked
+        deleted while some of its locations are left for a later batch.
+        """
+        if self.batch_size <= 0:
+            delete_jobs = self._get_delete_jobs()
+            if delete_jobs:
+                yield delete_jobs
+            return
+
+        batch = []
+        batch_images = set()
+        try:
+            for record in self.db_queue.iter_locations():
+                image_id = record[0]
+                if (image_id not in batch_images and
+                        len(batch_images) >= self.batch_size):
+                    yield self._group_delete_jobs(batch)
+                    batch = []
+                    batch_images = set()
+                batch.append(record)
+                batch_images.add(image_id)
+        except Exception as err:
+            LOG.error(_LE("Can not get scrub jobs from queue: %s") %
+                      encodeutils.exception_to_unicode(err))
+            return
+
+        if batch:
+            yield self._group_delete_jobs(batch)
 
-        if delete_jobs:
-            list(self.pool.starmap(self._scrub_image, delete_jobs.items()))
+    def run(self, event=None):
+        for delete_jobs in self._get_delete_job_batches():
+            LOG.debug("Scrubbing a batch of %d images", len(delete_jobs))
+            results = self.pool.starmap(self._scrub_image_locations,
+                                        delete_jobs.items())
+            scrubbed = [image_id for image_id, success
+                        in zip(delete_jobs.keys(), results) if success]
+            self._update_images_status(scrubbed)
 
     def _scrub_image(self, image_id, delete_jobs):
+        if self._scrub_image_locations(image_id, delete_jobs):
+            self._update_images_status([image_id])
+
+    def _scrub_image_locations(self, image_id, delete_jobs):
         if len(delete_jobs) == 0:
-            return
+            return False
 
         LOG.info(_LI("Scrubbing image %(id)s from %(count)d locations."),
                  {'id': image_id, 'count': len(delete_jobs)})
 
-        success = True
-        for img_id, loc_id, uri in delete_jobs:
+        def _delete(img_id, loc_id, uri):
             try:
                 self._delete_image_location_from_backend(img_id, loc_id, uri)
+                return True
             except Exception:
-                success = False
+                return False
 
-        if success:
-            image = self.registry.get_image(image_id)
-            if image['status'] == 'pending_delete':
-                self.registry.update_image(image_id, {'status': 'deleted'})
-            LOG.info(_LI("Image %s has been scrubbed successfully"), image_id)
+        if self.location_pool_size > 1 and len(delete_jobs) > 1:
+            pool = eventlet.greenpool.GreenPool(self.location_pool_size)
+            success = all(list(pool.starmap(_delete, delete_jobs)))
         else:
+            success = all([_delete(*job) for job in delete_jobs])
+
+        if not success:
             LOG.warn(_LW("One or more image locations couldn't be scrubbed "
                          "from backend. Leaving image '%s' in 'pending_delete'"
                          " status") % image_id)
+        return success
+
+    def _update_images_status(self, image_ids):
+        """Move scrubbed images from 'pending_delete' to 'deleted'.
+
+        The update is made conditional on the image still being in
+        'pending_delete' status, which saves a registry lookup per image.
+        """
+        for image_id in image_ids:
+            try:
+                self.registry.update_image(image_id, {'status': 'deleted'},
+                                           from_state='pending_delete')
+                LOG.info(_LI("Image %s has been scrubbed successfully"),
+                         image_id)
+            except (exception.Duplicate, exception.NotFound):
+                LOG.info(_LI("Image %s is no longer pending delete; "
+                             "leaving its status untouched"), image_id)
+            except Exception as e:
+                LOG.error(_LE("Unable to mark image %(id)s as deleted. "
+                              "Reason: %(exc)s ") %
+                          {'id': image_id,
+                           'exc': encodeutils.exception_to_unicode(e)})
+
+    def _get_rate_limiter(self, uri):
+        scheme = urlparse.urlparse(uri).scheme
+        if scheme not in self.rate_limiters:
+            self.rate_limiters[scheme] = RateLimiter(CONF.scrub_rate_limit)
+        return self.rate_limiters[scheme]
 
     def _delete_image_location_from_backend(self, image_id, loc_id, uri):
         if CONF.metadata_encryption_key:
             uri = crypt.urlsafe_decrypt(CONF.metadata_encryption_key, uri)
         try:
             LOG.debug("Scrubbing image %s from a location." % image_id)
+            self._get_rate_limiter(uri).wait()
             try:
                 self.store_api.delete_from_backend(uri, self.admin_context)
             except store_exceptions.NotFound:
@@ -217,6 +217,12 @@ class DriverTests(object):
                   for p in image['properties']]
         self.assertEqual(expected, actual)
 
+    def test_image_create_with_tags(self):
+        fixture = {'status': 'queued', 'tags': ['ping', 'pong']}
+        image = self.db_api.image_create(self.context, fixture)
+        tags = self.db_api.image_tag_get_all(self.context, image['id'])
+        self.assertEqual(['ping', 'pong'], tags)
+
     def test_image_create_unknown_attributes(self):
         fixture = {'ping': 'pong'}
         self.assertRaises(exception.Invalid,
@@ -333,6 +339,26 @@ class DriverTests(object):
         self.assertEqual('bar', properties['foo']['value'])
         self.assertTrue(properties['foo']['deleted'])
 
+    def test_image_update_delete_properties(self):
+        fixture = {'properties': {'ping': 'pong'}}
+        image = self.db_api.image_update(self.adm_context, UUID1, fixture,
+                                         delete_props=['foo', 'missing'])
+        properties = {p['name']: p for p in image['properties']}
+
+        self.assertFalse(properties['ping']['deleted'])
+        self.assertFalse(properties['far']['deleted'])
+        self.assertTrue(properties['foo']['deleted'])
+        self.assertNotIn('missing', properties)
+
+    def test_image_update_tags(self):
+        self.db_api.image_tag_set_all(self.context, UUID1, ['ping', 'pong'])
+        self.db_api.image_update(self.adm_context, UUID1, {},
+                                 add_tags=['pong', 'snap'],
+                                 delete_tags=['ping', 'missing'])
+
+        tags = self.db_api.image_tag_get_all(self.context, UUID1)
+        self.assertEqual(['pong', 'snap'], sorted(tags))
+
     def test_image_update_bad_name(self):
         fixture = {'name': u'A new name with forbidden symbol \U0001f62a'}
         self.assertRaises(exception.Invalid, self.db_api.image_update,
@@ -358,6 +384,73 @@ class DriverTests(object):
         self.assertRaises(exception.Invalid, self.db_api.image_update,
                           self.adm_context, UUID1, fixture)
 
+    def test_image_location_get_all_by_status(self):
+        location_data = [{'url': 'a', 'metadata': {}, 'status': 'active'},
+                         {'url': 'b', 'metadata': {}, 'status': 'active'},
+                         {'url': 'c', 'metadata': {}, 'status': 'active'}]
+        fixture = {'status': 'queued', 'locations': location_data}
+        image = self.db_api.image_create(self.adm_context, fixture)
+        loc_ids = [loc['id'] for loc in image['locations']]
+
+        delete_time = timeutils.utcnow() - datetime.timedelta(hours=1)
+        self.db_api.image_location_delete(self.adm_context, image['id'],
+                                          loc_ids[0], 'pending_delete',
+                                          delete_time=delete_time)
+        self.db_api.image_location_delete(self.adm_context, image['id'],
+                                          loc_ids[1], 'pending_delete')
+        self.db_api.image_location_delete(self.adm_context, image['id'],
+                                          loc_ids[2], 'deleted',
+                                          delete_time=delete_time)
+
+        locations = self.db_api.image_location_get_all_by_status(
+            self.adm_context, 'pending_delete')
+        self.assertEqual(['a', 'b'], [loc['url'] for loc in locations])
+        self.assertEqual([image['id']] * 2,
+                         [loc['image_id'] for loc in locations])
+
+        deleted_before = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        locations = self.db_api.image_location_get_all_by_status(
+            self.adm_context, 'pending_delete', deleted_before=deleted_before)
+        self.assertEqual(['a'], [loc['url'] for loc in locations])
+
+        locations = self.db_api.image_location_get_all_by_status(
+            self.adm_context, 'pending_delete', limit=1)
+        self.assertEqual(['a'], [loc['url'] for loc in locations])
+        marker = (locations[-1]['image_id'], locations[-1]['id'])
+        locations = self.db_api.image_location_get_all_by_status(
+            self.adm_context, 'pending_delete', marker=marker)
+        self.assertEqual(['b'], [loc['url'] for loc in locations])
+
+    def test_image_location_get_all_by_status_groups_images(self):
+        images = [self.db_api.image_create(self.adm_context,
+                                           {'status': 'queued'})
+                  for i in range(2)]
+        # Add the locations alternately so their ids interleave.
+        for url in ('a', 'b'):
+            for image in images:
+                self.db_api.image_location_add(
+                    self.adm_context, image['id'],
+                    {'url': '%s%s' % (image['id'], url), 'metadata': {},
+                     'status': 'pending_delete'})
+
+        expected = sorted((image['id'], '%s%s' % (image['id'], url))
+                          for image in images for url in ('a', 'b'))
+        locations = self.db_api.image_location_get_all_by_status(
+            self.adm_context, 'pending_delete')
+        self.assertEqual(expected, [(loc['image_id'], loc['url'])
+                                    for loc in locations])
+
+        marker = None
+        paged = []
+        while True:
+            page = self.db_api.image_location_get_all_by_status(
+                self.adm_context, 'pending_delete', marker=marker, limit=1)
+            if not page:
+                break
+            marker = (page[-1]['image_id'], page[-1]['id'])
+            paged.extend((loc['image_id'], loc['url']) for loc in page)
+        self.assertEqual(expected, paged)
+
     def test_update_locations_direct(self):
         """
         For some reasons update_locations can be called directly
@@ -1730,6 +1823,45 @@ class TaskTests(test_utils.BaseTestCase):
         self.assertEqual(task_values['created_at'], task['created_at'])
         self.assertTrue(task['updated_at'] > task['created_at'])
 
+    def test_task_claim(self):
+        self.context.tenant = str(uuid.uuid4())
+        task_values = build_task_fixture(owner=self.context.owner)
+        task = self.db_api.task_create(self.adm_context, task_values)
+
+        self.assertTrue(self.db_api.task_claim(self.adm_context, task['id']))
+        task = self.db_api.task_get(self.adm_context, task['id'])
+        self.assertEqual('processing', task['status'])
+
+        # A task can only be claimed once
+        self.assertFalse(self.db_api.task_claim(self.adm_context, task['id']))
+
+    def test_task_claim_stale(self):
+        self.context.tenant = str(uuid.uuid4())
+        task_values = build_task_fixture(owner=self.context.owner)
+        task = self.db_api.task_create(self.adm_context, task_values)
+        self.assertTrue(self.db_api.task_claim(self.adm_context, task['id']))
+
+        # The claim is still held, so the task can't be claimed again
+        stale_before = timeutils.utcnow() - datetime.timedelta(minutes=1)
+        self.assertFalse(self.db_api.task_claim(
+            self.adm_context, task['id'], stale_before=stale_before))
+
+        # Once the claim has expired another worker can take the task over
+        stale_before = timeutils.utcnow() + datetime.timedelta(minutes=1)
+        self.assertTrue(self.db_api.task_claim(
+            self.adm_context, task['id'], stale_before=stale_before))
+        # ... but only one of them
+        task = self.db_api.task_get(self.adm_context, task['id'])
+        self.assertFalse(self.db_api.task_claim(
+            self.adm_context, task['id'], stale_before=task['updated_at']))
+        self.assertEqual('processing', task['status'])
+
+        # Renewing the claim keeps the task from being taken over
+        stale_before = timeutils.utcnow()
+        self.db_api.task_claim_renew(self.adm_context, [task['id']])
+        self.assertFalse(self.db_api.task_claim(
+            self.adm_context, task['id'], stale_before=stale_before))
+
     def test_task_update_with_all_task_info_null(self):
         self.context.tenant = str(uuid.uuid4())
         task_values = build_task_fixture(owner=self.context.owner,
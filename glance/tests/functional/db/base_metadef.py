@@ -142,6 +142,44 @@ class MetadefNamespaceTests(object):
             self.context, created['namespace'])
         self.assertIsNotNone(found, "Namespace not found.")
 
+    def test_namespace_get_details(self):
+        created = self.db_api.metadef_namespace_create(
+            self.context, build_namespace_fixture())
+        name = created['namespace']
+        self.db_api.metadef_object_create(self.context, name,
+                                          build_object_fixture())
+        self.db_api.metadef_property_create(self.context, name,
+                                            build_property_fixture())
+        self.db_api.metadef_tag_create_tags(
+            self.context, name, build_tags_fixture(['tag1', 'tag2']))
+        self.db_api.metadef_resource_type_association_create(
+            self.context, name, build_association_fixture())
+
+        found = self.db_api.metadef_namespace_get_details(self.context, name)
+        self.assertEqual(created['id'], found['id'])
+        self.assertEqual(['test-object-name'],
+                         [obj['name'] for obj in found['objects']])
+        self.assertEqual(['test-property-name'],
+                         [prop['name'] for prop in found['properties']])
+        self.assertEqual(set(['tag1', 'tag2']),
+                         set(tag['name'] for tag in found['tags']))
+        self.assertEqual(
+            ['MyTestResourceType'],
+            [assn['name'] for assn in found['resource_type_associations']])
+
+        found = self.db_api.metadef_namespace_get(self.context, name)
+        self.assertNotIn('objects', found)
+
+    def test_namespace_get_details_not_visible(self):
+        created = self.db_api.metadef_namespace_create(
+            self.context, build_namespace_fixture(visibility='private'))
+        self.assertRaises(exception.Forbidden,
+                          self.db_api.metadef_namespace_get_details,
+                          self.context, created['namespace'])
+        self.assertRaises(exception.NotFound,
+                          self.db_api.metadef_namespace_get_details,
+                          self.context, 'missing')
+
     def test_namespace_get_all_with_resource_types_filter(self):
         ns_fixture = build_namespace_fixture()
         ns_created = self.db_api.metadef_namespace_create(
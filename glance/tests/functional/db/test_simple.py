@@ -14,6 +14,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from glance.api import CONF
 import glance.db.simple.api
 import glance.tests.functional.db as db_tests
@@ -40,6 +42,41 @@ class TestSimpleDriver(base.TestDriver,
         super(TestSimpleDriver, self).setUp()
         self.addCleanup(db_tests.reset)
 
+    def _get_all_ids(self, context, **filters):
+        images = self.db_api.image_get_all(context, filters=filters)
+        return set(image['id'] for image in images)
+
+    def test_image_get_all_follows_updates(self):
+        image_id = self.fixtures[0]['id']
+        self.db_api.image_update(self.adm_context, image_id,
+                                 {'owner': 'tenant', 'is_public': False,
+                                  'status': 'queued'},
+                                 add_tags=['ping'])
+
+        self.assertEqual(set([image_id]),
+                         self._get_all_ids(self.adm_context,
+                                           owner='tenant'))
+        self.assertEqual(set([image_id]),
+                         self._get_all_ids(self.adm_context,
+                                           status='queued'))
+        self.assertEqual(set([image_id]),
+                         self._get_all_ids(self.adm_context, tags=['ping']))
+        self.assertNotIn(image_id, self._get_all_ids(self.context))
+
+        self.db_api.image_tag_delete(self.adm_context, image_id, 'ping')
+        self.db_api.image_destroy(self.adm_context, image_id)
+        self.assertEqual(set(),
+                         self._get_all_ids(self.adm_context, tags=['ping']))
+        self.assertEqual(set(),
+                         self._get_all_ids(self.adm_context,
+                                           status='queued'))
+
+    def test_image_get_all_finds_members_once(self):
+        with mock.patch.object(self.db_api, 'image_member_find',
+                               wraps=self.db_api.image_member_find) as find:
+            self.db_api.image_get_all(self.context)
+        self.assertEqual(1, find.call_count)
+
 
 class TestSimpleQuota(base.DriverQuotaTests,
                       base.FunctionalInitWrapper):
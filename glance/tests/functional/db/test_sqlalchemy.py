@@ -14,11 +14,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import json
+import os
+
 from oslo_config import cfg
 from oslo_db import options
+from oslo_utils import timeutils
+from sqlalchemy import event
 
 from glance.common import exception
 import glance.db.sqlalchemy.api
+from glance.db.sqlalchemy import metadata
 from glance.db.sqlalchemy import models as db_models
 from glance.db.sqlalchemy import models_artifacts as artifact_models
 from glance.db.sqlalchemy import models_metadef as metadef_models
@@ -82,6 +89,59 @@ class TestSqlAlchemyDriver(base.TestDriver,
                           self.db_api.user_get_storage_usage,
                           self.context, 'fake_owner_id', image_id)
 
+    def _record_statements(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            statements.append(statement.split('(')[0].strip())
+
+        engine = self.db_api.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(event.remove, engine, 'before_cursor_execute',
+                        before_cursor_execute)
+        return statements
+
+    def test_image_create_inserts_child_entries_in_bulk(self):
+        locations = [{'url': 'file:///%d' % i, 'metadata': {},
+                      'status': 'active'} for i in range(3)]
+        fixture = {'status': 'active',
+                   'properties': {'prop%d' % i: 'value' for i in range(20)},
+                   'locations': locations,
+                   'tags': ['tag%d' % i for i in range(5)]}
+        statements = self._record_statements()
+        image = self.db_api.image_create(self.context, fixture)
+
+        for table in ('image_properties', 'image_locations', 'image_tags'):
+            self.assertEqual(1, statements.count('INSERT INTO %s' % table))
+        self.assertEqual(20, len(image['properties']))
+        self.assertEqual(3, len(image['locations']))
+        self.assertEqual(5, len(self.db_api.image_tag_get_all(self.context,
+                                                              image['id'])))
+
+    def test_image_update_deletes_child_entries_in_bulk(self):
+        fixture = {'status': 'active',
+                   'properties': {'prop%d' % i: 'value' for i in range(20)},
+                   'tags': ['tag%d' % i for i in range(5)]}
+        image = self.db_api.image_create(self.context, fixture)
+        statements = self._record_statements()
+        image = self.db_api.image_update(
+            self.adm_context, image['id'], {'properties': {'prop0': 'new'}},
+            purge_props=True, delete_tags=['tag%d' % i for i in range(4)])
+
+        updates = [statement.split()[1] for statement in statements
+                   if statement.startswith('UPDATE')]
+        # NOTE: One statement changes prop0 and another deletes the others
+        self.assertEqual(2, updates.count('image_properties'))
+        self.assertEqual(1, updates.count('image_tags'))
+        properties = {p['name']: p for p in image['properties']
+                      if not p['deleted']}
+        self.assertEqual({'prop0': 'new'},
+                         {k: v['value'] for k, v in properties.items()})
+        self.assertEqual(['tag4'],
+                         self.db_api.image_tag_get_all(self.context,
+                                                       image['id']))
+
 
 class TestSqlAlchemyVisibility(base.TestVisibility,
                                base.VisibilityTests,
@@ -150,6 +210,54 @@ class TestSqlAlchemyTask(base.TaskTests,
         super(TestSqlAlchemyTask, self).setUp()
         self.addCleanup(db_tests.reset)
 
+    def _create_expired_tasks(self, count, expired_since):
+        task_ids = []
+        for i in range(count):
+            expires_at = timeutils.utcnow() - datetime.timedelta(
+                seconds=expired_since - i)
+            task_values = base.build_task_fixture(owner=self.context.owner,
+                                                  expires_at=expires_at)
+            task_ids.append(
+                self.db_api.task_create(self.adm_context, task_values)['id'])
+        return task_ids
+
+    def test_task_delete_expired(self):
+        expired_ids = self._create_expired_tasks(3, 60)
+        alive = self.db_api.task_create(
+            self.adm_context, base.build_task_fixture(
+                owner=self.context.owner,
+                expires_at=timeutils.utcnow() + datetime.timedelta(hours=1)))
+
+        self.assertEqual(2, self.db_api.task_delete_expired(self.adm_context,
+                                                            max_rows=2))
+        self.assertRaises(exception.TaskNotFound, self.db_api.task_get,
+                          self.context, expired_ids[0])
+        self.assertRaises(exception.TaskNotFound, self.db_api.task_get,
+                          self.context, expired_ids[1])
+        self.db_api.task_get(self.context, expired_ids[2])
+
+        self.assertEqual(1, self.db_api.task_delete_expired(self.adm_context,
+                                                            max_rows=2))
+        self.assertEqual(0, self.db_api.task_delete_expired(self.adm_context))
+        self.db_api.task_get(self.context, alive['id'])
+        task = self.db_api.task_get(self.adm_context, expired_ids[0],
+                                    force_show_deleted=True)
+        self.assertTrue(task['deleted'])
+        self.assertIsNotNone(task['deleted_at'])
+
+    def test_task_delete_expired_purge(self):
+        expired_ids = self._create_expired_tasks(2, 60)
+        self.db_api.task_delete(self.adm_context, expired_ids[0])
+
+        self.assertEqual(2, self.db_api.task_delete_expired(self.adm_context,
+                                                            purge=True))
+        for task_id in expired_ids:
+            self.assertRaises(exception.TaskNotFound, self.db_api.task_get,
+                              self.adm_context, task_id,
+                              force_show_deleted=True)
+        session = self.db_api.get_session()
+        self.assertEqual(0, session.query(db_models.TaskInfo).count())
+
 
 class TestSqlAlchemyQuota(base.DriverQuotaTests,
                           base.FunctionalInitWrapper):
@@ -176,3 +284,160 @@ class TestMetadefSqlAlchemyDriver(base_metadef.TestMetadefDriver,
         db_tests.load(get_db, reset_db_metadef)
         super(TestMetadefSqlAlchemyDriver, self).setUp()
         self.addCleanup(db_tests.reset)
+
+    def test_namespace_get_details_query_count(self):
+        created = self.db_api.metadef_namespace_create(
+            self.context, base_metadef.build_namespace_fixture())
+        name = created['namespace']
+        for i in range(3):
+            self.db_api.metadef_object_create(
+                self.context, name,
+                base_metadef.build_object_fixture(name='object%d' % i))
+            self.db_api.metadef_property_create(
+                self.context, name,
+                base_metadef.build_property_fixture(name='property%d' % i))
+        self.db_api.metadef_tag_create_tags(
+            self.context, name,
+            base_metadef.build_tags_fixture(['tag%d' % i for i in range(3)]))
+
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            if statement.startswith('SELECT') and statement != 'SELECT 1':
+                statements.append(statement)
+
+        engine = self.db_api.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(event.remove, engine, 'before_cursor_execute',
+                        before_cursor_execute)
+        found = self.db_api.metadef_namespace_get_details(self.context, name)
+
+        # One query for the namespace and one for each kind of children
+        self.assertEqual(5, len(statements))
+        self.assertEqual(3, len(found['objects']))
+        self.assertEqual(3, len(found['properties']))
+        self.assertEqual(3, len(found['tags']))
+
+
+class TestMetadefLoad(base_metadef.TestMetadefDriver):
+
+    def setUp(self):
+        db_tests.load(get_db, reset_db_metadef)
+        super(TestMetadefLoad, self).setUp()
+        self.addCleanup(db_tests.reset)
+        self.namespace = {
+            'namespace': 'OS::Test',
+            'display_name': 'Test',
+            'visibility': 'public',
+            'protected': True,
+            'resource_type_associations': [{'name': 'OS::Glance::Image',
+                                            'prefix': 'test_'}],
+            'properties': {'property1': {'type': 'string'},
+                           'property2': {'type': 'integer'}},
+            'objects': [{'name': 'object1',
+                         'properties': {'property3': {'type': 'string'}}}],
+            'tags': [{'name': 'tag1'}, {'name': 'tag2'}],
+        }
+
+    def _load(self, **kwargs):
+        path = os.path.join(self.test_dir, 'test.json')
+        with open(path, 'w') as json_file:
+            json.dump(self.namespace, json_file)
+        metadata.db_load_metadefs(self.db_api.get_engine(), path, **kwargs)
+
+    def _get_details(self):
+        details = self.db_api.metadef_namespace_get_details(
+            self.adm_context, self.namespace['namespace'])
+        details['objects'] = {o['name']: o for o in details['objects']}
+        details['properties'] = {p['name']: p for p in details['properties']}
+        details['tags'] = set(t['name'] for t in details['tags'])
+        return details
+
+    def test_load(self):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            if statement.startswith('INSERT'):
+                statements.append(statement)
+
+        engine = self.db_api.get_engine()
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        self.addCleanup(event.remove, engine, 'before_cursor_execute',
+                        before_cursor_execute)
+        self._load()
+
+        # One insert for the namespace, and one for each kind of rows
+        self.assertEqual(6, len(statements))
+        details = self._get_details()
+        self.assertEqual('Test', details['display_name'])
+        self.assertEqual(['OS::Glance::Image'],
+                         [rt['name'] for rt in
+                          details['resource_type_associations']])
+        self.assertEqual(set(['property1', 'property2']),
+                         set(details['properties']))
+        self.assertEqual(set(['object1']), set(details['objects']))
+        self.assertEqual(set(['tag1', 'tag2']), details['tags'])
+
+    def test_load_existing(self):
+        self._load()
+        self.namespace['display_name'] = 'New'
+        self.namespace['tags'].append({'name': 'tag3'})
+        self._load()
+
+        details = self._get_details()
+        self.assertEqual('Test', details['display_name'])
+        self.assertEqual(set(['tag1', 'tag2']), details['tags'])
+
+    def test_load_merge(self):
+        self._load()
+        self.namespace['properties']['property1'] = {'type': 'boolean'}
+        self.namespace['objects'].append({'name': 'object2'})
+        self.namespace['tags'] = [{'name': 'tag3'}]
+        self._load(merge=True)
+
+        details = self._get_details()
+        self.assertEqual({'type': 'string'},
+                         details['properties']['property1']['json_schema'])
+        self.assertEqual(set(['object1', 'object2']), set(details['objects']))
+        self.assertEqual(set(['tag1', 'tag2', 'tag3']), details['tags'])
+
+    def test_load_merge_prefer_new(self):
+        self._load()
+        self.namespace['display_name'] = 'New'
+        self.namespace['resource_type_associations'][0]['prefix'] = 'new_'
+        self.namespace['properties']['property1'] = {'type': 'boolean'}
+        self.namespace['objects'][0]['description'] = 'New'
+        self._load(merge=True, prefer_new=True)
+
+        details = self._get_details()
+        self.assertEqual('New', details['display_name'])
+        self.assertEqual('new_',
+                         details['resource_type_associations'][0]['prefix'])
+        self.assertEqual({'type': 'boolean'},
+                         details['properties']['property1']['json_schema'])
+        self.assertEqual({'type': 'integer'},
+                         details['properties']['property2']['json_schema'])
+        self.assertEqual('New', details['objects']['object1']['description'])
+        self.assertEqual(set(['tag1', 'tag2']), details['tags'])
+
+    def test_load_merge_overwrite(self):
+        self._load()
+        del self.namespace['properties']['property2']
+        self.namespace['tags'] = [{'name': 'tag3'}]
+        self._load(merge=True, overwrite=True)
+
+        details = self._get_details()
+        self.assertEqual(set(['property1']), set(details['properties']))
+        self.assertEqual(set(['tag3']), details['tags'])
+
+    def test_load_failure_rolled_back(self):
+        self.namespace['objects'].append({'name': None})
+        self._load()
+
+        self.assertRaises(exception.NotFound,
+                          self.db_api.metadef_namespace_get,
+                          self.adm_context, self.namespace['namespace'])
+        self.assertEqual([], self.db_api.metadef_resource_type_get_all(
+            self.adm_context))
@@ -78,6 +78,12 @@ class TestImportTask(test_utils.BaseTestCase):
                     group='taskflow_executor')
         glance_store.create_stores(CONF)
 
+    def _fake_popen(self, output, returncode=0):
+        process = mock.Mock()
+        process.stdout = six.BytesIO(output)
+        process.wait.return_value = returncode
+        return process
+
     def test_convert_success(self):
         image_convert = convert._Convert(self.task.task_id,
                                          self.task_type,
@@ -88,11 +94,103 @@ class TestImportTask(test_utils.BaseTestCase):
         image = mock.MagicMock(image_id=image_id, virtual_size=None)
         self.img_repo.get.return_value = image
 
+        with mock.patch.object(image_convert, '_get_format',
+                               return_value='raw'):
+            with mock.patch.object(convert.subprocess, 'Popen') as popen:
+                popen.return_value = self._fake_popen(b'')
+                with mock.patch.object(os, 'rename') as rm_mock:
+                    rm_mock.return_value = None
+                    image_convert.execute(image, 'file:///test/path.raw')
+
+        dest_path = os.path.join(self.work_dir, '%s.converted' % image)
+        self.assertEqual(['qemu-img', 'convert', '-p', '-O', 'qcow2',
+                          '/test/path.raw', dest_path],
+                         popen.call_args[0][0])
+        rm_mock.assert_called_once_with(dest_path, '/test/path.raw')
+
+    def test_convert_parallel(self):
+        self.config(conversion_workers=8, group='taskflow_executor')
+        image_convert = convert._Convert(self.task.task_id,
+                                         self.task_type,
+                                         self.img_repo)
+
+        with mock.patch.object(image_convert, '_get_format',
+                               return_value='raw'):
+            with mock.patch.object(convert.subprocess, 'Popen') as popen:
+                popen.return_value = self._fake_popen(b'')
+                with mock.patch.object(os, 'rename'):
+                    image_convert.execute(UUID1, 'file:///test/path.raw')
+
+        cmd = popen.call_args[0][0]
+        self.assertEqual(['-m', '8', '-W'], cmd[5:8])
+
+    def test_convert_skipped_when_in_target_format(self):
+        image_convert = convert._Convert(self.task.task_id,
+                                         self.task_type,
+                                         self.img_repo)
+
+        with mock.patch.object(image_convert, '_get_format',
+                               return_value='qcow2'):
+            with mock.patch.object(convert.subprocess, 'Popen') as popen:
+                self.assertIsNone(
+                    image_convert.execute(UUID1, 'file:///test/path.qcow2'))
+                self.assertFalse(popen.called)
+
+    def test_get_format_from_header(self):
+        image_convert = convert._Convert(self.task.task_id,
+                                         self.task_type,
+                                         self.img_repo)
+        path = os.path.join(self.work_dir, UUID1)
+        with open(path, 'wb') as image_file:
+            image_file.write(b'QFI\xfb' + b'\x00' * 508)
+
         with mock.patch.object(processutils, 'execute') as exc_mock:
-            exc_mock.return_value = ("", None)
-            with mock.patch.object(os, 'rename') as rm_mock:
-                rm_mock.return_value = None
-                image_convert.execute(image, 'file:///test/path.raw')
+            self.assertEqual('qcow2', image_convert._get_format(path))
+            self.assertFalse(exc_mock.called)
+
+    def test_convert_progress(self):
+        image_convert = convert._Convert(self.task.task_id,
+                                         self.task_type,
+                                         self.img_repo,
+                                         self.task_repo)
+        self.task_repo.get.return_value = self.task
+        messages = []
+        self.task_repo.save.side_effect = (
+            lambda task: messages.append(task.message))
+
+        output = b'    (0.00/100%)\r    (50.00/100%)\r    (100.00/100%)\r\n'
+        with mock.patch.object(image_convert, '_get_format',
+                               return_value='raw'):
+            with mock.patch.object(convert.subprocess, 'Popen') as popen:
+                popen.return_value = self._fake_popen(output)
+                with mock.patch.object(convert, 'time') as time_mock:
+                    time_mock.time.side_effect = [10, 12, 16]
+                    with mock.patch.object(os, 'rename'):
+                        image_convert.execute(UUID1,
+                                              'file:///test/path.raw')
+
+        self.assertEqual(['Converting image to qcow2: 0.00%',
+                          'Converting image to qcow2: 100.00%',
+                          'Image converted to qcow2'], messages)
+        self.assertIsInstance(messages[0], six.text_type)
+
+    def test_convert_failure(self):
+        image_convert = convert._Convert(self.task.task_id,
+                                         self.task_type,
+                                         self.img_repo)
+
+        with mock.patch.object(image_convert, '_get_format',
+                               return_value='raw'):
+            with mock.patch.object(convert.subprocess, 'Popen') as popen:
+                popen.return_value = self._fake_popen(
+                    b'    (0.00/100%)\rqemu-img: Could not open\n', 1)
+                with mock.patch.object(os, 'rename') as rm_mock:
+                    exc = self.assertRaises(RuntimeError,
+                                            image_convert.execute, UUID1,
+                                            'file:///test/path.raw')
+                    self.assertFalse(rm_mock.called)
+
+        self.assertEqual(u'qemu-img: Could not open', exc.args[0])
 
     def test_convert_revert_success(self):
         image_convert = convert._Convert(self.task.task_id,
@@ -16,6 +16,7 @@
 import json
 import mock
 import os
+import struct
 
 import glance_store
 from oslo_concurrency import processutils as putils
@@ -394,6 +395,114 @@ class TestImportTask(test_utils.BaseTestCase):
                 tmp_image_path = os.path.join(self.work_dir, image_path)
                 self.assertTrue(os.path.exists(tmp_image_path))
 
+    def test_import_to_store_local_file(self):
+        import_store = import_flow._ImportToStore(self.task.task_id,
+                                                  self.task_type,
+                                                  self.img_repo,
+                                                  'http://example.com/x')
+        image = mock.MagicMock(image_id=UUID1)
+        self.img_repo.get.return_value = image
+
+        with mock.patch.object(image_import, 'set_image_data') as smock:
+            import_store.execute(UUID1, 'file:///tmp/work/%s' % UUID1)
+            smock.assert_called_once_with(image,
+                                          'file:///tmp/work/%s' % UUID1,
+                                          self.task.task_id, linkable=True)
+
+            smock.reset_mock()
+            import_store.execute(UUID1)
+            smock.assert_called_once_with(image, 'http://example.com/x',
+                                          self.task.task_id)
+
+    def _qcow2_header(self, backing_offset=0):
+        header = bytearray(512)
+        struct.pack_into('>4sIQ', header, 0, b'QFI\xfb', 2, backing_offset)
+        struct.pack_into('>Q', header, 24, 1024)
+        return bytes(header)
+
+    def test_stream_to_store(self):
+        stream_store = import_flow._StreamToStore(self.task.task_id,
+                                                  self.task_type,
+                                                  self.img_repo,
+                                                  'http://example.com/x')
+        content = self._qcow2_header() + b'data'
+        image = mock.MagicMock(image_id=UUID1)
+        self.img_repo.get.return_value = image
+
+        with mock.patch.object(script_utils, 'get_image_data_iter') as dmock:
+            dmock.return_value = six.BytesIO(content)
+            with mock.patch.object(putils, 'trycmd') as tmock:
+                image.set_data.side_effect = (
+                    lambda data, size=None: self.assertEqual(
+                        content, b''.join(data)))
+                stream_store.execute(UUID1)
+                self.assertFalse(tmock.called)
+
+        self.assertEqual('qcow2', image.disk_format)
+        self.assertEqual(1024, image.virtual_size)
+        self.assertEqual('saving', image.status)
+        self.assertEqual(1, image.set_data.call_count)
+        self.assertEqual(2, self.img_repo.save.call_count)
+
+    def test_stream_to_store_backing_file(self):
+        stream_store = import_flow._StreamToStore(self.task.task_id,
+                                                  self.task_type,
+                                                  self.img_repo,
+                                                  'http://example.com/x')
+        content = self._qcow2_header(backing_offset=512) + b'data'
+
+        with mock.patch.object(script_utils, 'get_image_data_iter') as dmock:
+            dmock.return_value = six.BytesIO(content)
+            self.assertRaises(RuntimeError, stream_store.execute, UUID1)
+
+        self.assertFalse(self.img_repo.save.called)
+
+    def test_stream_to_store_unknown_format(self):
+        stream_store = import_flow._StreamToStore(self.task.task_id,
+                                                  self.task_type,
+                                                  self.img_repo,
+                                                  'http://example.com/x')
+        image = mock.MagicMock(image_id=UUID1)
+        self.img_repo.get.return_value = image
+        scratch_path = os.path.join(self.work_dir,
+                                    '%s.tasks_import' % UUID1)
+
+        def fake_set_data(data, size=None):
+            self.assertEqual(scratch_path, data.path)
+            self.assertEqual(b'rawdata', data.read())
+
+        with mock.patch.object(script_utils, 'get_image_data_iter') as dmock:
+            dmock.return_value = six.BytesIO(b'rawdata')
+            with mock.patch.object(putils, 'trycmd') as tmock:
+                tmock.return_value = (json.dumps({
+                    'format': 'raw', 'virtual-size': 7}), None)
+                image.set_data.side_effect = fake_set_data
+                stream_store.execute(UUID1)
+                tmock.assert_called_once_with(
+                    'qemu-img', 'info', '--output=json', scratch_path,
+                    log_errors=putils.LOG_ALL_ERRORS)
+
+        self.assertEqual('raw', image.disk_format)
+        self.assertEqual(7, image.virtual_size)
+        self.assertEqual(1, image.set_data.call_count)
+        self.assertFalse(os.path.exists(scratch_path))
+
+    def test_get_flow_streaming_import(self):
+        self.config(streaming_import=True, group='taskflow_executor')
+        flow = import_flow.get_flow(task_id=self.task.task_id,
+                                    task_type=self.task_type,
+                                    task_repo=self.task_repo,
+                                    image_repo=self.img_repo,
+                                    image_factory=self.img_factory,
+                                    uri='http://example.com/x')
+
+        names = [t.name for t in flow]
+        self.assertEqual(
+            ['%s-%s-%s' % (self.task_type, name, self.task.task_id)
+             for name in ('CreateImage', 'StreamToStore', 'SaveImage',
+                          'CompleteTask')],
+            names)
+
     def test_delete_from_fs(self):
         delete_fs = import_flow._DeleteFromFS(self.task.task_id,
                                               self.task_type)
@@ -0,0 +1,141 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import fixtures
+import mock
+from oslo_utils import timeutils
+
+from glance.async import queued_executor
+from glance.async import worker
+import glance.tests.utils as test_utils
+
+
+TENANT1 = '6838eb7b-6ded-434a-882c-b344c77fe8df'
+
+
+class TestQueuedTaskExecutor(test_utils.BaseTestCase):
+
+    def test_begin_processing_leaves_task_pending(self):
+        task_repo = mock.Mock()
+        executor = queued_executor.TaskExecutor(mock.Mock(), task_repo,
+                                                mock.Mock(), mock.Mock())
+        executor.begin_processing('fake-task-id')
+
+        self.assertFalse(task_repo.get.called)
+        self.assertFalse(task_repo.save.called)
+
+
+class TestTaskWorker(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestTaskWorker, self).setUp()
+        self.db_api = mock.Mock()
+        self.db_api.task_claim.return_value = True
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.db.get_api', lambda: self.db_api))
+
+    def _tasks(self, *types):
+        return [{'id': 'task-%d' % i, 'type': task_type, 'owner': TENANT1}
+                for i, task_type in enumerate(types)]
+
+    def _queue(self, pending, processing=()):
+        def task_get_all(context, filters, **kwargs):
+            if filters['status'] == 'processing':
+                return list(processing)
+            return list(pending)
+        self.db_api.task_get_all.side_effect = task_get_all
+
+    def _worker(self):
+        task_worker = worker.TaskWorker(mock.Mock())
+        task_worker.pool = mock.Mock()
+        return task_worker
+
+    def test_poll_claims_oldest_pending_tasks(self):
+        self.config(max_tasks=2, group='task_worker')
+        self._queue(self._tasks('import', 'import', 'import'))
+        task_worker = self._worker()
+
+        self.assertEqual(2, task_worker.poll())
+        self.db_api.task_get_all.assert_called_with(
+            task_worker.admin_context, filters={'status': 'pending'},
+            sort_key='created_at', sort_dir='asc', limit=4)
+        self.assertEqual(2, task_worker.pool.spawn_n.call_count)
+        self.assertEqual(2, task_worker.running['import'])
+
+    def test_poll_respects_task_type_limits(self):
+        self.config(max_tasks=4, task_type_limits={'import': '1'},
+                    group='task_worker')
+        self._queue(self._tasks('import', 'import', 'convert'))
+        task_worker = self._worker()
+
+        self.assertEqual(2, task_worker.poll())
+        started = [c[0][2] for c in task_worker.pool.spawn_n.call_args_list]
+        self.assertEqual(['import', 'convert'], started)
+
+    def test_poll_skips_tasks_claimed_elsewhere(self):
+        self.config(max_tasks=4, group='task_worker')
+        self._queue(self._tasks('import', 'import'))
+        self.db_api.task_claim.side_effect = [False, True]
+        task_worker = self._worker()
+
+        self.assertEqual(1, task_worker.poll())
+        task_worker.pool.spawn_n.assert_called_once_with(
+            task_worker._run_task, 'task-1', 'import', TENANT1)
+
+    def test_poll_reclaims_stale_tasks(self):
+        self.config(max_tasks=2, claim_timeout=60, group='task_worker')
+        now = timeutils.utcnow()
+        stale, fresh = self._tasks('import', 'import')
+        stale['updated_at'] = now - datetime.timedelta(seconds=120)
+        fresh['updated_at'] = now
+        self._queue([], processing=[stale, fresh])
+        task_worker = self._worker()
+
+        with mock.patch.object(worker.timeutils, 'utcnow', return_value=now):
+            self.assertEqual(1, task_worker.poll())
+        stale_before = now - datetime.timedelta(seconds=60)
+        self.db_api.task_claim.assert_called_once_with(
+            task_worker.admin_context, 'task-0', stale_before=stale_before)
+        task_worker.pool.spawn_n.assert_called_once_with(
+            task_worker._run_task, 'task-0', 'import', TENANT1)
+
+    def test_poll_renews_running_claims(self):
+        self.config(max_tasks=1, group='task_worker')
+        task_worker = self._worker()
+        task_worker.running['import'] = 1
+        task_worker.running_ids.add('task-0')
+
+        self.assertEqual(0, task_worker.poll())
+        self.db_api.task_claim_renew.assert_called_once_with(
+            task_worker.admin_context, ['task-0'])
+
+    def test_poll_when_full(self):
+        self.config(max_tasks=1, group='task_worker')
+        task_worker = self._worker()
+        task_worker.running['import'] = 1
+
+        self.assertEqual(0, task_worker.poll())
+        self.assertFalse(self.db_api.task_get_all.called)
+
+    def test_run_task_releases_slot_on_failure(self):
+        task_worker = self._worker()
+        task_worker.running['import'] = 1
+        task_worker.running_ids.add('task-0')
+        with mock.patch.object(worker.taskflow_executor,
+                               'TaskExecutor') as executor_cls:
+            executor_cls.return_value._run.side_effect = RuntimeError
+            task_worker._run_task('task-0', 'import', TENANT1)
+
+        self.assertEqual(0, task_worker.running['import'])
+        self.assertEqual(set(), task_worker.running_ids)
@@ -135,3 +135,105 @@ class TestScriptsUtils(test_utils.BaseTestCase):
         location = 'cinder://'
         self.assertRaises(urllib.error.URLError,
                           script_utils.validate_location_uri, location)
+
+
+class FakeRangeServer(object):
+    """Answers urlopen calls with slices of `data`."""
+
+    def __init__(self, data, failures=0):
+        self.data = data
+        self.failures = failures
+        self.ranges = []
+
+    def urlopen(self, request):
+        start, end = request.get_header('Range')[6:].split('-')
+        self.ranges.append((int(start), int(end)))
+        if self.failures:
+            self.failures -= 1
+            raise IOError('connection reset')
+        response = mock.Mock()
+        response.getcode.return_value = 206
+        response.read.return_value = self.data[int(start):int(end) + 1]
+        return response
+
+
+class TestRangedHTTPReader(test_utils.BaseTestCase):
+
+    def _reader(self, server, **kwargs):
+        kwargs.setdefault('concurrency', 3)
+        kwargs.setdefault('range_size', 4)
+        return script_utils.RangedHTTPReader('http://example.com/image',
+                                             len(server.data), **kwargs)
+
+    def test_iter_reassembles_ranges_in_order(self):
+        server = FakeRangeServer(b'0123456789abcdefghi')
+        with mock.patch.object(urllib.request, 'urlopen', server.urlopen):
+            chunks = list(self._reader(server))
+
+        self.assertEqual([b'0123', b'4567', b'89ab', b'cdef', b'ghi'],
+                         chunks)
+        self.assertEqual([(0, 3), (4, 7), (8, 11), (12, 15), (16, 18)],
+                         sorted(server.ranges))
+
+    def test_read(self):
+        server = FakeRangeServer(b'0123456789')
+        with mock.patch.object(urllib.request, 'urlopen', server.urlopen):
+            reader = self._reader(server)
+            self.assertEqual(b'012345', reader.read(6))
+            self.assertEqual(b'67', reader.read())
+            self.assertEqual(b'89', reader.read(100))
+            self.assertEqual(b'', reader.read(1))
+
+    def test_retry_failed_range(self):
+        server = FakeRangeServer(b'0123456789', failures=2)
+        with mock.patch.object(urllib.request, 'urlopen', server.urlopen):
+            data = b''.join(self._reader(server, concurrency=1, retries=2))
+
+        self.assertEqual(b'0123456789', data)
+
+    def test_retries_exhausted(self):
+        server = FakeRangeServer(b'0123456789', failures=2)
+        with mock.patch.object(urllib.request, 'urlopen', server.urlopen):
+            reader = self._reader(server, concurrency=1, retries=1)
+            self.assertRaises(IOError, list, reader)
+
+    def test_range_not_honoured(self):
+        server = FakeRangeServer(b'0123456789')
+        response = mock.Mock()
+        response.getcode.return_value = 200
+        with mock.patch.object(urllib.request, 'urlopen',
+                               return_value=response):
+            self.assertRaises(IOError, list, self._reader(server))
+
+    def _get_image_data_iter(self, headers):
+        response = mock.Mock()
+        response.info.return_value = headers
+        with mock.patch.object(urllib.request, 'urlopen',
+                               return_value=response):
+            return response, script_utils.get_image_data_iter(
+                'http://example.com/image')
+
+    def test_get_image_data_iter_ranged(self):
+        self.config(import_range_requests=4, import_range_size=10,
+                    group='task')
+        response, data = self._get_image_data_iter(
+            {'Accept-Ranges': 'bytes', 'Content-Length': '100'})
+
+        self.assertIsInstance(data, script_utils.RangedHTTPReader)
+        self.assertEqual(100, data.size)
+        self.assertEqual(4, data.concurrency)
+        self.assertTrue(response.close.called)
+
+    def test_get_image_data_iter_ranges_not_supported(self):
+        self.config(import_range_requests=4, import_range_size=10,
+                    group='task')
+        response, data = self._get_image_data_iter(
+            {'Content-Length': '100'})
+        self.assertIs(response, data)
+
+    def test_get_image_data_iter_small_image(self):
+        self.config(import_range_requests=4, import_range_size=10,
+                    group='task')
+        response, data = self._get_image_data_iter(
+            {'Accept-Ranges': 'bytes', 'Content-Length': '10'})
+        self.assertIs(response, data)
@@ -0,0 +1,90 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import struct
+
+from glance.common import format_inspector
+from glance.tests import utils as test_utils
+
+
+GiB = 1024 ** 3
+
+
+def _header(size=512):
+    return bytearray(size)
+
+
+def _qcow2(virtual_size, backing_offset=0, version=2, incompatible=0):
+    header = _header()
+    struct.pack_into('>4sIQ', header, 0, b'QFI\xfb', version, backing_offset)
+    struct.pack_into('>Q', header, 24, virtual_size)
+    struct.pack_into('>Q', header, 72, incompatible)
+    return bytes(header)
+
+
+class TestFormatInspector(test_utils.BaseTestCase):
+
+    def test_qcow2(self):
+        info = format_inspector.inspect(_qcow2(10 * GiB))
+        self.assertEqual({'format': 'qcow2', 'virtual-size': 10 * GiB,
+                          'backing-file': False}, info)
+
+    def test_qcow2_backing_file(self):
+        info = format_inspector.inspect(_qcow2(GiB, backing_offset=512))
+        self.assertTrue(info['backing-file'])
+
+    def test_qcow2_external_data_file(self):
+        info = format_inspector.inspect(_qcow2(GiB, version=3,
+                                               incompatible=1 << 2))
+        self.assertTrue(info['backing-file'])
+
+    def test_vhd(self):
+        header = _header()
+        struct.pack_into('>8s', header, 0, b'conectix')
+        struct.pack_into('>Q', header, 48, 2 * GiB)
+        struct.pack_into('>I', header, 60, 3)
+        info = format_inspector.inspect(bytes(header))
+        self.assertEqual({'format': 'vhd', 'virtual-size': 2 * GiB,
+                          'backing-file': False}, info)
+
+    def test_vhd_differencing(self):
+        header = _header()
+        struct.pack_into('>8s', header, 0, b'conectix')
+        struct.pack_into('>Q', header, 48, 2 * GiB)
+        struct.pack_into('>I', header, 60, 4)
+        self.assertTrue(format_inspector.inspect(bytes(header))
+                        ['backing-file'])
+
+    def test_vdi(self):
+        header = _header()
+        struct.pack_into('<I', header, 0x40, 0xbeda107f)
+        struct.pack_into('<I', header, 0x4c, 1)
+        struct.pack_into('<Q', header, 0x170, 3 * GiB)
+        info = format_inspector.inspect(bytes(header))
+        self.assertEqual({'format': 'vdi', 'virtual-size': 3 * GiB,
+                          'backing-file': False}, info)
+
+    def test_iso(self):
+        header = _header(format_inspector.HEADER_SIZE)
+        struct.pack_into('<B5s', header, 0x8000, 1, b'CD001')
+        struct.pack_into('<I', header, 0x8050, 1000)
+        struct.pack_into('<H', header, 0x8080, 2048)
+        info = format_inspector.inspect(bytes(header))
+        self.assertEqual({'format': 'iso', 'virtual-size': 2048000,
+                          'backing-file': False}, info)
+
+    def test_unknown(self):
+        self.assertIsNone(format_inspector.inspect(b'\x00' * 512))
+
+    def test_short_header(self):
+        self.assertIsNone(format_inspector.inspect(b'QFI\xfb'))
+        self.assertIsNone(format_inspector.inspect(b''))
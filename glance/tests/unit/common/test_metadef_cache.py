@@ -0,0 +1,80 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import mock
+from oslo_utils import timeutils
+
+from glance.common import metadef_cache
+import glance.context
+from glance.tests import utils as test_utils
+
+
+class TestMetadefCache(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(TestMetadefCache, self).setUp()
+        self.config(metadef_catalog_cache_ttl=60)
+        self.addCleanup(metadef_cache.invalidate)
+        context = glance.context.RequestContext(tenant='fake',
+                                                roles=['member'])
+        self.key = metadef_cache.make_key('namespaces', context,
+                                          filters={'visibility': 'public'})
+
+    def test_disabled(self):
+        self.config(metadef_catalog_cache_ttl=0)
+        metadef_cache.store(self.key, ['ns'], metadef_cache.get_version())
+        self.assertIsNone(metadef_cache.get(self.key))
+
+    def test_store_get(self):
+        metadef_cache.store(self.key, ['ns'], metadef_cache.get_version())
+        self.assertEqual(['ns'], metadef_cache.get(self.key))
+
+    def test_make_key_per_caller(self):
+        context = glance.context.RequestContext(tenant='fake',
+                                                roles=['admin'])
+        key = metadef_cache.make_key('namespaces', context,
+                                     filters={'visibility': 'public'})
+        self.assertNotEqual(self.key, key)
+
+    def test_invalidate(self):
+        metadef_cache.store(self.key, ['ns'], metadef_cache.get_version())
+        metadef_cache.invalidate()
+        self.assertIsNone(metadef_cache.get(self.key))
+
+    def test_store_outdated(self):
+        version = metadef_cache.get_version()
+        metadef_cache.invalidate()
+        metadef_cache.store(self.key, ['ns'], version)
+        self.assertIsNone(metadef_cache.get(self.key))
+
+    @mock.patch.object(timeutils, 'utcnow')
+    def test_expired(self, mock_utcnow):
+        now = datetime.datetime(2016, 1, 1)
+        mock_utcnow.return_value = now
+        metadef_cache.store(self.key, ['ns'], metadef_cache.get_version())
+        mock_utcnow.return_value = now + datetime.timedelta(seconds=59)
+        self.assertEqual(['ns'], metadef_cache.get(self.key))
+        mock_utcnow.return_value = now + datetime.timedelta(seconds=60)
+        self.assertIsNone(metadef_cache.get(self.key))
+
+    def test_size(self):
+        self.config(metadef_catalog_cache_size=1)
+        version = metadef_cache.get_version()
+        metadef_cache.store(self.key, ['ns'], version)
+        metadef_cache.store('other', ['other'], version)
+        self.assertIsNone(metadef_cache.get(self.key))
+        self.assertEqual(['other'], metadef_cache.get('other'))
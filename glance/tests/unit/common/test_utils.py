@@ -17,6 +17,7 @@
 import os
 import tempfile
 
+import mock
 import six
 import webob
 
@@ -409,6 +410,120 @@ class TestUtils(test_utils.BaseTestCase):
                               pair)
 
 
+class ChunkSizeTestCase(test_utils.BaseTestCase):
+
+    def test_chunkiter_grows(self):
+        data = six.BytesIO(b'*' * 300)
+        sizes = [len(chunk) for chunk in utils.chunkiter(data, 10, 40)]
+        self.assertEqual([10] * 4 + [20] * 4 + [40] * 4 + [20], sizes)
+
+    def test_chunkiter_fixed_size(self):
+        data = six.BytesIO(b'*' * 100)
+        sizes = [len(chunk) for chunk in utils.chunkiter(data, 10)]
+        self.assertEqual([10] * 10, sizes)
+
+    def test_chunkiter_defaults(self):
+        self.config(image_chunk_size=4096, max_image_chunk_size=8192)
+        data = six.BytesIO(b'*' * 40960)
+        sizes = [len(chunk) for chunk in utils.chunkiter(data)]
+        self.assertEqual([4096] * 4 + [8192] * 3, sizes)
+
+
+class StreamingIteratorTestCase(test_utils.BaseTestCase):
+
+    def test_hooks(self):
+        calls = []
+        stream = utils.StreamingIterator(iter([b'ab', b'cde']))
+        stream.add_hooks(chunk=calls.append,
+                         end=lambda sent: calls.append(('end', sent)))
+        stream.add_hooks(end=lambda sent: calls.append(('end2', sent)))
+
+        self.assertEqual([b'ab', b'cde'], list(stream))
+        self.assertEqual([b'ab', b'cde', ('end', 5), ('end2', 5)], calls)
+        self.assertEqual(5, stream.bytes_sent)
+
+    def test_next(self):
+        stream = utils.StreamingIterator(iter([b'ab']))
+        self.assertEqual(b'ab', next(stream))
+        self.assertRaises(StopIteration, next, stream)
+        self.assertRaises(RuntimeError, stream.add_hooks, chunk=len)
+
+    def test_error_hooks(self):
+        errors = []
+
+        def data():
+            yield b'ab'
+            raise IOError()
+
+        stream = utils.StreamingIterator(data())
+        stream.add_hooks(end=self.fail,
+                         error=lambda exc_info: errors.append(exc_info[0]))
+        self.assertRaises(IOError, list, stream)
+        self.assertEqual([IOError], errors)
+
+    def test_error_hooks_on_close(self):
+        errors = []
+        stream = utils.StreamingIterator(iter([b'ab', b'cd']))
+        stream.add_hooks(error=lambda exc_info: errors.append(exc_info[0]))
+        next(stream)
+        stream.close()
+        self.assertEqual([GeneratorExit], errors)
+
+    def test_streaming_iter(self):
+        stream = utils.streaming_iter([b'ab'])
+        self.assertIsInstance(stream, utils.StreamingIterator)
+        self.assertIs(stream, utils.streaming_iter(stream))
+
+    @mock.patch.object(utils, 'sleep')
+    def test_cooperative(self, mock_sleep):
+        list(utils.StreamingIterator(iter([b'ab', b'cd'])))
+        self.assertFalse(mock_sleep.called)
+        list(utils.StreamingIterator(iter([b'ab', b'cd']), cooperative=True))
+        self.assertEqual(2, mock_sleep.call_count)
+
+
+class OffloadTestCase(test_utils.BaseTestCase):
+
+    def test_offload_iter(self):
+        for offload in (False, True):
+            self.config(offload_data_processing=offload)
+            processed = []
+            data = [b'a', b'b', b'c', b'd', b'e', b'f']
+            self.assertEqual(data,
+                             list(utils.offload_iter(iter(data),
+                                                     processed.append)))
+            self.assertEqual(data, processed)
+
+    def test_offload_iter_error(self):
+        def process(chunk):
+            if chunk == b'c':
+                raise IOError()
+
+        for offload in (False, True):
+            self.config(offload_data_processing=offload)
+            data = iter([b'a', b'b', b'c', b'd', b'e', b'f'])
+            chunks = []
+
+            def consume():
+                for chunk in utils.offload_iter(data, process):
+                    chunks.append(chunk)
+
+            self.assertRaises(IOError, consume)
+            # NOTE: Every chunk taken from the iterator is yielded
+            self.assertEqual(chunks, [b'a', b'b', b'c', b'd', b'e',
+                                      b'f'][:len(chunks)])
+            self.assertEqual(list(data), [b'a', b'b', b'c', b'd', b'e',
+                                          b'f'][len(chunks):])
+
+    @mock.patch('eventlet.tpool.execute')
+    def test_offload(self, mock_execute):
+        self.assertEqual(3, utils.offload(len, 'abc'))
+        self.assertFalse(mock_execute.called)
+        self.config(offload_data_processing=True)
+        utils.offload(len, 'abc')
+        mock_execute.assert_called_once_with(len, 'abc')
+
+
 class SplitFilterOpTestCase(test_utils.BaseTestCase):
 
     def test_less_than_operator(self):
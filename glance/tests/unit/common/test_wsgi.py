@@ -19,7 +19,9 @@ import gettext
 import socket
 
 from babel import localedata
+import eventlet
 import eventlet.patcher
+import eventlet.wsgi
 import fixtures
 import mock
 from oslo_serialization import jsonutils
@@ -528,7 +530,117 @@ class ServerTest(test_utils.BaseTestCase):
                                                 debug=False,
                                                 custom_pool=server.pool,
                                                 keepalive=False,
-                                                socket_timeout=900)
+                                                socket_timeout=900,
+                                                protocol=wsgi.HttpProtocol,
+                                                max_http_version='HTTP/1.1')
+
+    def test_create_pool_worker_greenthreads(self):
+        self.config(worker_greenthreads=10)
+        actual = wsgi.Server(threads=1000).create_pool()
+        self.assertEqual(10, actual.size)
+
+    def test_get_child_cpu(self):
+        self.config(worker_cpu_affinity=True)
+        server = wsgi.Server(threads=1)
+        server.children = set([10, 11])
+        server.children_cpus = {10: 0, 11: 2}
+        with mock.patch.object(wsgi.multiprocessing, 'cpu_count',
+                               return_value=4):
+            self.assertEqual(1, server._get_child_cpu())
+
+            server.children.add(12)
+            server.children_cpus.update({12: 1, 13: 3})
+            # NOTE: pid 13 is a stale child, its CPU can be reused
+            self.assertEqual(3, server._get_child_cpu())
+
+    def test_get_child_cpu_disabled(self):
+        server = wsgi.Server(threads=1)
+        self.assertIsNone(server._get_child_cpu())
+
+    @mock.patch.object(wsgi, 'set_cpu_affinity')
+    @mock.patch.object(wsgi.os, 'fork', return_value=42)
+    def test_run_child_records_cpu(self, mock_fork, mock_affinity):
+        self.config(worker_cpu_affinity=True)
+        server = wsgi.Server(threads=1)
+        with mock.patch.object(wsgi.multiprocessing, 'cpu_count',
+                               return_value=4):
+            server.run_child()
+
+        self.assertEqual(set([42]), server.children)
+        self.assertEqual({42: 0}, server.children_cpus)
+        # NOTE: Only the child process pins itself
+        self.assertFalse(mock_affinity.called)
+
+        server._remove_children(42)
+        self.assertEqual({}, server.children_cpus)
+
+
+class HttpProtocolTest(test_utils.BaseTestCase):
+
+    def setUp(self):
+        super(HttpProtocolTest, self).setUp()
+        self.sock = eventlet.listen(('127.0.0.1', 0))
+        self.addCleanup(self.sock.close)
+
+    def _start(self):
+        def app(environ, start_response):
+            start_response('200 OK', [])
+            return iter([b'a', b'b'])
+
+        server = eventlet.spawn(eventlet.wsgi.server, self.sock, app,
+                                protocol=wsgi.HttpProtocol,
+                                max_http_version=wsgi.CONF.http_version,
+                                log=mock.Mock())
+        self.addCleanup(server.kill)
+
+    def _request(self, count, version='HTTP/1.1'):
+        client = eventlet.connect(self.sock.getsockname())
+        self.addCleanup(client.close)
+        request = 'GET / %s\r\nHost: localhost\r\n\r\n' % version
+        client.sendall(six.b(request * count))
+        responses = []
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            responses.append(data)
+        return b''.join(responses)
+
+    def test_chunked_keepalive(self):
+        self._start()
+        client = eventlet.connect(self.sock.getsockname())
+        self.addCleanup(client.close)
+        client.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = client.recv(65536)
+        self.assertTrue(response.startswith(b'HTTP/1.1 200 OK'))
+        self.assertIn(b'Transfer-Encoding: chunked', response)
+        self.assertNotIn(b'Connection: close', response)
+
+    def test_http_1_0_mode(self):
+        self.config(http_version='HTTP/1.0')
+        self._start()
+        response = self._request(2)
+        self.assertEqual(1, response.count(b'HTTP/1.0 200 OK'))
+        self.assertNotIn(b'chunked', response)
+        self.assertTrue(response.endswith(b'ab'))
+
+    def test_max_requests_per_connection(self):
+        self.config(max_requests_per_connection=2)
+        self._start()
+        response = self._request(3)
+        self.assertEqual(2, response.count(b'HTTP/1.1 200 OK'))
+        self.assertEqual(1, response.count(b'Connection: close'))
+
+    def test_keepalive_idle_timeout(self):
+        self.config(keepalive_idle_timeout=1)
+        self._start()
+        client = eventlet.connect(self.sock.getsockname())
+        self.addCleanup(client.close)
+        client.settimeout(10)
+        client.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        self.assertTrue(client.recv(65536).startswith(b'HTTP/1.1 200 OK'))
+        # NOTE: The server hangs up on the idle connection by itself
+        self.assertEqual(b'', client.recv(65536))
 
 
 class TestHelpers(test_utils.BaseTestCase):
@@ -649,3 +761,46 @@ class GetSocketTestCase(test_utils.BaseTestCase):
             'glance.common.wsgi.ssl.wrap_socket',
             lambda *x, **y: None))
         self.assertRaises(wsgi.socket.error, wsgi.get_socket, 1234)
+
+    def test_get_socket_reuse_port(self):
+        mock_socket = mock.Mock()
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.common.wsgi.socket.socket',
+            lambda *x: mock_socket))
+        wsgi.get_socket(1234, reuse_port=True, listen=False)
+
+        self.assertIn(mock.call.setsockopt(socket.SOL_SOCKET,
+                                           wsgi.SO_REUSEPORT, 1),
+                      mock_socket.mock_calls)
+        mock_socket.bind.assert_called_once_with(('192.168.0.13', 1234))
+        self.assertFalse(mock_socket.listen.called)
+
+    def test_configure_socket_reuse_port(self):
+        self.config(reuse_port=True, workers=4)
+        mock_socket = mock.Mock()
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.common.wsgi.ssl.wrap_socket',
+            mock_socket))
+        with mock.patch.object(wsgi, 'get_socket',
+                               return_value=mock_socket) as mock_get:
+            server = wsgi.Server()
+            server.default_port = 1234
+            server.configure_socket()
+
+        mock_get.assert_called_once_with(1234, reuse_port=True,
+                                         listen=False)
+
+    def test_get_child_socket(self):
+        wsgi.CONF.key_file = None
+        wsgi.CONF.cert_file = None
+        mock_socket = mock.Mock()
+        with mock.patch.object(wsgi, 'get_socket',
+                               return_value=mock_socket) as mock_get:
+            server = wsgi.Server()
+            server.default_port = 1234
+            self.assertIs(mock_socket, server._get_child_socket())
+
+        mock_get.assert_called_once_with(1234, reuse_port=True)
+        self.assertIn(mock.call.setsockopt(socket.SOL_SOCKET,
+                                           socket.SO_KEEPALIVE, 1),
+                      mock_socket.mock_calls)
@@ -364,6 +364,33 @@ class TestImageRepo(test_utils.BaseTestCase):
         self.assertEqual(set(['king', 'kong']), image.tags)
         self.assertEqual(current_update_time, image.updated_at)
 
+    def test_save_image_changes_only(self):
+        self.db.image_update(None, UUID1, {'properties': {'foo': 'bar',
+                                                          'ping': 'pong'}})
+        image = self.image_repo.get(UUID1)
+        image.extra_properties['foo'] = 'baz'
+        del image.extra_properties['ping']
+        image.tags.add('snap')
+        with mock.patch.object(self.db, 'image_update',
+                               wraps=self.db.image_update) as image_update:
+            self.image_repo.save(image)
+        self.assertEqual({'from_state': None, 'delete_props': ['ping'],
+                          'add_tags': ['snap'], 'delete_tags': []},
+                         image_update.call_args[1])
+        image = self.image_repo.get(UUID1)
+        self.assertEqual({'foo': 'baz'}, image.extra_properties)
+        self.assertEqual(set(['ping', 'pong', 'snap']), image.tags)
+
+    def test_save_image_twice(self):
+        image = self.image_repo.get(UUID1)
+        image.visibility = 'private'
+        self.image_repo.save(image)
+        with mock.patch.object(self.db, 'image_update',
+                               wraps=self.db.image_update) as image_update:
+            self.image_repo.save(image)
+        self.assertEqual({}, image_update.call_args[0][2])
+        self.assertEqual('private', self.image_repo.get(UUID1).visibility)
+
     def test_save_image_not_found(self):
         fake_uuid = str(uuid.uuid4())
         image = self.image_repo.get(UUID1)
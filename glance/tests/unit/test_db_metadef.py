@@ -252,6 +252,24 @@ class TestMetadefRepo(test_utils.BaseTestCase):
                           self.namespace_repo.get,
                           NAMESPACE3)
 
+    def test_get_namespace_details(self):
+        namespace, details = self.namespace_repo.get_details(NAMESPACE1)
+        self.assertEqual(NAMESPACE1, namespace.namespace)
+        self.assertEqual(set([OBJECT1, OBJECT2, OBJECT3]),
+                         set(o.name for o in details['objects']))
+        self.assertEqual(set([PROPERTY1, PROPERTY2, PROPERTY3]),
+                         set(p.name for p in details['properties']))
+        self.assertEqual(set([TAG1, TAG2, TAG3]),
+                         set(t.name for t in details['tags']))
+        self.assertEqual([], details['resource_type_associations'])
+        for child in details['objects'] + details['tags']:
+            self.assertIs(namespace, child.namespace)
+
+    def test_get_namespace_details_forbidden(self):
+        self.assertRaises(exception.NotFound,
+                          self.namespace_repo.get_details,
+                          NAMESPACE3)
+
     def test_list_namespace(self):
         namespaces = self.namespace_repo.list()
         namespace_names = set([n.namespace for n in namespaces])
@@ -160,6 +160,49 @@ class TestImage(test_utils.BaseTestCase):
         self.image.tags = ['a', 'b', 'c']
         self.assertEqual(set(['a', 'b', 'c']), self.image.tags)
 
+    def test_get_changes_untracked(self):
+        self.assertIsNone(self.image.get_changes())
+
+    def test_get_changes(self):
+        self.image.extra_properties = {'foo': 'bar', 'ping': 'pong'}
+        self.image.tags = ['a', 'b']
+        self.image.clear_changes()
+        self.image.name = 'new name'
+        self.image.visibility = 'public'
+        self.image.extra_properties['foo'] = 'baz'
+        self.image.extra_properties['snap'] = 'crackle'
+        del self.image.extra_properties['ping']
+        self.image.tags.add('c')
+        self.image.tags.remove('a')
+        changes = self.image.get_changes()
+        self.assertEqual({'name': 'new name', 'visibility': 'public'},
+                         changes['attributes'])
+        self.assertEqual({'foo': 'baz', 'snap': 'crackle'},
+                         changes['properties'])
+        self.assertEqual(['ping'], changes['deleted_properties'])
+        self.assertEqual(['c'], changes['added_tags'])
+        self.assertEqual(['a'], changes['deleted_tags'])
+        self.assertIsNone(changes['locations'])
+
+    def test_get_changes_locations(self):
+        self.image.locations = [{'url': 'foo', 'metadata': {},
+                                 'status': 'active'}]
+        self.image.clear_changes()
+        self.image.locations[0]['metadata']['key'] = 'value'
+        changes = self.image.get_changes()
+        self.assertEqual({}, changes['attributes'])
+        self.assertEqual([{'url': 'foo', 'metadata': {'key': 'value'},
+                           'status': 'active'}], changes['locations'])
+
+    def test_clear_changes(self):
+        self.image.clear_changes()
+        self.image.name = 'new name'
+        self.image.clear_changes()
+        changes = self.image.get_changes()
+        self.assertEqual({}, changes['attributes'])
+        self.assertEqual({}, changes['properties'])
+        self.assertEqual([], changes['added_tags'])
+
     def test_delete_protected_image(self):
         self.image.protected = True
         self.assertRaises(exception.ProtectedImageDelete, self.image.delete)
@@ -13,11 +13,13 @@
 #    under the License.
 
 import copy
+import hashlib
 import os
 import sys
 import uuid
 
 import fixtures
+import mock
 from oslo_serialization import jsonutils
 import six
 from six import moves
@@ -402,6 +404,112 @@ class ReplicationCommandsTestCase(test_utils.BaseTestCase):
                 self.assertIn('id', d)
                 self.assertIn('size', d)
 
+    def test_replication_dump_manifest_and_checksum(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+
+        good_id = '5dcddce0-cba5-4f18-9cf4-9853c7b207a6'
+        bad_id = '37ff82db-afca-48c7-ae0b-ddc7cf83e3db'
+        images = [{'status': 'active', 'size': 4, 'id': good_id,
+                   'checksum': hashlib.md5(b'data').hexdigest()},
+                  {'status': 'active', 'size': 4, 'id': bad_id,
+                   'checksum': 'thisisnotthechecksum'}]
+
+        options = moves.UserDict()
+        options.chunksize = 2
+        options.mastertoken = 'mastertoken'
+        options.metaonly = False
+        args = ['localhost:9292', tempdir]
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.cmd.replicator.get_image_service', get_image_service))
+        with mock.patch.object(FakeImageService, 'get_images',
+                               return_value=images):
+            glance_replicator.replication_dump(options, args)
+
+        good_file = os.path.join(tempdir, good_id)
+        self.assertTrue(os.path.exists(good_file))
+        with open('%s.img' % good_file, 'rb') as f:
+            self.assertEqual(b'data', f.read())
+
+        # Data which doesn't match its checksum is discarded, and the image
+        # is left out of the dump so that the next dump retries it.
+        bad_file = os.path.join(tempdir, bad_id)
+        self.assertFalse(os.path.exists(bad_file))
+        self.assertFalse(os.path.exists('%s.img' % bad_file))
+        self.assertFalse(os.path.exists('%s.img.part' % bad_file))
+
+        with open(os.path.join(tempdir, 'manifest.json')) as f:
+            manifest = jsonutils.loads(f.read())
+        self.assertEqual({good_id: {'status': 'active', 'data': True,
+                                    'size': 4,
+                                    'checksum': images[0]['checksum']}},
+                         manifest)
+
+    def _dump_two_images(self, tempdir, get_image=None):
+        first_id = '5dcddce0-cba5-4f18-9cf4-9853c7b207a6'
+        second_id = '37ff82db-afca-48c7-ae0b-ddc7cf83e3db'
+        images = [{'status': 'active', 'size': 4, 'id': first_id},
+                  {'status': 'active', 'size': 4, 'id': second_id}]
+
+        options = moves.UserDict()
+        options.chunksize = 2
+        options.mastertoken = 'mastertoken'
+        options.metaonly = False
+        args = ['localhost:9292', tempdir]
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.cmd.replicator.get_image_service', get_image_service))
+        with mock.patch.object(FakeImageService, 'get_images',
+                               return_value=images):
+            if get_image is None:
+                glance_replicator.replication_dump(options, args)
+            else:
+                with mock.patch.object(FakeImageService, 'get_image',
+                                       side_effect=get_image):
+                    glance_replicator.replication_dump(options, args)
+
+    def _read_dump_manifest(self, tempdir):
+        with open(os.path.join(tempdir, 'manifest.json')) as f:
+            return jsonutils.loads(f.read())
+
+    def test_replication_dump_read_failure(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        responses = [FakeHttpResponse({}, b'data'),
+                     FakeHttpResponse({}, b'data')]
+        responses[1].read = mock.Mock(side_effect=[b'da', IOError()])
+
+        self.assertRaises(IOError, self._dump_two_images, tempdir,
+                          get_image=responses)
+
+        # The partial data is discarded and the image left out of the
+        # manifest, while the image dumped before the failure is kept.
+        first_id = '5dcddce0-cba5-4f18-9cf4-9853c7b207a6'
+        self.assertEqual(sorted(['manifest.json', first_id,
+                                 '%s.img' % first_id]),
+                         sorted(os.listdir(tempdir)))
+        self.assertEqual([first_id],
+                         list(self._read_dump_manifest(tempdir).keys()))
+
+    def test_replication_dump_write_failure(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        orig_write_metadata = glance_replicator._write_metadata
+        written = []
+
+        def write_metadata(data_path, image):
+            if written:
+                raise IOError()
+            written.append(image['id'])
+            orig_write_metadata(data_path, image)
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.cmd.replicator._write_metadata', write_metadata))
+        self.assertRaises(IOError, self._dump_two_images, tempdir)
+
+        # The manifest is still written, and only lists the image which was
+        # completely dumped.
+        self.assertEqual(written,
+                         list(self._read_dump_manifest(tempdir).keys()))
+
     def test_replication_dump_with_no_args(self):
         args = []
         command = glance_replicator.replication_dump
@@ -471,6 +579,31 @@ class ReplicationCommandsTestCase(test_utils.BaseTestCase):
         self.assertIn(new_id, updated)
         self.assertNotIn(new_id_missing_data, updated)
 
+    def test_replication_load_manifest_size_mismatch(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+
+        new_id = str(uuid.uuid4())
+        imgfile = os.path.join(tempdir, new_id)
+        with open(imgfile, 'w') as f:
+            f.write(jsonutils.dumps({'id': new_id, 'status': 'active',
+                                     'size': 100}))
+        with open('%s.img' % imgfile, 'w') as f:
+            f.write('truncated')
+        with open(os.path.join(tempdir, 'manifest.json'), 'w') as f:
+            f.write(jsonutils.dumps({new_id: {'status': 'active',
+                                              'data': True, 'size': 100}}))
+
+        options = moves.UserDict()
+        options.dontreplicate = 'dontrepl dontreplabsent'
+        options.slavetoken = 'slavetoken'
+        args = ['localhost:9292', tempdir]
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.cmd.replicator.get_image_service', get_image_service))
+        updated = glance_replicator.replication_load(options, args)
+
+        self.assertEqual([], updated)
+
     def test_replication_load_with_no_args(self):
         args = []
         command = glance_replicator.replication_load
@@ -488,6 +621,8 @@ class ReplicationCommandsTestCase(test_utils.BaseTestCase):
         options.mastertoken = 'livemastertoken'
         options.slavetoken = 'liveslavetoken'
         options.metaonly = False
+        options.concurrency = 1
+        options.statefile = ''
         args = ['localhost:9292', 'localhost:9393']
 
         orig_img_service = glance_replicator.get_image_service
@@ -499,6 +634,52 @@ class ReplicationCommandsTestCase(test_utils.BaseTestCase):
 
         self.assertEqual(2, len(updated))
 
+    def test_replication_livecopy_concurrent(self):
+        options = moves.UserDict()
+        options.chunksize = 4096
+        options.dontreplicate = 'dontrepl dontreplabsent'
+        options.mastertoken = 'livemastertoken'
+        options.slavetoken = 'liveslavetoken'
+        options.metaonly = False
+        options.concurrency = 4
+        options.statefile = ''
+        args = ['localhost:9292', 'localhost:9393']
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.cmd.replicator.get_image_service', get_image_service))
+        updated = glance_replicator.replication_livecopy(options, args)
+
+        self.assertEqual(sorted(['37ff82db-afca-48c7-ae0b-ddc7cf83e3db',
+                                 '15648dd7-8dd0-401c-bd51-550e1ba9a088']),
+                         sorted(updated))
+
+    def test_replication_livecopy_resume(self):
+        tempdir = self.useFixture(fixtures.TempDir()).path
+        statefile = os.path.join(tempdir, 'livecopy.state')
+        with open(statefile, 'w') as f:
+            f.write('15648dd7-8dd0-401c-bd51-550e1ba9a088\n')
+
+        options = moves.UserDict()
+        options.chunksize = 4096
+        options.dontreplicate = 'dontrepl dontreplabsent'
+        options.mastertoken = 'livemastertoken'
+        options.slavetoken = 'liveslavetoken'
+        options.metaonly = False
+        options.concurrency = 1
+        options.statefile = statefile
+        args = ['localhost:9292', 'localhost:9393']
+
+        self.useFixture(fixtures.MonkeyPatch(
+            'glance.cmd.replicator.get_image_service', get_image_service))
+        updated = glance_replicator.replication_livecopy(options, args)
+
+        # The image recorded by the previous run is not copied again
+        self.assertEqual(['37ff82db-afca-48c7-ae0b-ddc7cf83e3db'], updated)
+        with open(statefile) as f:
+            done = set(f.read().split())
+        self.assertEqual(set(img['id'] for img in FAKEIMAGES_LIVEMASTER),
+                         done)
+
     def test_replication_livecopy_with_no_args(self):
         args = []
         command = glance_replicator.replication_livecopy
@@ -27,6 +27,7 @@ import six
 from six.moves import range
 
 from glance.common import exception
+from glance.common import utils
 from glance import image_cache
 # NOTE(bcwaldon): This is imported to load the registry config options
 import glance.registry  # noqa
@@ -416,6 +417,39 @@ class ImageCacheTestCase(object):
         # checksum is valid, fake image should be cached:
         self.assertTrue(cache.is_cached(image_id))
 
+    def test_gate_caching_iter_streaming(self):
+        image = [b"1234", b"5678", b"90ab"]
+        image_id = 123
+        checksum = hashlib.md5(b''.join(image)).hexdigest()
+
+        cache = image_cache.ImageCache()
+        stream = utils.StreamingIterator(iter(image))
+        img_iter = cache.get_caching_iter(image_id, checksum, stream)
+        # NOTE: The cache adds hooks to the iterator instead of wrapping it
+        self.assertIs(stream, img_iter)
+        self.assertEqual(image, list(img_iter))
+        self.assertTrue(cache.is_cached(image_id))
+
+    def test_gate_caching_iter_streaming_bad_checksum(self):
+        image_id = 123
+        cache = image_cache.ImageCache()
+        stream = utils.StreamingIterator(iter([b"1234", b"5678"]))
+        img_iter = cache.get_caching_iter(image_id, "foobar", stream)
+
+        self.assertRaises(exception.GlanceException, list, img_iter)
+        self.assertFalse(cache.is_cached(image_id))
+
+    def test_gate_caching_iter_offloaded(self):
+        self.config(offload_data_processing=True)
+        image = [b"1234", b"5678", b"90ab"]
+        image_id = 123
+        checksum = hashlib.md5(b''.join(image)).hexdigest()
+
+        cache = image_cache.ImageCache()
+        img_iter = cache.get_caching_iter(image_id, checksum, iter(image))
+        self.assertEqual(image, list(img_iter))
+        self.assertTrue(cache.is_cached(image_id))
+
     def test_gate_caching_iter_bad_checksum(self):
         image = b"12345678990abcdefghijklmnop"
         image_id = 123
@@ -544,6 +578,35 @@ class TestImageCacheNoDep(test_utils.BaseTestCase):
         caching_iter = cache.get_caching_iter('dummy_id', None, iter(data))
         self.assertEqual(data, list(caching_iter))
 
+    def test_get_caching_iter_when_write_fails_streaming(self):
+
+        class FailingFile(object):
+
+            def write(self, data):
+                if data == "Fail":
+                    raise IOError
+
+        class FailingFileDriver(object):
+
+            def is_cacheable(self, *args, **kwargs):
+                return True
+
+            @contextmanager
+            def open_for_write(self, *args, **kwargs):
+                yield FailingFile()
+
+        self.driver = FailingFileDriver()
+        cache = image_cache.ImageCache()
+        data = [b'a', b'b', b'c', b'Fail', b'd', b'e', b'f']
+
+        caching_iter = cache.get_caching_iter(
+            'dummy_id', None, utils.StreamingIterator(iter(data)))
+        self.assertEqual(data, list(caching_iter))
+
+    def test_get_caching_iter_when_write_fails_offloaded(self):
+        self.config(offload_data_processing=True)
+        self.test_get_caching_iter_when_write_fails()
+
     def test_get_caching_iter_when_open_fails(self):
 
         class OpenFailingDriver(object):
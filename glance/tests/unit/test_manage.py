@@ -289,3 +289,33 @@ class TestManage(TestManageBase):
                                db_metadata.db_export_metadefs,
                                db_api.get_engine(),
                                '/mock/')
+
+    @mock.patch.object(db_api, 'task_delete_expired')
+    def test_db_delete_expired_tasks(self, task_delete_expired):
+        task_delete_expired.side_effect = [1000, 1000, 3]
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            self.useFixture(fixtures.MonkeyPatch(
+                'sys.argv',
+                ['glance.cmd.manage', 'db', 'delete_expired_tasks']))
+            manage.main()
+        self.assertEqual(3, task_delete_expired.call_count)
+        expired_before = set()
+        for call in task_delete_expired.call_args_list:
+            self.assertEqual(1000, call[1]['max_rows'])
+            self.assertFalse(call[1]['purge'])
+            expired_before.add(call[1]['expired_before'])
+        self.assertEqual(1, len(expired_before))
+        self.assertIn('2003', stdout.getvalue())
+
+    @mock.patch.object(db_api, 'task_delete_expired')
+    def test_db_delete_expired_tasks_purge(self, task_delete_expired):
+        task_delete_expired.side_effect = [10, 10, 0]
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            self.useFixture(fixtures.MonkeyPatch(
+                'sys.argv',
+                ['glance.cmd.manage', 'db', 'delete_expired_tasks',
+                 '--max_rows', '10', '--purge']))
+            manage.main()
+        self.assertEqual(3, task_delete_expired.call_count)
+        self.assertEqual(10, task_delete_expired.call_args[1]['max_rows'])
+        self.assertTrue(task_delete_expired.call_args[1]['purge'])
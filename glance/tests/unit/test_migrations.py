@@ -1825,6 +1825,18 @@ class MigrationsMixin(test_migrations.WalkVersionsMixin):
                           metadef_resource_types.name, engine)
                          )
 
+    def _check_044(self, engine, data):
+        image_locations = db_utils.get_table(engine, 'image_locations')
+
+        self.assertTrue(index_exist('ix_image_locations_status_deleted_at',
+                                    image_locations.name, engine))
+
+    def _check_045(self, engine, data):
+        tasks = db_utils.get_table(engine, 'tasks')
+
+        self.assertTrue(index_exist('ix_tasks_expires_at',
+                                    tasks.name, engine))
+
     def assert_table(self, engine, table_name, indices, columns):
         table = db_utils.get_table(engine, table_name)
         index_data = [(index.name, index.columns.keys()) for index in
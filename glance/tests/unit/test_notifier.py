@@ -16,11 +16,13 @@
 
 import datetime
 
+import eventlet
 import glance_store
 import mock
 from oslo_config import cfg
 import oslo_messaging
 from oslo_utils import timeutils
+from six.moves import range
 import webob
 
 import glance.async
@@ -114,6 +116,104 @@ class TestNotifier(utils.BaseTestCase):
     def test_notifier_load(self):
         self._test_load_strategy(url=None, driver=None)
 
+    def _get_notifier(self, **config):
+        self.config(**config)
+        self.addCleanup(setattr, notifier, '_DISPATCHER', None)
+        with mock.patch.object(oslo_messaging, 'get_transport'):
+            with mock.patch.object(oslo_messaging, 'Notifier'):
+                return notifier.Notifier()
+
+    def test_notify_during_request(self):
+        nfier = self._get_notifier()
+        nfier.info('image.create', {'id': UUID1})
+        nfier._notifier.info.assert_called_once_with({}, 'image.create',
+                                                     {'id': UUID1})
+        self.assertIsNone(notifier._DISPATCHER)
+
+    def test_notify_queued(self):
+        nfier = self._get_notifier(notification_queue_size=10)
+        nfier.info('image.create', {'id': UUID1})
+        nfier.error('image.upload', 'error')
+        self.assertFalse(nfier._notifier.info.called)
+
+        eventlet.sleep(0)
+        nfier._notifier.info.assert_called_once_with({}, 'image.create',
+                                                     {'id': UUID1})
+        nfier._notifier.error.assert_called_once_with({}, 'image.upload',
+                                                      'error')
+
+    def test_notify_queued_in_batches(self):
+        nfier = self._get_notifier(notification_queue_size=10,
+                                   notification_batch_size=2)
+        for i in range(3):
+            nfier.info('image.create', {'id': i})
+
+        eventlet.sleep(0)
+        self.assertEqual(2, nfier._notifier.info.call_count)
+        eventlet.sleep(0)
+        self.assertEqual(3, nfier._notifier.info.call_count)
+
+    def test_notify_queued_failure(self):
+        nfier = self._get_notifier(notification_queue_size=10)
+        nfier._notifier.info.side_effect = [Exception('bus down'), None]
+        nfier.info('image.create', {'id': 1})
+        nfier.info('image.create', {'id': 2})
+
+        eventlet.sleep(0)
+        nfier._notifier.info.assert_called_with({}, 'image.create',
+                                                {'id': 2})
+
+    @mock.patch.object(notifier.LOG, 'warn')
+    def test_notify_queue_full_drop(self, mock_log):
+        nfier = self._get_notifier(notification_queue_size=1)
+        nfier.info('image.create', {'id': 1})
+        nfier.info('image.create', {'id': 2})
+        self.assertEqual(1, mock_log.call_count)
+
+        eventlet.sleep(0)
+        nfier._notifier.info.assert_called_once_with({}, 'image.create',
+                                                     {'id': 1})
+
+    def test_notify_queue_full_block(self):
+        nfier = self._get_notifier(notification_queue_size=1,
+                                   notification_overflow_policy='block')
+        nfier.info('image.create', {'id': 1})
+        # Waits for the first notification to be sent to make room
+        nfier.info('image.create', {'id': 2})
+        self.assertEqual(1, nfier._notifier.info.call_count)
+
+        eventlet.sleep(0)
+        self.assertEqual(2, nfier._notifier.info.call_count)
+
+    @mock.patch.object(oslo_messaging, 'Notifier')
+    @mock.patch.object(oslo_messaging, 'get_transport')
+    def test_notifier_without_driver(self, mock_get_transport,
+                                     mock_notifier):
+        mock_notifier.return_value.is_enabled.return_value = False
+        nfier = notifier.Notifier()
+        self.assertFalse(nfier.enabled)
+
+        nfier.info('image.create', {'id': UUID1})
+        self.assertFalse(nfier._notifier.info.called)
+
+    def test_has_live_driver(self):
+        oslo_notifier = mock.Mock(spec=['info'])
+        oslo_notifier._driver_names = []
+        self.assertFalse(notifier._has_live_driver(oslo_notifier))
+        oslo_notifier._driver_names = ['noop']
+        self.assertFalse(notifier._has_live_driver(oslo_notifier))
+        oslo_notifier._driver_names = ['noop', 'messagingv2']
+        self.assertTrue(notifier._has_live_driver(oslo_notifier))
+
+    def test_disabled_notifications_follow_config(self):
+        self.assertTrue(notifier._is_notification_enabled('image.create'))
+        self.config(disabled_notifications=['image'])
+        self.assertFalse(notifier._is_notification_enabled('image.create'))
+        self.assertTrue(notifier._is_notification_enabled('task.create'))
+        self.config(disabled_notifications=['task.create'])
+        self.assertTrue(notifier._is_notification_enabled('image.create'))
+        self.assertFalse(notifier._is_notification_enabled('task.create'))
+
 
 class TestImageNotifications(utils.BaseTestCase):
     """Test Image Notifications work"""
@@ -170,6 +270,20 @@ class TestImageNotifications(utils.BaseTestCase):
         if 'location' in output_log['payload']:
             self.fail('Notification contained location field.')
 
+    @mock.patch.object(notifier, 'format_image_notification')
+    def test_image_save_notification_disabled(self, mock_format):
+        self.config(disabled_notifications=['image.update'])
+        self.image_repo_proxy.save(self.image_proxy)
+        self.assertEqual([], self.notifier.get_logs())
+        self.assertFalse(mock_format.called)
+
+    @mock.patch.object(notifier, 'format_image_notification')
+    def test_image_save_notifier_disabled(self, mock_format):
+        self.notifier.enabled = False
+        self.image_repo_proxy.save(self.image_proxy)
+        self.assertEqual([], self.notifier.get_logs())
+        self.assertFalse(mock_format.called)
+
     def test_image_get(self):
         image = self.image_repo_proxy.get(UUID1)
         self.assertIsInstance(image, glance.notifier.ImageProxy)
@@ -186,6 +300,13 @@ class TestImageNotifications(utils.BaseTestCase):
 
             self.assertTrue(get_data_mock.called)
 
+    def test_image_get_data_notification_disabled(self):
+        self.config(disabled_notifications=['image.send'])
+        data = ['01234', '56789']
+        with mock.patch.object(self.image, 'get_data', return_value=data):
+            self.assertIs(data, self.image_proxy.get_data())
+        self.assertEqual([], self.notifier.get_logs())
+
     def test_image_get_data_notification(self):
         self.image_proxy.size = 10
         data = ''.join(self.image_proxy.get_data())
@@ -213,6 +334,51 @@ class TestImageNotifications(utils.BaseTestCase):
         self.assertEqual(self.image.image_id,
                          output_log['payload']['image_id'])
 
+    def test_image_get_data_notification_aggregated(self):
+        self.config(image_send_aggregation_interval=60)
+        self.addCleanup(setattr, notifier, '_IMAGE_SEND_AGGREGATOR', None)
+        self.image_proxy.size = 10
+        for i in range(3):
+            list(self.image_proxy.get_data())
+        other_context = glance.context.RequestContext(tenant=TENANT1,
+                                                      user=USER1)
+        other_proxy = glance.notifier.ImageProxy(self.image, other_context,
+                                                 self.notifier)
+        other_proxy.size = 10
+        list(other_proxy.get_data())
+        self.assertEqual([], self.notifier.get_logs())
+
+        notifier._IMAGE_SEND_AGGREGATOR.flush()
+        output_logs = sorted(self.notifier.get_logs(),
+                             key=lambda log: log['payload']['downloads'])
+        self.assertEqual(2, len(output_logs))
+        for output_log in output_logs:
+            self.assertEqual('INFO', output_log['notification_type'])
+            self.assertEqual('image.send', output_log['event_type'])
+        self.assertEqual({'bytes_sent': 10, 'downloads': 1,
+                          'image_id': UUID1, 'owner_id': TENANT1,
+                          'receiver_tenant_id': TENANT1,
+                          'receiver_user_id': USER1},
+                         output_logs[0]['payload'])
+        self.assertEqual({'bytes_sent': 30, 'downloads': 3,
+                          'image_id': UUID1, 'owner_id': TENANT1,
+                          'receiver_tenant_id': TENANT2,
+                          'receiver_user_id': USER1},
+                         output_logs[1]['payload'])
+
+        notifier._IMAGE_SEND_AGGREGATOR.flush()
+        self.assertEqual(2, len(self.notifier.get_logs()))
+
+    def test_image_get_data_size_mismatch_aggregated(self):
+        self.config(image_send_aggregation_interval=60)
+        self.addCleanup(setattr, notifier, '_IMAGE_SEND_AGGREGATOR', None)
+        self.image_proxy.size = 11
+        list(self.image_proxy.get_data())
+        output_logs = self.notifier.get_logs()
+        self.assertEqual(1, len(output_logs))
+        self.assertEqual('ERROR', output_logs[0]['notification_type'])
+        self.assertIsNone(notifier._IMAGE_SEND_AGGREGATOR)
+
     def test_image_set_data_prepare_notification(self):
         insurance = {'called': False}
 
@@ -13,15 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
 import uuid
 
 import glance_store
 from mock import patch
 from mox3 import mox
 from oslo_config import cfg
+from oslo_utils import timeutils
 # NOTE(jokke): simplified transition to py3, behaves like py2 xrange
 from six.moves import range
 
+from glance.common import exception
+from glance.db.simple import api as simple_db
 from glance import scrubber
 from glance.tests import utils as test_utils
 
@@ -50,8 +54,8 @@ class TestScrubber(test_utils.BaseTestCase):
         id = 'helloworldid'
         scrub = scrubber.Scrubber(glance_store)
         scrub.registry = self.mox.CreateMockAnything()
-        scrub.registry.get_image(id).AndReturn({'status': 'pending_delete'})
-        scrub.registry.update_image(id, {'status': 'deleted'})
+        scrub.registry.update_image(id, {'status': 'deleted'},
+                                    from_state='pending_delete')
         self.mox.StubOutWithMock(glance_store, "delete_from_backend")
         glance_store.delete_from_backend(
             uri,
@@ -66,8 +70,8 @@ class TestScrubber(test_utils.BaseTestCase):
 
         scrub = scrubber.Scrubber(glance_store)
         scrub.registry = self.mox.CreateMockAnything()
-        scrub.registry.get_image(id).AndReturn({'status': 'pending_delete'})
-        scrub.registry.update_image(id, {'status': 'deleted'})
+        scrub.registry.update_image(id, {'status': 'deleted'},
+                                    from_state='pending_delete')
         self.mox.StubOutWithMock(glance_store, "delete_from_backend")
         glance_store.delete_from_backend(uri, mox.IgnoreArg()).AndReturn('')
         self.mox.ReplayAll()
@@ -102,14 +106,139 @@ class TestScrubber(test_utils.BaseTestCase):
 
         scrub = scrubber.Scrubber(glance_store)
         scrub.registry = self.mox.CreateMockAnything()
-        scrub.registry.get_image(id).AndReturn({'status': 'pending_delete'})
-        scrub.registry.update_image(id, {'status': 'deleted'})
+        scrub.registry.update_image(id, {'status': 'deleted'},
+                                    from_state='pending_delete')
         self.mox.StubOutWithMock(glance_store, "delete_from_backend")
         glance_store.delete_from_backend(uri, mox.IgnoreArg()).AndRaise(ex)
         self.mox.ReplayAll()
         scrub._scrub_image(id, [(id, '-', uri)])
         self.mox.VerifyAll()
 
+    def test_store_delete_status_changed(self):
+        # The image status is only changed when the image is still pending
+        # delete; a conflict from the registry is not treated as an error.
+        uri = 'file://some/path/%s' % uuid.uuid4()
+        id = 'helloworldid'
+
+        scrub = scrubber.Scrubber(glance_store)
+        scrub.registry = self.mox.CreateMockAnything()
+        scrub.registry.update_image(
+            id, {'status': 'deleted'},
+            from_state='pending_delete').AndRaise(exception.Duplicate())
+        self.mox.StubOutWithMock(glance_store, "delete_from_backend")
+        glance_store.delete_from_backend(uri, mox.IgnoreArg()).AndReturn('')
+        self.mox.ReplayAll()
+        scrub._scrub_image(id, [(id, '-', uri)])
+        self.mox.VerifyAll()
+
+    def test_scrub_image_parallel_locations(self):
+        self.config(scrub_location_pool_size=3)
+        id = 'helloworldid'
+        jobs = [(id, '-', 'file://some/path/%d' % i) for i in range(5)]
+
+        scrub = scrubber.Scrubber(glance_store)
+        with patch.object(scrub, '_delete_image_location_from_backend') as (
+                _mock_delete):
+            self.assertTrue(scrub._scrub_image_locations(id, jobs))
+
+        self.assertEqual(5, _mock_delete.call_count)
+
+    def test_scrub_image_parallel_locations_failure(self):
+        self.config(scrub_location_pool_size=3)
+        id = 'helloworldid'
+        jobs = [(id, '-', 'file://some/path/%d' % i) for i in range(5)]
+
+        scrub = scrubber.Scrubber(glance_store)
+        with patch.object(scrub, '_delete_image_location_from_backend') as (
+                _mock_delete):
+            _mock_delete.side_effect = [None, Exception(), None, None, None]
+            self.assertFalse(scrub._scrub_image_locations(id, jobs))
+
+        # A failed location must not stop the remaining deletes.
+        self.assertEqual(5, _mock_delete.call_count)
+
+    def test_run_in_batches(self):
+        self.config(scrub_batch_size=2)
+        records = [('img%d' % (i // 2), i, 'file://some/path/%d' % i)
+                   for i in range(10)]
+
+        scrub = scrubber.Scrubber(glance_store)
+        with patch.object(scrub.db_queue, 'iter_locations',
+                          return_value=iter(records)):
+            batches = list(scrub._get_delete_job_batches())
+
+        self.assertEqual([['img0', 'img1'], ['img2', 'img3'], ['img4']],
+                         [list(batch.keys()) for batch in batches])
+        self.assertEqual([('img4', 8, 'file://some/path/8'),
+                          ('img4', 9, 'file://some/path/9')],
+                         batches[-1]['img4'])
+
+    def test_run_updates_scrubbed_images_only(self):
+        self.config(scrub_batch_size=2)
+        records = [('img%d' % i, i, 'file://some/path/%d' % i)
+                   for i in range(3)]
+
+        scrub = scrubber.Scrubber(glance_store)
+        scrub.registry = self.mox.CreateMockAnything()
+        for image_id in ('img0', 'img2'):
+            scrub.registry.update_image(image_id, {'status': 'deleted'},
+                                        from_state='pending_delete')
+        self.mox.ReplayAll()
+        with patch.object(scrub.db_queue, 'iter_locations',
+                          return_value=iter(records)):
+            with patch.object(scrub, '_delete_image_location_from_backend',
+                              side_effect=[None, Exception(), None]):
+                scrub.run()
+        self.mox.VerifyAll()
+
+    def test_run_keeps_image_locations_in_one_batch(self):
+        self.config(scrub_batch_size=1, data_api='glance.db.simple.api')
+        self.addCleanup(simple_db.reset)
+        delete_time = timeutils.utcnow() - datetime.timedelta(days=1)
+        # The location ids of the two images interleave.
+        for loc_id, image_id in ((1, 'img-a'), (2, 'img-b'), (3, 'img-a')):
+            simple_db.DATA['locations'].append({
+                'id': loc_id, 'image_id': image_id,
+                'url': 'file://some/path/%d' % loc_id, 'metadata': {},
+                'status': 'pending_delete', 'deleted': True,
+                'deleted_at': delete_time})
+
+        scrub = scrubber.Scrubber(glance_store)
+        scrub.registry = self.mox.CreateMockAnything()
+        scrub.registry.update_image('img-b', {'status': 'deleted'},
+                                    from_state='pending_delete')
+        self.mox.ReplayAll()
+        with patch.object(scrubber, 'DB_QUEUE_PAGE_SIZE', 1):
+            with patch.object(scrub, '_delete_image_location_from_backend',
+                              side_effect=[None, Exception(), None]) as (
+                    _mock_delete):
+                scrub.run()
+        self.mox.VerifyAll()
+
+        self.assertEqual([('img-a', 1), ('img-a', 3), ('img-b', 2)],
+                         [call[0][:2] for call in _mock_delete.call_args_list])
+
+
+class TestRateLimiter(test_utils.BaseTestCase):
+
+    @patch.object(scrubber.eventlet, 'sleep')
+    @patch.object(scrubber.time, 'time', return_value=100.0)
+    def test_wait_spaces_out_calls(self, _mock_time, _mock_sleep):
+        limiter = scrubber.RateLimiter(4)
+        for i in range(3):
+            limiter.wait()
+
+        self.assertEqual([((0.25,),), ((0.5,),)],
+                         _mock_sleep.call_args_list)
+
+    @patch.object(scrubber.eventlet, 'sleep')
+    def test_wait_unlimited(self, _mock_sleep):
+        limiter = scrubber.RateLimiter(0)
+        for i in range(3):
+            limiter.wait()
+
+        self.assertFalse(_mock_sleep.called)
+
 
 class TestScrubDBQueue(test_utils.BaseTestCase):
 
@@ -162,6 +291,24 @@ class TestScrubDBQueue(test_utils.BaseTestCase):
 
         self.assertEqual(images, actual)
 
+    def test_iter_locations_from_db(self):
+        self.config(scrub_queue_source='db', scrub_time=60)
+        scrub_queue = scrubber.ScrubDBQueue()
+        pages = [[{'id': 1, 'image_id': 'img1', 'url': 'file://a'},
+                  {'id': 2, 'image_id': 'img1', 'url': 'file://b'}],
+                 [{'id': 5, 'image_id': 'img2', 'url': 'file://c'}],
+                 []]
+
+        with patch.object(scrub_queue, '_get_locations_page',
+                          side_effect=pages) as _mock_get_page:
+            actual = list(scrub_queue.iter_locations())
+
+        self.assertEqual([('img1', 1, 'file://a'),
+                          ('img1', 2, 'file://b'),
+                          ('img2', 5, 'file://c')], actual)
+        markers = [c[0][1] for c in _mock_get_page.call_args_list]
+        self.assertEqual([None, 2, 5], markers)
+
 
 class ImagePager(object):
     def __init__(self, images, page_size=0):
@@ -12,11 +12,18 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import hashlib
+import os
+
+import eventlet
+import eventlet.queue
 import glance_store
 import mock
 
 from glance.common import exception
+from glance.common.location_strategy import health
 from glance.common import signature_utils
+import glance.common.utils
 import glance.location
 from glance.tests.unit import base as unit_test_base
 from glance.tests.unit import utils as unit_test_utils
@@ -138,6 +145,99 @@ class TestStoreImage(utils.BaseTestCase):
         self.assertEqual(1, len(image1.locations))
         image2.delete()
 
+    def _get_tracked_image(self, backends):
+        self.config(location_strategy='health')
+        self.addCleanup(health.init)
+        self.image_stub.locations = [{'url': url, 'metadata': {},
+                                      'status': 'active'}
+                                     for url in sorted(backends)]
+
+        def fake_get_from_backend(location, offset=0, chunk_size=None,
+                                  context=None):
+            return backends[location](), 3
+
+        self.store_api.get_from_backend = fake_get_from_backend
+        return glance.location.ImageProxy(self.image_stub, {},
+                                          self.store_api, self.store_utils)
+
+    def test_image_get_data_tracked_failover(self):
+        def failing():
+            raise IOError()
+            yield
+
+        def working():
+            yield 'ZZ'
+            yield 'Z'
+
+        image = self._get_tracked_image({'rbd://cluster1/image': failing,
+                                         'rbd://cluster2/image': working})
+        self.assertEqual('ZZZ', ''.join(image.get_data()))
+        self.assertAlmostEqual(health.ERROR_PENALTY,
+                               health.get_score('rbd://cluster1/image'),
+                               places=2)
+        self.assertLess(health.get_score('rbd://cluster2/image'), 1)
+
+    def test_image_get_data_tracked_all_fail(self):
+        def failing():
+            raise IOError()
+            yield
+
+        image = self._get_tracked_image({'rbd://cluster1/image': failing,
+                                         'rbd://cluster2/image': failing})
+        self.assertRaises(IOError, image.get_data)
+
+    def test_image_get_data_hedged(self):
+        self.config(hedge_delay=0.01, group='health_location_strategy')
+
+        def stuck():
+            eventlet.sleep(10)
+            yield 'XXX'
+
+        def working():
+            yield 'ZZZ'
+
+        image = self._get_tracked_image({'rbd://cluster1/image': stuck,
+                                         'rbd://cluster2/image': working})
+        self.assertEqual('ZZZ', ''.join(image.get_data()))
+        # NOTE: The stuck location is reported as at least as slow as the
+        # hedge delay
+        self.assertGreaterEqual(health.get_score('rbd://cluster1/image'),
+                                0.01)
+
+    def test_image_get_data_hedged_closes_late_location(self):
+        self.config(hedge_delay=0.01, group='health_location_strategy')
+        closed = []
+
+        def slow():
+            eventlet.sleep(0.05)
+            try:
+                yield 'XXX'
+            finally:
+                closed.append(True)
+
+        def working():
+            yield 'ZZZ'
+
+        image = self._get_tracked_image({'rbd://cluster1/image': slow,
+                                         'rbd://cluster2/image': working})
+        self.assertEqual('ZZZ', ''.join(image.get_data()))
+        self.assertEqual([], closed)
+        # NOTE: The slow location opens after the other one was used, and
+        # its data is closed then.
+        eventlet.sleep(0.1)
+        self.assertEqual([True], closed)
+
+    def test_cancel_pending_closes_opened_locations(self):
+        image = self._get_tracked_image({})
+        results = eventlet.queue.LightQueue()
+        data = mock.Mock()
+        results.put(({'url': 'rbd://cluster1/image'}, data, None))
+        results.put(({'url': 'rbd://cluster2/image'}, None, IOError()))
+
+        image._cancel_pending({}, results)
+        data.close.assert_called_once_with()
+        self.assertEqual(0, results.qsize())
+
     def test_image_set_data(self):
         context = glance.context.RequestContext(user=USER1)
         image_stub = ImageStub(UUID2, status='queued', locations=[])
@@ -188,6 +288,56 @@ class TestStoreImage(utils.BaseTestCase):
                           self.store_api.get_from_backend,
                           image.locations[0]['url'], context={})
 
+    def _local_file_image(self):
+        glance_store.register_opts(glance.location.CONF)
+        datadir = os.path.join(self.test_dir, 'store')
+        os.mkdir(datadir)
+        self.config(group='glance_store', default_store='file',
+                    filesystem_store_datadir=datadir)
+        path = os.path.join(self.test_dir, 'scratch')
+        with open(path, 'wb') as fd:
+            fd.write(b'YYYY')
+
+        context = glance.context.RequestContext(user=USER1)
+        image_stub = ImageStub(UUID2, status='queued', locations=[])
+        image = glance.location.ImageProxy(image_stub, context,
+                                           self.store_api, self.store_utils)
+        return image, datadir, path
+
+    def test_image_set_data_links_local_file(self):
+        image, datadir, path = self._local_file_image()
+        data = glance.common.utils.LocalFileReader(path)
+        with mock.patch.object(self.store_api, 'add_to_backend') as mock_add:
+            image.set_data(data, data.size)
+
+        self.assertFalse(mock_add.called)
+        store_path = os.path.join(datadir, UUID2)
+        self.assertEqual('file://%s' % store_path,
+                         image.locations[0]['url'])
+        self.assertEqual(4, image.size)
+        self.assertEqual(hashlib.md5(b'YYYY').hexdigest(), image.checksum)
+        self.assertEqual('active', image.status)
+        self.assertTrue(os.path.samefile(path, store_path))
+
+    def test_image_set_data_local_file_size_cap(self):
+        image, datadir, path = self._local_file_image()
+        self.config(image_size_cap=3)
+        data = glance.common.utils.LocalFileReader(path)
+        self.assertRaises(exception.ImageSizeLimitExceeded,
+                          image.set_data, data, data.size)
+        self.assertFalse(os.path.exists(os.path.join(datadir, UUID2)))
+
+    def test_image_set_data_local_file_copied_when_link_fails(self):
+        image, datadir, path = self._local_file_image()
+        data = glance.common.utils.LocalFileReader(path)
+        with mock.patch.object(glance.location.os, 'link',
+                               side_effect=OSError(18, 'EXDEV')):
+            image.set_data(data, data.size)
+
+        # NOTE(markwash): FakeStore returns image_id for location
+        self.assertEqual(UUID2, image.locations[0]['url'])
+        self.assertEqual('Z', image.checksum)
+
     def test_image_set_data_valid_signature(self):
         context = glance.context.RequestContext(user=USER1)
         extra_properties = {
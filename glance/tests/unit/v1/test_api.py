@@ -40,6 +40,7 @@ from glance.common import exception
 import glance.context
 from glance.db.sqlalchemy import api as db_api
 from glance.db.sqlalchemy import models as db_models
+import glance.notifier
 import glance.registry.client.v1.api as registry
 from glance.tests.unit import base
 import glance.tests.unit.utils as unit_test_utils
@@ -1659,7 +1660,7 @@ class TestGlanceAPI(base.IsolatedUnitTest):
         state_changes = []
 
         def mock_image_update(context, values, image_id, purge_props=False,
-                              from_state=None):
+                              from_state=None, **kwargs):
 
             status = values.get('status')
             if status:
@@ -1677,7 +1678,7 @@ class TestGlanceAPI(base.IsolatedUnitTest):
 
             return orig_image_update(context, values, image_id,
                                      purge_props=purge_props,
-                                     from_state=from_state)
+                                     from_state=from_state, **kwargs)
 
         def mock_image_get(*args, **kwargs):
             """Force status to 'saving' if not within activate db session.
@@ -3852,6 +3853,37 @@ class TestImageSerializer(base.IsolatedUnitTest):
 
         self.assertTrue(called['notified'])
 
+    def test_image_send_notification_aggregated(self):
+        self.config(image_send_aggregation_interval=60)
+        self.addCleanup(setattr, glance.notifier, '_IMAGE_SEND_AGGREGATOR',
+                        None)
+        req = webob.Request.blank("/images/%s" % UUID2)
+        req.method = 'GET'
+        req.remote_addr = '1.2.3.4'
+        req.context = self.context
+
+        image_meta = self.FIXTURE['image_meta']
+        payloads = []
+
+        def fake_info(_event_type, _payload):
+            payloads.append(_payload)
+
+        self.stubs.Set(self.serializer.notifier, 'info', fake_info)
+
+        for i in range(2):
+            glance.api.common.image_send_notification(
+                19, 19, image_meta, req, self.serializer.notifier)
+        self.assertEqual([], payloads)
+
+        glance.notifier._IMAGE_SEND_AGGREGATOR.flush()
+        self.assertEqual([{'bytes_sent': 38,
+                           'downloads': 2,
+                           'image_id': UUID2,
+                           'owner_id': image_meta['owner'],
+                           'receiver_tenant_id': self.receiving_tenant,
+                           'receiver_user_id': self.receiving_user}],
+                         payloads)
+
     def test_redact_location(self):
         """Ensure location redaction does not change original metadata"""
         image_meta = {'size': 3, 'id': '123', 'location': 'http://localhost'}
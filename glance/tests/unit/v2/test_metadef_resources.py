@@ -22,6 +22,7 @@ from glance.api.v2 import metadef_objects as objects
 from glance.api.v2 import metadef_properties as properties
 from glance.api.v2 import metadef_resource_types as resource_types
 from glance.api.v2 import metadef_tags as tags
+from glance.common import metadef_cache
 from glance.tests.unit import base
 import glance.tests.unit.utils as unit_test_utils
 
@@ -291,6 +292,73 @@ class TestMetadefsControllers(base.IsolatedUnitTest):
         expected = set([NAMESPACE1, NAMESPACE3])
         self.assertEqual(expected, actual)
 
+    def _index_namespaces(self, request):
+        output = self.namespace_controller.index(request)
+        return set([namespace.namespace for namespace in output.namespaces])
+
+    def test_namespace_index_cached(self):
+        self.config(metadef_catalog_cache_ttl=60)
+        self.addCleanup(metadef_cache.invalidate)
+        request = unit_test_utils.get_fake_request()
+        expected = set([NAMESPACE1, NAMESPACE3, NAMESPACE5, NAMESPACE6])
+        self.assertEqual(expected, self._index_namespaces(request))
+
+        # Changes made behind the API are not seen until the cache expires
+        self.db.metadef_namespace_delete(request.context, NAMESPACE5)
+        self.assertEqual(expected, self._index_namespaces(request))
+
+        # Changes made through the API drop the cached listings
+        namespace = namespaces.Namespace()
+        namespace.namespace = NAMESPACE4
+        self.namespace_controller.create(request, namespace)
+        expected = set([NAMESPACE1, NAMESPACE3, NAMESPACE4, NAMESPACE6])
+        self.assertEqual(expected, self._index_namespaces(request))
+
+    def test_namespace_index_cached_notifications_disabled(self):
+        self.config(metadef_catalog_cache_ttl=60,
+                    disabled_notifications=['metadef_namespace'])
+        self.addCleanup(metadef_cache.invalidate)
+        request = unit_test_utils.get_fake_request(tenant=TENANT3)
+        self.assertIn(NAMESPACE5, self._index_namespaces(request))
+
+        self.db.metadef_namespace_delete(request.context, NAMESPACE5)
+        self.namespace_controller.delete_objects(request, NAMESPACE3)
+        self.assertNotIn(NAMESPACE5, self._index_namespaces(request))
+        self.assertEqual([], self.notifier.get_logs())
+
+    def test_namespace_index_cached_per_caller(self):
+        self.config(metadef_catalog_cache_ttl=60)
+        self.addCleanup(metadef_cache.invalidate)
+        request = unit_test_utils.get_fake_request()
+        self.assertIn(NAMESPACE1, self._index_namespaces(request))
+
+        request = unit_test_utils.get_fake_request(tenant=TENANT2)
+        actual = self._index_namespaces(request)
+        self.assertIn(NAMESPACE2, actual)
+        self.assertNotIn(NAMESPACE1, actual)
+
+    def test_namespace_index_cached_forbidden(self):
+        self.config(metadef_catalog_cache_ttl=60)
+        self.addCleanup(metadef_cache.invalidate)
+        request = unit_test_utils.get_fake_request()
+        self.namespace_controller.index(request)
+
+        self.policy.set_rules({'get_metadef_namespaces': False})
+        self.assertRaises(webob.exc.HTTPForbidden,
+                          self.namespace_controller.index, request)
+
+    def test_namespace_index_etag(self):
+        request = unit_test_utils.get_fake_request()
+        output = self.namespace_controller.index(request)
+        serializer = namespaces.ResponseSerializer()
+        response = webob.Response(request=request)
+        serializer.index(response, output)
+        self.assertIsNotNone(response.etag)
+
+        request = webob.Request.blank('/v2/metadefs/namespaces')
+        request.if_none_match = response.etag
+        self.assertEqual(304, request.get_response(response).status_int)
+
     def test_namespace_show(self):
         request = unit_test_utils.get_fake_request()
         output = self.namespace_controller.show(request, NAMESPACE1)
@@ -324,6 +392,30 @@ class TestMetadefsControllers(base.IsolatedUnitTest):
         expected = set([RESOURCE_TYPE1])
         self.assertEqual(expected, actual)
 
+    def test_namespace_show_objects_forbidden(self):
+        self.policy.set_rules({'get_metadef_objects': False})
+        request = unit_test_utils.get_fake_request()
+        self.assertRaises(webob.exc.HTTPForbidden,
+                          self.namespace_controller.show, request, NAMESPACE3)
+
+    def test_namespace_show_etag(self):
+        request = unit_test_utils.get_fake_request()
+        output = self.namespace_controller.show(request, NAMESPACE3)
+        serializer = namespaces.ResponseSerializer()
+        response = webob.Response(request=request)
+        serializer.show(response, output)
+        self.assertIsNotNone(response.etag)
+
+        request = webob.Request.blank('/v2/metadefs/namespaces/%s' %
+                                      NAMESPACE3)
+        request.if_none_match = response.etag
+        cached = request.get_response(response)
+        self.assertEqual(304, cached.status_int)
+        self.assertEqual(b'', cached.body)
+
+        request.if_none_match = 'other'
+        self.assertEqual(200, request.get_response(response).status_int)
+
     def test_namespace_show_with_property_prefix(self):
         request = unit_test_utils.get_fake_request()
         rt = resource_types.ResourceTypeAssociation()
@@ -1461,6 +1553,34 @@ class TestMetadefsControllers(base.IsolatedUnitTest):
         expected = set([RESOURCE_TYPE1, RESOURCE_TYPE2, RESOURCE_TYPE4])
         self.assertEqual(expected, actual)
 
+    def test_resource_type_index_cached(self):
+        self.config(metadef_catalog_cache_ttl=60)
+        self.addCleanup(metadef_cache.invalidate)
+        request = unit_test_utils.get_fake_request(tenant=TENANT3)
+        self.assertEqual(3, len(self.rt_controller.index(
+            request).resource_types))
+
+        self.db.metadef_resource_type_create(
+            request.context, _db_resource_type_fixture(RESOURCE_TYPE3))
+        self.assertEqual(3, len(self.rt_controller.index(
+            request).resource_types))
+
+        self.rt_controller.delete(request, NAMESPACE3, RESOURCE_TYPE1)
+        self.assertEqual(4, len(self.rt_controller.index(
+            request).resource_types))
+
+    def test_resource_type_index_etag(self):
+        request = unit_test_utils.get_fake_request()
+        output = self.rt_controller.index(request)
+        serializer = resource_types.ResponseSerializer()
+        response = webob.Response(request=request)
+        serializer.index(response, output)
+        self.assertIsNotNone(response.etag)
+
+        request = webob.Request.blank('/v2/metadefs/resource_types')
+        request.if_none_match = response.etag
+        self.assertEqual(304, request.get_response(response).status_int)
+
     def test_resource_type_show(self):
         request = unit_test_utils.get_fake_request()
         output = self.rt_controller.show(request, NAMESPACE3)
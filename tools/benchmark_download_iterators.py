@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compare the per chunk cost of the download path when every layer wraps the
+image data in its own generator with the cost of a single
+glance.common.utils.StreamingIterator running the same work as hooks.
+
+The layers are those of a v2 download going through the caching
+middleware: the image.send byte counting of the notifier, the size check,
+cooperative yielding and the cache tee with its checksum. Cache writes go
+to a file object discarding the data, so that only the iteration cost and
+the checksum are measured.
+
+Usage: benchmark_download_iterators.py [--size MiB] [--runs N]
+                                       [--chunk-sizes KiB,KiB,...]
+                                       [--no-cache] [--no-cooperative]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+# If ../glance/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'glance', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+from oslo_utils import units
+
+from glance.common import utils
+
+
+class NullFile(object):
+    def write(self, data):
+        pass
+
+    def flush(self):
+        pass
+
+
+def notifier_iter(data):
+    sent = 0
+    for chunk in data:
+        yield chunk
+        sent += len(chunk)
+
+
+def size_checked_iter(data, expected_size):
+    bytes_written = 0
+    for chunk in data:
+        yield chunk
+        bytes_written += len(chunk)
+    if bytes_written != expected_size:
+        raise ValueError('size mismatch')
+
+
+def cache_tee_iter(data, cache_file):
+    checksum = hashlib.md5()
+    for chunk in data:
+        try:
+            cache_file.write(chunk)
+        finally:
+            checksum.update(chunk)
+            yield chunk
+    cache_file.flush()
+
+
+def nested(chunks, size, tee=True, cooperative=True):
+    data = iter(chunks)
+    if cooperative:
+        data = utils.cooperative_iter(data)
+    data = notifier_iter(data)
+    data = size_checked_iter(data, size)
+    if tee:
+        data = cache_tee_iter(data, NullFile())
+    return data
+
+
+def streaming(chunks, size, tee=True, cooperative=True):
+    def check_size(bytes_sent):
+        if bytes_sent != size:
+            raise ValueError('size mismatch')
+
+    cache_file = NullFile()
+    checksum = hashlib.md5()
+
+    def tee_chunk(chunk):
+        try:
+            cache_file.write(chunk)
+        finally:
+            checksum.update(chunk)
+
+    data = utils.StreamingIterator(iter(chunks), cooperative=cooperative)
+    data.add_hooks(end=lambda bytes_sent: None)
+    data.add_hooks(end=check_size)
+    if tee:
+        data.add_hooks(chunk=tee_chunk,
+                       end=lambda bytes_sent: cache_file.flush())
+    return data
+
+
+def measure(build, chunks, size, args):
+    best = None
+    for run in range(args.runs):
+        start = time.time()
+        for chunk in build(chunks, size, tee=not args.no_cache,
+                           cooperative=not args.no_cooperative):
+            pass
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=256,
+                        help='Size of the image in MiB')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Number of downloads per chunk size, the best '
+                             'one is reported')
+    parser.add_argument('--chunk-sizes', default='4,16,64,256',
+                        help='Comma separated chunk sizes in KiB')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Leave the cache tee and its checksum out')
+    parser.add_argument('--no-cooperative', action='store_true',
+                        help='Do not let other eventlet threads run after '
+                             'each chunk')
+    args = parser.parse_args()
+
+    print('%10s %12s %12s %14s %14s' % ('chunk KiB', 'nested MiB/s',
+                                        'fused MiB/s', 'nested us/chunk',
+                                        'fused us/chunk'))
+    size = args.size * units.Mi
+    for chunk_size in args.chunk_sizes.split(','):
+        chunk_size = int(chunk_size) * units.Ki
+        chunk = os.urandom(chunk_size)
+        chunks = [chunk] * (size // chunk_size)
+        nested_time = measure(nested, chunks, size, args)
+        fused_time = measure(streaming, chunks, size, args)
+        print('%10d %12.1f %12.1f %14.2f %14.2f' % (
+            chunk_size // units.Ki,
+            args.size / nested_time, args.size / fused_time,
+            nested_time / len(chunks) * 10 ** 6,
+            fused_time / len(chunks) * 10 ** 6))
+
+
+if __name__ == '__main__':
+    main()
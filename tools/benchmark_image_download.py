@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measure the download throughput of an image through the v2 image_data
+controller and the whole domain proxy stack (policy, quota, notifier,
+location...), backed by the filesystem store and the simple DB driver.
+
+Usage: benchmark_image_download.py [--size MiB] [--runs N]
+                                   [--chunk-sizes KiB,KiB,...]
+
+The image is read from the filesystem store in chunks of each given size
+in turn, the store itself uses 64KiB chunks.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# If ../glance/__init__.py exists, add ../ to Python search path, so that
+# it will override what happens to be installed in /usr/(local/)lib/python...
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                                os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'glance', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+import glance_store
+from oslo_config import cfg
+from oslo_utils import units
+import webob
+
+from glance.api.v2 import image_data
+from glance.common import wsgi
+import glance.context
+
+CONF = cfg.CONF
+
+
+def setup(work_dir):
+    CONF([], project='glance', default_config_files=[])
+    CONF.set_override('data_api', 'glance.db.simple.api')
+    CONF.set_override('policy_file',
+                      os.path.join(possible_topdir, 'etc', 'policy.json'),
+                      group='oslo_policy')
+    glance_store.register_opts(CONF)
+    CONF.set_override('filesystem_store_datadir', work_dir,
+                      group='glance_store')
+    glance_store.create_stores(CONF)
+    glance_store.verify_default_store()
+
+
+def create_image(controller, context, size):
+    image_factory = controller.gateway.get_image_factory(context)
+    image_repo = controller.gateway.get_repo(context)
+    image = image_factory.new_image(disk_format='raw',
+                                    container_format='bare')
+    image_repo.add(image)
+
+    request = wsgi.Request.blank('/')
+    request.context = context
+    chunk = os.urandom(units.Mi)
+    data = iter([chunk] * size)
+    controller.upload(request, image.image_id, data, size * units.Mi)
+    return image.image_id
+
+
+def download(controller, serializer, context, image_id):
+    request = wsgi.Request.blank('/')
+    request.context = context
+    response = webob.Response(request=request)
+    image = controller.download(request, image_id)
+    serializer.download(response, image)
+    start = time.time()
+    size = 0
+    for chunk in response.app_iter:
+        size += len(chunk)
+    return size, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=512,
+                        help='Size of the image in MiB')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Number of downloads per chunk size')
+    parser.add_argument('--chunk-sizes', default='16,64,256,1024,4096',
+                        help='Comma separated chunk sizes in KiB')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        setup(work_dir)
+        context = glance.context.RequestContext(tenant='benchmark',
+                                                is_admin=True)
+        controller = image_data.ImageDataController()
+        serializer = image_data.ResponseSerializer()
+        image_id = create_image(controller, context, args.size)
+        store = glance_store.get_store_from_scheme('file')
+
+        print('%10s %10s %10s' % ('chunk KiB', 'MiB/s', 'best MiB/s'))
+        for chunk_size in args.chunk_sizes.split(','):
+            store.READ_CHUNKSIZE = int(chunk_size) * units.Ki
+            rates = []
+            for run in range(args.runs):
+                size, elapsed = download(controller, serializer, context,
+                                         image_id)
+                rates.append(float(size) / units.Mi / elapsed)
+            print('%10s %10.1f %10.1f' % (chunk_size,
+                                          sum(rates) / len(rates),
+                                          max(rates)))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()